@@ -1,79 +1,98 @@
 import asyncio
 import logging
 import aiohttp
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import Command
 from aiogram.types import (
+    Message,
+    FSInputFile,
     InlineQuery,
     InlineQueryResultArticle,
     InputTextMessageContent,
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
-from aiogram.client.session.aiohttp import AiohttpSession
 from sqlalchemy import select
 from config import config
-from database import Service, Product, async_session
+from database import engine, Service, Product, async_session
+from utils.conversation import ConversationMemory
+from utils.catalog_index import CatalogIndex, service_entry, product_entry
+from utils.singleflight import SingleFlight, normalize_question
+from utils.ai_telemetry import AICallRecord, AIRequestError, ai_telemetry
+from utils.tg_session import create_session
+from utils.shutdown import graceful_shutdown, polling_tasks, run_process
+from utils.metrics import registry, setup_db_metrics, setup_handler_metrics, start_metrics_server
+from utils.logging_setup import setup_logging
+from utils.query_audit import setup_query_audit
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 
-tg_session = AiohttpSession(proxy=config.PROXY_URL)
+tg_session = create_session()
 bot = Bot(token=config.AI_BOT_TOKEN, session=tg_session)
 dp = Dispatcher()
 
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-MODEL = "openai/gpt-oss-20b:free"
+OPENROUTER_URL = config.OPENROUTER_URL
+# Модели в порядке приоритета
+MODELS = config.AI_MODELS
 
+# История диалогов в личных сообщениях
+conversation_memory = ConversationMemory(
+    token_budget=config.AI_HISTORY_TOKEN_BUDGET,
+    ttl=config.AI_HISTORY_TTL
+)
 
-async def get_services_info() -> str:
-    try:
-        async with async_session() as session:
-            query = select(Service).where(Service.is_active == True).order_by(Service.order)
-            result = await session.execute(query)
-            services = result.scalars().all()
-        
-        if not services:
-            return "Услуги временно недоступны."
-        
-        info = "АКТУАЛЬНЫЕ УСЛУГИ И ЦЕНЫ:\n\n"
-        for s in services:
-            info += f"📸 {s.name} - {s.price:,.0f} руб."
-            if s.duration:
-                info += f" ({s.duration})"
-            info += "\n"
-        return info
-    except Exception as e:
-        logging.error(f"Error getting services: {e}")
-        return ""
+# Объединение одинаковых вопросов, заданных одновременно
+ai_flights = SingleFlight()
 
+# Метрики обработчиков, SQL и объединения вопросов
+setup_handler_metrics(dp, "ai")
+setup_db_metrics(engine)
+setup_query_audit(dp, "ai", engine)
+registry.callback("ai_singleflight_calls_total", "Реальные запросы к модели", lambda: ai_flights.calls, kind="counter")
+registry.callback(
+    "ai_singleflight_coalesced_total", "Вопросы, получившие ответ чужого запроса",
+    lambda: ai_flights.coalesced, kind="counter"
+)
+registry.callback("ai_singleflight_inflight", "Вопросы к модели в процессе", lambda: ai_flights.inflight)
+
+
+# Индекс каталога для подбора позиций под вопрос
+_catalog_index = None
+_catalog_index_built_at = 0.0
 
-async def get_products_info() -> str:
+
+async def get_catalog_index() -> CatalogIndex:
+    """Индекс услуг и товаров (перестраивается раз в CATALOG_INDEX_TTL секунд)"""
+    global _catalog_index, _catalog_index_built_at
+    
+    loop = asyncio.get_running_loop()
+    if _catalog_index is not None and loop.time() - _catalog_index_built_at < config.CATALOG_INDEX_TTL:
+        return _catalog_index
+    
     try:
         async with async_session() as session:
-            query = select(Product).where(Product.is_active == True).order_by(Product.order)
-            result = await session.execute(query)
-            products = result.scalars().all()
-        
-        if not products:
-            return ""
+            services = (await session.execute(
+                select(Service).where(Service.is_active == True).order_by(Service.order)
+            )).scalars().all()
+            products = (await session.execute(
+                select(Product).where(Product.is_active == True).order_by(Product.order)
+            )).scalars().all()
         
-        info = "ТОВАРЫ:\n\n"
-        for p in products:
-            type_text = "📱" if p.product_type == "digital" else "📄"
-            info += f"{type_text} {p.name} - {p.price:,.0f} руб.\n"
-        return info
+        entries = [service_entry(s) for s in services] + [product_entry(p) for p in products]
+        _catalog_index = CatalogIndex(entries)
+        _catalog_index_built_at = loop.time()
     except Exception as e:
-        logging.error(f"Error getting products: {e}")
-        return ""
+        logging.error(f"Error building catalog index: {e}")
+        if _catalog_index is None:
+            return CatalogIndex([])
+    
+    return _catalog_index
 
 
-async def build_system_prompt() -> str:
-    services_info = await get_services_info()
-    products_info = await get_products_info()
-    
+def render_system_prompt(catalog_text: str) -> str:
     return f"""Ты - AI ассистент фотографа Марины Заугольниковой. Отвечай на русском.
 
-{services_info}
-{products_info}
+{catalog_text}
 
 Правила:
 - Отвечай кратко (2-3 предложения)
@@ -83,40 +102,176 @@ async def build_system_prompt() -> str:
 - Ссылка на запись: t.me/{config.MAIN_BOT_USERNAME}?start=booking"""
 
 
-async def get_ai_response(query: str) -> str:
+async def build_system_prompt(query: str = None) -> str:
+    """Системный промпт. С вопросом - только подходящие позиции каталога,
+    без вопроса - весь каталог"""
+    index = await get_catalog_index()
+    
+    if query is None:
+        return render_system_prompt(index.full_text())
+    return render_system_prompt(index.relevant_text(query, config.AI_CATALOG_TOP_K))
+
+
+async def request_model(session: aiohttp.ClientSession, model: str, messages: list) -> dict:
+    """Один запрос к OpenRouter. Бросает AIRequestError, если ответ не получен"""
+    headers = {
+        "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://t.me/MarinaZaugolnikova_bot",
+        "X-Title": "Marina Photo Bot"
+    }
+    
+    data = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": 300,
+        "temperature": 0.7
+    }
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
     try:
-        system_prompt = await build_system_prompt()
+        async with session.post(OPENROUTER_URL, headers=headers, json=data) as resp:
+            ttfb = loop.time() - started
+            if resp.status != 200:
+                error = await resp.text()
+                logging.error(f"OpenRouter error ({model}): {resp.status} - {error}")
+                raise AIRequestError(f"http_{resp.status}", error)
+            
+            result = await resp.json()
+            answer = result["choices"][0]["message"]["content"]
+            if not answer or not answer.strip():
+                raise AIRequestError("empty", f"Empty answer from {model}")
+    except asyncio.CancelledError:
+        ai_telemetry.record_attempt(model, "cancelled")
+        raise
+    except AIRequestError as e:
+        ai_telemetry.record_attempt(model, e.outcome)
+        raise
+    except Exception as e:
+        ai_telemetry.record_attempt(model, "error")
+        raise AIRequestError("error", f"{type(e).__name__}: {e}") from e
+    
+    ai_telemetry.record_attempt(model, "ok")
+    usage = result.get("usage") or {}
+    return {
+        "content": answer,
+        "model": model,
+        "started": started,
+        "ttfb": ttfb,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+    }
+
+
+async def request_with_cascade(messages: list, deadline: float) -> dict:
+    """Запрос по цепочке моделей с хеджированием.
+    
+    Сначала спрашиваем первую модель. Если за AI_HEDGE_DELAY ответа нет
+    (или модель вернула ошибку), параллельно спрашиваем следующую.
+    Побеждает первый нормальный ответ, остальные запросы отменяются.
+    """
+    loop = asyncio.get_running_loop()
+    models = list(MODELS)
+    pending = {}
+    last_error = None
+    
+    async with aiohttp.ClientSession() as session:
+        def launch_next():
+            model = models.pop(0)
+            task = asyncio.create_task(request_model(session, model, messages))
+            pending[task] = model
         
-        headers = {
-            "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://t.me/MarinaZaugolnikova_bot",
-            "X-Title": "Marina Photo Bot"
-        }
+        launch_next()
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("AI deadline exceeded")
+                
+                wait_for = min(config.AI_HEDGE_DELAY, remaining) if models else remaining
+                done, _ = await asyncio.wait(
+                    pending.keys(), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                    logging.warning(f"Model {model} failed: {last_error}")
+                
+                # Ошибка или медленный ответ - подключаем следующую модель
+                if models and loop.time() < deadline:
+                    launch_next()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    
+    raise last_error or AIRequestError("error", "No models available")
+
+
+async def get_ai_response(query: str, user_id: int = None, kind: str = "chat") -> str:
+    """Ответ AI. Если передан user_id, учитывается история диалога.
+    kind ("inline" или "chat") определяет лимит времени на ответ"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    timeout = config.AI_INLINE_DEADLINE if kind == "inline" else config.AI_CHAT_DEADLINE
+    deadline = started + timeout
+    record = AICallRecord(kind=kind)
+    
+    async def ask(history_user_id: int = None) -> dict:
+        system_prompt = await build_system_prompt(query)
+        messages = conversation_memory.build_messages(history_user_id, system_prompt, query)
+        prompt_ready = loop.time()
+        result = await request_with_cascade(messages, deadline)
+        result["prompt_build"] = prompt_ready - started
+        result["queue_wait"] = result["started"] - prompt_ready
+        return result
+    
+    try:
+        if user_id is not None and conversation_memory.has_history(user_id):
+            result = await ask(user_id)
+        else:
+            # Без истории ответ зависит только от вопроса: одинаковые
+            # одновременные вопросы отправляем в модель один раз. kind в ключе:
+            # общий вызов живёт до дедлайна ведущего, и чат не должен получать
+            # таймаут inline запроса
+            result, record.cache_hit = await asyncio.wait_for(
+                ai_flights.do((kind, normalize_question(query)), ask),
+                timeout=max(deadline - loop.time(), 0)
+            )
         
-        data = {
-            "model": MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
-            "max_tokens": 300,
-            "temperature": 0.7
-        }
+        record.model = result["model"]
+        if not record.cache_hit:
+            record.prompt_build_ms = result["prompt_build"] * 1000
+            record.queue_wait_ms = result["queue_wait"] * 1000
+            record.ttfb_ms = result["ttfb"] * 1000
+            record.prompt_tokens = result["prompt_tokens"]
+            record.completion_tokens = result["completion_tokens"]
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(OPENROUTER_URL, headers=headers, json=data) as resp:
-                if resp.status == 200:
-                    result = await resp.json()
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    error = await resp.text()
-                    logging.error(f"OpenRouter error: {resp.status} - {error}")
-                    raise Exception(error)
+        answer = result["content"]
+        if user_id is not None:
+            conversation_memory.add_exchange(user_id, query, answer)
+        return answer
         
+    except asyncio.CancelledError:
+        # Апдейт отменён (остановка бота) - не считаем вызов успешным
+        record.outcome = "cancelled"
+        raise
     except Exception as e:
-        logging.error(f"AI Error: {e}")
+        if isinstance(e, asyncio.TimeoutError):
+            record.outcome = "timeout"
+        else:
+            record.outcome = getattr(e, "outcome", "error")
+        logging.error(f"AI Error: {type(e).__name__}: {e}")
         return f"😔 Извините, не могу ответить.\n\nСвяжитесь с Мариной: @{config.MAIN_BOT_USERNAME}"
+    
+    finally:
+        record.total_ms = (loop.time() - started) * 1000
+        ai_telemetry.record(record)
 
 
 @dp.inline_query()
@@ -152,7 +307,7 @@ async def inline_ai_handler(inline_query: InlineQuery):
             )
         ]
     else:
-        ai_response = await get_ai_response(query)
+        ai_response = await get_ai_response(query, kind="inline")
         results.append(
             InlineQueryResultArticle(
                 id="ai_response",
@@ -174,11 +329,34 @@ async def inline_ai_handler(inline_query: InlineQuery):
     await inline_query.answer(results=results, cache_time=10, is_personal=True)
 
 
+@dp.message(Command("ai_stats"), F.from_user.id.in_(config.ADMIN_IDS))
+async def cmd_ai_stats(message: Message):
+    """Телеметрия AI запросов (только для админа)"""
+    await message.answer(ai_telemetry.summary(), parse_mode="HTML")
+
+
+@dp.message(Command("ai_export"), F.from_user.id.in_(config.ADMIN_IDS))
+async def cmd_ai_export(message: Message):
+    """Выгрузка телеметрии AI в файл (только для админа)"""
+    count = ai_telemetry.export(config.AI_TELEMETRY_EXPORT_PATH)
+    if not count:
+        await message.answer("Пока нет вызовов AI.")
+        return
+    
+    await message.answer_document(
+        FSInputFile(config.AI_TELEMETRY_EXPORT_PATH),
+        caption=f"📊 Телеметрия AI: {count} записей"
+    )
+
+
 @dp.message()
 async def handle_message(message):
     query = message.text
     
     if not query or query.startswith('/'):
+        if query and query.startswith('/start'):
+            conversation_memory.clear(message.from_user.id)
+        
         await message.answer(
             f"🤖 <b>AI Ассистент Марины</b>\n\nЗадайте вопрос о фотосессиях!",
             parse_mode="HTML",
@@ -188,8 +366,8 @@ async def handle_message(message):
         )
         return
     
-    await message.answer_chat_action("typing")
-    ai_response = await get_ai_response(query)
+    await message.bot.send_chat_action(message.chat.id, "typing")
+    ai_response = await get_ai_response(query, user_id=message.from_user.id, kind="chat")
     
     await message.answer(
         f"🤖 {ai_response}",
@@ -200,10 +378,15 @@ async def handle_message(message):
     )
 
 
-async def main():
+async def main(handle_signals: bool = True):
     logging.info("🤖 AI бот (OpenRouter) запускается...")
-    await dp.start_polling(bot)
+    await start_metrics_server(config.METRICS_HOST, config.AI_METRICS_PORT)
+    await bot.delete_webhook()
+    try:
+        await dp.start_polling(bot, handle_signals=handle_signals, close_bot_session=False)
+    finally:
+        await graceful_shutdown("ai_bot", [bot], polling_tasks(dp), config.SHUTDOWN_TIMEOUT)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run_process(main()))
@@ -0,0 +1,114 @@
+"""Бенчмарк вызовов Bot API на шаг карусели услуг/товаров.
+
+Карусель проходится вперёд до конца и обратно, каждый шаг - нажатие
+стрелки на сообщении, показанном предыдущим шагом. Сравниваются:
+
+    legacy - прежний способ: delete + answer_photo для карточек с фото
+    edit   - utils.carousel.show_card: edit_media / edit_caption / edit_text,
+             удаление и повторная отправка только при смене текст <-> фото
+
+Каталоги: все карточки с фото, без фото, вперемешку и с общей картинкой.
+Bot API заменён RecordingSession с задержкой. RecordingSession не
+проверяет тип сообщения: в "mixed" legacy делает edit_text на сообщении
+с фото, который настоящий Telegram отклонит, так что его цифры там
+занижены.
+
+Запуск:
+    python benchmarks/bench_carousel_calls.py [--items 10] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import Chat, InlineKeyboardButton, InlineKeyboardMarkup, Message, User
+
+from tools.fake_telegram import fake_bot
+from utils import carousel
+
+CATALOGS = {
+    "photos": lambda i: f"https://example.com/{i}.jpg",
+    "text": lambda i: None,
+    "mixed": lambda i: f"https://example.com/{i}.jpg" if i % 2 else None,
+    "same_photo": lambda i: "https://example.com/studio.jpg",
+}
+
+
+async def legacy_show_card(message: Message, text: str, reply_markup, photo_url=None, edit=False) -> Message:
+    """Прежняя отрисовка из main_bot: фото всегда через delete + answer_photo"""
+    if photo_url:
+        try:
+            if edit:
+                await message.delete()
+            return await message.answer_photo(photo=photo_url, caption=text, parse_mode="HTML",
+                                              reply_markup=reply_markup)
+        except Exception:
+            pass
+    if edit:
+        return await message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+    return await message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+
+
+def card(index: int, total: int):
+    text = f"📸 <b>Услуга {index}</b>\n\nОписание\n\n💰 <b>Стоимость:</b> {1000 * (index + 1):,.0f} руб."
+    kb = InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="⬅️", callback_data=f"service_nav:1:{max(index - 1, 0)}"),
+        InlineKeyboardButton(text=f"{index + 1}/{total}", callback_data="service_count"),
+        InlineKeyboardButton(text="➡️", callback_data=f"service_nav:1:{min(index + 1, total - 1)}"),
+    ]])
+    return text, kb
+
+
+async def run(mode: str, catalog_name: str, items: int, latency: float) -> dict:
+    show = legacy_show_card if mode == "legacy" else carousel.show_card
+    carousel._photo_ids.clear()
+    photo_for = CATALOGS[catalog_name]
+    bot = fake_bot(latency)
+
+    chat = Chat(id=1, type="private")
+    message = Message(message_id=1, date=datetime.now(), chat=chat,
+                      from_user=User(id=1, is_bot=False, first_name="Bench"), text="menu").as_(bot)
+    text, kb = card(0, items)
+    message = await show(message, text, kb, photo_url=photo_for(0), edit=True)
+    bot.session.reset()
+
+    path = list(range(1, items)) + list(range(items - 2, -1, -1))
+    started = time.perf_counter()
+    for index in path:
+        text, kb = card(index, items)
+        message = await show(message, text, kb, photo_url=photo_for(index), edit=True)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "steps": len(path),
+        "calls": bot.session.count(),
+        "elapsed": elapsed,
+        "methods": Counter(name for name, _ in bot.session.calls),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка вызова Bot API, секунды")
+    args = parser.parse_args()
+
+    print(f"Карточек: {args.items}, задержка Bot API: {args.latency * 1000:.0f} мс\n")
+    print(f"{'каталог':<12}{'режим':<8}{'вызовов/шаг':>13}{'мс/шаг':>9}  методы")
+    for catalog_name in CATALOGS:
+        for mode in ("legacy", "edit"):
+            r = await run(mode, catalog_name, args.items, args.latency)
+            methods = ", ".join(f"{name} {n}" for name, n in r["methods"].most_common())
+            print(
+                f"{catalog_name:<12}{mode:<8}{r['calls'] / r['steps']:>13.2f}"
+                f"{r['elapsed'] / r['steps'] * 1000:>9.1f}  {methods}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""Бенчмарк inline_handler в зависимости от размера каталога.
+
+Для каждого размера каталога в отдельной SQLite базе создаются услуги и
+товары, затем inline_handler вызывается с пустым запросом (@bot), "товары"
+и поиском. Первый запрос после смены версии собирает набор результатов,
+остальные отдаются из памяти. Отдельно меряется пересборка после
+изменения одной услуги. Bot API - RecordingSession, картинки прайса
+выключены (нет ADMIN_IDS).
+
+Запуск:
+    python benchmarks/bench_inline_results.py [--sizes 10,100,1000] [--queries 300]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db.name}"
+
+from aiogram.types import InlineQuery, User
+from sqlalchemy import delete, update
+
+from config import config
+from database import Product, Service, async_session, init_db
+from handlers import inline
+from tools.fake_telegram import fake_bot
+from utils.catalog import catalog
+
+
+async def fill(size: int):
+    async with async_session() as session:
+        await session.execute(delete(Service))
+        await session.execute(delete(Product))
+        for i in range(size):
+            session.add(Service(name=f"Услуга {i}", description="Описание " * 10, price=1000 + i,
+                                duration="1 час", is_active=True, order=i))
+            session.add(Product(name=f"Коллаж {i}", description="Описание " * 10, price=500 + i,
+                                product_type="digital" if i % 2 else "paper", is_active=True, order=i))
+        await catalog.bump(session)
+        await session.commit()
+
+
+async def timed_query(bot, text: str) -> float:
+    query = InlineQuery(id="1", from_user=User(id=1, is_bot=False, first_name="Bench"),
+                        query=text, offset="").as_(bot)
+    async with async_session() as session:
+        started = time.perf_counter()
+        await inline.inline_handler(query, session)
+        return time.perf_counter() - started
+
+
+async def run(size: int, queries: int) -> dict:
+    await fill(size)
+    bot = fake_bot()
+    cold = await timed_query(bot, "")
+    warm = [await timed_query(bot, "") for _ in range(queries)]
+    products = [await timed_query(bot, "товары") for _ in range(queries)]
+    search = [await timed_query(bot, "коллаж 1") for _ in range(min(queries, 50))]
+
+    # Одна услуга изменилась: новая версия, пересобирается одна карточка
+    async with async_session() as session:
+        await session.execute(update(Service).where(Service.order == 0).values(price=999))
+        await catalog.bump(session)
+        await session.commit()
+    built_before = inline.INLINE_RESULTS_BUILT.get("services")
+    rebuild = await timed_query(bot, "")
+    rebuilt = inline.INLINE_RESULTS_BUILT.get("services") - built_before
+
+    return {
+        "cold": cold, "rebuild": rebuild, "rebuilt": rebuilt,
+        "warm": statistics.median(warm), "products": statistics.median(products),
+        "search": statistics.median(search),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    config.ADMIN_IDS.clear()
+    await init_db()
+
+    print(f"{'каталог':>8}{'сборка, мс':>12}{'пересборка, мс':>16}{'карточек':>10}"
+          f"{'@bot, мкс':>11}{'товары, мкс':>13}{'поиск, мкс':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        r = await run(size, args.queries)
+        print(
+            f"{size:>8}{r['cold'] * 1000:>12.1f}{r['rebuild'] * 1000:>16.1f}{r['rebuilt']:>10.0f}"
+            f"{r['warm'] * 1e6:>11.0f}{r['products'] * 1e6:>13.0f}{r['search'] * 1e6:>12.0f}"
+        )
+    os.unlink(_db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
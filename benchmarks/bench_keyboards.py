@@ -0,0 +1,137 @@
+"""Бенчмарк фабрик клавиатур: сборка на каждый апдейт против кэша.
+
+Апдейт - набор клавиатур, которые обработчики строят на типичных шагах:
+карусель услуг и товаров, шаги записи, главное меню, админка и inline
+карточки. Для каждого апдейта считаются время и память, выделенная на
+клавиатуры (пик tracemalloc внутри апдейта), и сколько памяти держит
+кэш после прогона, в двух режимах:
+
+    build  - исходная фабрика (InlineKeyboardBuilder + модели pydantic)
+    cached - фабрика из keyboards.keyboards с cached_kb
+
+Запуск:
+    python benchmarks/bench_keyboards.py [--updates 20000] [--catalog 30]
+"""
+import argparse
+import inspect
+import random
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.methods import SendMessage
+
+from keyboards import keyboards as kb
+
+
+def make_updates(count: int, catalog: int, seed: int = 1):
+    """Вызовы фабрик по апдейтам: (фабрика, args, kwargs)"""
+    rnd = random.Random(seed)
+
+    def service_step():
+        index = rnd.randrange(catalog)
+        return [("services_navigation_kb", (index, catalog, index + 1),
+                 {"has_detail_page": True, "detail_page_url": f"https://example.com/s{index}", "version": 3})]
+
+    def product_step():
+        index = rnd.randrange(catalog)
+        return [("products_navigation_kb", (index, catalog, index + 1, "all"), {"version": 3})]
+
+    steps = [
+        service_step,
+        product_step,
+        lambda: [("booking_hours_kb", (), {})],
+        lambda: [("booking_people_kb", (), {})],
+        lambda: [("booking_confirm_kb", (), {})],
+        lambda: [("main_menu_kb", (rnd.random() < 0.05,), {})],
+        lambda: [("products_filter_kb", (), {})],
+        lambda: [("admin_panel_kb", (), {})],
+        lambda: [("inline_service_kb", (i + 1, "photo_bot"), {}) for i in range(min(catalog, 20))],
+    ]
+    weights = [30, 15, 8, 8, 8, 15, 6, 2, 8]
+    return [rnd.choices(steps, weights)[0]() for _ in range(count)]
+
+
+def _factories(updates, cached: bool) -> dict:
+    factories = {}
+    for calls in updates:
+        for name, _, _ in calls:
+            factory = getattr(kb, name)
+            if cached:
+                factory.cache_clear()
+                factories[name] = factory
+            else:
+                factories[name] = inspect.unwrap(factory)
+    return factories
+
+
+def run(updates, cached: bool) -> dict:
+    # Время - без tracemalloc, он сильно замедляет выделения
+    factories = _factories(updates, cached)
+    started = time.perf_counter()
+    for calls in updates:
+        for name, args, kwargs in calls:
+            factories[name](*args, **kwargs)
+    elapsed = time.perf_counter() - started
+
+    # Память: пик выделений внутри каждого апдейта и что осталось после прогона (кэш)
+    factories = _factories(updates, cached)
+    tracemalloc.start()
+    per_update = 0
+    for calls in updates:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        for name, args, kwargs in calls:
+            factories[name](*args, **kwargs)
+        per_update += tracemalloc.get_traced_memory()[1] - before
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"elapsed": elapsed, "per_update": per_update / len(updates), "retained": retained}
+
+
+def check_serialization(updates):
+    """Закэшированная клавиатура сериализуется в запрос так же, как собранная заново"""
+    checked = set()
+    for calls in updates:
+        for name, args, kwargs in calls:
+            if name in checked:
+                continue
+            checked.add(name)
+            cached = SendMessage(chat_id=1, text="x", reply_markup=getattr(kb, name)(*args, **kwargs))
+            built = SendMessage(chat_id=1, text="x", reply_markup=inspect.unwrap(getattr(kb, name))(*args, **kwargs))
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")  # предупреждения сериализатора pydantic - тоже ошибка
+                same = cached.model_dump() == built.model_dump()
+            if not same:
+                raise SystemExit(f"{name}: закэшированная клавиатура сериализуется иначе")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--catalog", type=int, default=30, help="услуг и товаров в каталоге")
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates, args.catalog)
+    check_serialization(updates)
+    calls = sum(len(u) for u in updates)
+    print(f"Апдейтов: {args.updates}, вызовов фабрик: {calls}, каталог: {args.catalog}\n")
+    print(f"{'режим':<8}{'мкс/апдейт':>12}{'выделено/апдейт, КБ':>21}{'удержано, КБ':>14}")
+    for mode in ("build", "cached"):
+        r = run(updates, cached=mode == "cached")
+        print(
+            f"{mode:<8}{r['elapsed'] / len(updates) * 1e6:>12.1f}"
+            f"{r['per_update'] / 1024:>21.1f}{r['retained'] / 1024:>14.0f}"
+        )
+
+    info = kb.services_navigation_kb.cache_info()
+    print(f"\nservices_navigation_kb: {info.currsize} в кэше, попаданий {info.hits}, промахов {info.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Replay-бенчмарк: сколько токенов промпта экономит подбор позиций каталога.
+
+Запуск:
+    python benchmarks/bench_prompt_trimming.py [--services 40] [--products 40]
+    python benchmarks/bench_prompt_trimming.py --questions questions.txt --live
+
+Файл вопросов: по строке на вопрос, ожидаемая позиция через " | "
+(например: "сколько стоит семейная съёмка? | Семейная фотосессия").
+Паритет ответа оффлайн = доля вопросов, где строка ожидаемой позиции
+есть и в полном, и в урезанном промпте. С --live оба промпта
+отправляются в модель и сравниваются названные в ответах цены.
+"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config
+from utils.catalog_index import CatalogIndex, service_entry, product_entry
+from utils.conversation import estimate_tokens
+
+SERVICE_NAMES = [
+    "Индивидуальная фотосессия", "Семейная фотосессия", "Love story", "Детская съёмка",
+    "Свадебная съёмка", "Репортаж с мероприятия", "Студийный портрет", "Беременность",
+    "Выпускной", "Контент для соцсетей", "Предметная съёмка", "Корпоративный портрет",
+]
+PRODUCT_NAMES = [
+    "Коллаж из 4 фото", "Коллаж из 9 фото", "Фотокнига", "Календарь", "Постер А3",
+    "Открытки", "Магнит", "Рамка с фото",
+]
+
+DEFAULT_QUESTIONS = [
+    ("Сколько стоит семейная фотосессия?", "Семейная фотосессия"),
+    ("а свадебная съёмка почём?", "Свадебная съёмка"),
+    ("Есть ли детская съёмка?", "Детская съёмка"),
+    ("Сколько стоит коллаж из 9 фото?", "Коллаж из 9 фото"),
+    ("Хочу фотокнигу, какая цена?", "Фотокнига"),
+    ("Снимаете выпускной?", "Выпускной"),
+    ("Нужен контент для соцсетей", "Контент для соцсетей"),
+    ("Можно заказать календарь?", "Календарь"),
+    ("love story сколько?", "Love story"),
+    ("Сколько стоит портрет в студии?", "Студийный портрет"),
+]
+
+
+def build_catalog(n_services: int, n_products: int) -> CatalogIndex:
+    entries = []
+    for i in range(n_services):
+        base = SERVICE_NAMES[i % len(SERVICE_NAMES)]
+        name = base if i < len(SERVICE_NAMES) else f"{base} {i // len(SERVICE_NAMES) + 1}"
+        entries.append(service_entry(SimpleNamespace(
+            name=name, price=3000 + 500 * i, duration="1-2 часа",
+            description=f"{base}: обработка фото, помощь с образом"
+        )))
+    for i in range(n_products):
+        base = PRODUCT_NAMES[i % len(PRODUCT_NAMES)]
+        name = base if i < len(PRODUCT_NAMES) else f"{base} {i // len(PRODUCT_NAMES) + 1}"
+        entries.append(product_entry(SimpleNamespace(
+            name=name, price=300 + 150 * i, product_type="digital" if i % 2 else "paper",
+            description=f"{base} на заказ"
+        )))
+    return CatalogIndex(entries)
+
+
+def load_questions(path: str):
+    questions = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        question, _, expected = line.partition("|")
+        questions.append((question.strip(), expected.strip() or None))
+    return questions
+
+
+def prices_in(text: str) -> set:
+    return {m.replace(" ", "").replace(",", "") for m in re.findall(r"\d[\d ,]{2,}\d", text)}
+
+
+async def run_live(full_prompts, trimmed_prompts):
+    from ai_bot import request_with_cascade
+
+    loop = asyncio.get_running_loop()
+    same = 0
+    for (question, full), trimmed in zip(full_prompts, trimmed_prompts):
+        answers = []
+        for prompt in (full, trimmed):
+            messages = [{"role": "system", "content": prompt}, {"role": "user", "content": question}]
+            try:
+                result = await request_with_cascade(messages, loop.time() + config.AI_CHAT_DEADLINE)
+                answers.append(result["content"])
+            except Exception as e:
+                answers.append(f"ERROR {e}")
+        match = prices_in(answers[0]) == prices_in(answers[1])
+        same += match
+        print(f"  {'=' if match else '≠'} {question}")
+    print(f"Паритет ответов (цены совпали): {same}/{len(full_prompts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--services", type=int, default=40)
+    parser.add_argument("--products", type=int, default=40)
+    parser.add_argument("--top-k", type=int, default=config.AI_CATALOG_TOP_K)
+    parser.add_argument("--questions")
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    from ai_bot import render_system_prompt
+
+    index = build_catalog(args.services, args.products)
+    questions = load_questions(args.questions) if args.questions else DEFAULT_QUESTIONS
+
+    full_prompt = render_system_prompt(index.full_text())
+    full_tokens = estimate_tokens(full_prompt)
+
+    trimmed_prompts = []
+    trimmed_tokens = []
+    parity = 0
+    checked = 0
+    started = time.perf_counter()
+    for question, expected in questions:
+        prompt = render_system_prompt(index.relevant_text(question, args.top_k))
+        trimmed_prompts.append(prompt)
+        trimmed_tokens.append(estimate_tokens(prompt))
+        # Позиции, которой нет и в полном каталоге, в паритете не учитываем
+        if expected is None or f" {expected} -" not in full_prompt:
+            continue
+        checked += 1
+        if f" {expected} -" in prompt:
+            parity += 1
+        else:
+            print(f"  ✗ нет позиции '{expected}' для вопроса: {question}")
+    elapsed = (time.perf_counter() - started) / len(questions) * 1000
+
+    avg_trimmed = sum(trimmed_tokens) / len(trimmed_tokens)
+    print(f"Каталог: {args.services} услуг, {args.products} товаров; вопросов: {len(questions)}")
+    print(f"Промпт целиком:  ~{full_tokens} токенов")
+    print(f"Промпт урезанный: ~{avg_trimmed:.0f} токенов в среднем (max {max(trimmed_tokens)})")
+    print(f"Сокращение: {100 * (1 - avg_trimmed / full_tokens):.1f}%")
+    print(f"Паритет (нужная позиция в промпте): {parity}/{checked}")
+    print(f"Поиск по индексу: {elapsed:.3f} мс на вопрос")
+
+    if args.live:
+        asyncio.run(run_live([(q, full_prompt) for q, _ in questions], trimmed_prompts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Бенчмарк обработки апдейтов основного бота под нагрузкой многих пользователей.
+
+Каждый пользователь проходит шаги записи из handlers/booking.py
+(имя, телефон, часы, количество людей, студия, дата, пожелания), все
+апдейты приходят сразу, вперемешку между пользователями - как пачка
+из getUpdates. Bot API заменён RecordingSession с задержкой.
+
+Режимы:
+    sequential - апдейты по одному (handle_as_tasks=False)
+    tasks      - стандартный aiogram: задача на каждый апдейт, без порядка
+    ordered    - OrderedDispatcher: параллельно между чатами, по порядку внутри чата
+
+Запуск:
+    python benchmarks/bench_update_concurrency.py [--users 200] [--latency 0.05] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from handlers import booking
+from handlers.booking import BookingStates, booking_data
+from tools.fake_telegram import fake_bot
+from utils.dispatcher import OrderedDispatcher
+
+STEPS = [
+    ("message", "Иван Петров"),
+    ("message", "+79990001122"),
+    ("callback", "booking_hours:2"),
+    ("callback", "booking_people:3"),
+    ("message", "Студия Свет"),
+    ("message", "25 декабря, 14:00"),
+    ("message", "Нет"),
+]
+EXPECTED = {
+    "first_name": "Иван", "phone": "+79990001122", "hours": "2", "people_count": "3",
+    "studio": "Студия Свет", "datetime_text": "25 декабря, 14:00", "wishes": "Нет",
+}
+
+
+def make_update(update_id: int, user_id: int, kind: str, payload: str) -> Update:
+    user = User(id=user_id, is_bot=False, first_name="Load")
+    chat = Chat(id=user_id, type="private")
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, from_user=user, text=payload)
+    if kind == "callback":
+        return Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id), from_user=user, chat_instance="bench", data=payload, message=message
+        ))
+    return Update(update_id=update_id, message=message)
+
+
+def build_dispatcher(mode: str, concurrency: int) -> Dispatcher:
+    storage = MemoryStorage()
+    if mode == "ordered":
+        dp = OrderedDispatcher(storage=storage, max_concurrency=concurrency)
+    else:
+        dp = Dispatcher(storage=storage)
+    # Один и тот же роутер подключаем к новому диспетчеру каждого прогона
+    booking.router._parent_router = None
+    dp.include_router(booking.router)
+    return dp
+
+
+async def run_mode(mode: str, users: int, latency: float, concurrency: int) -> dict:
+    bot = fake_bot(latency)
+    dp = build_dispatcher(mode, concurrency)
+
+    user_ids = list(range(10_000, 10_000 + users))
+    booking_data.clear()
+    for user_id in user_ids:
+        booking_data[user_id] = {}
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        await dp.storage.set_state(key, BookingStates.entering_name)
+
+    # Пачка апдейтов: первый шаг всех пользователей, затем второй и т.д.
+    updates = []
+    for kind, payload in STEPS:
+        for user_id in user_ids:
+            updates.append(make_update(len(updates) + 1, user_id, kind, payload))
+
+    started = time.perf_counter()
+    if mode == "sequential":
+        for update in updates:
+            await dp._process_update(bot, update)
+    else:
+        await asyncio.gather(*(dp._process_update(bot, update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    correct = 0
+    for user_id in user_ids:
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        state = await dp.storage.get_state(key)
+        data = booking_data.get(user_id, {})
+        if state == BookingStates.confirming.state and all(data.get(k) == v for k, v in EXPECTED.items()):
+            correct += 1
+
+    return {
+        "mode": mode,
+        "updates": len(updates),
+        "elapsed": elapsed,
+        "throughput": len(updates) / elapsed if elapsed else 0.0,
+        "correct": correct,
+        "users": users,
+        "api_calls": bot.session.count(),
+        "peak": getattr(dp, "peak_active", None),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка вызова Bot API, секунды")
+    parser.add_argument("--concurrency", type=int, default=32, help="лимит OrderedDispatcher")
+    parser.add_argument("--modes", default="sequential,tasks,ordered")
+    args = parser.parse_args()
+
+    print(f"Пользователей: {args.users}, шагов: {len(STEPS)}, задержка Bot API: {args.latency * 1000:.0f} мс\n")
+    print(f"{'режим':<12}{'время, с':>10}{'апд/с':>10}{'FSM верно':>14}{'вызовов API':>14}{'пик':>6}")
+    for mode in args.modes.split(","):
+        r = await run_mode(mode.strip(), args.users, args.latency, args.concurrency)
+        peak = "" if r["peak"] is None else str(r["peak"])
+        print(
+            f"{r['mode']:<12}{r['elapsed']:>10.2f}{r['throughput']:>10.0f}"
+            f"{r['correct']:>8}/{r['users']:<5}{r['api_calls']:>14}{peak:>6}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,12 +11,127 @@ class Config:
     AI_BOT_TOKEN: str = os.getenv("AI_BOT_TOKEN", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
+    OPENROUTER_URL: str = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
     ADMIN_IDS: List[int] = field(default_factory=list)
-    DATABASE_URL: str = "sqlite+aiosqlite:///marina_bot.db"
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///marina_bot.db")
     MAIN_BOT_USERNAME: str = os.getenv("MAIN_BOT_USERNAME", "MarinaZaugolnikova_bot")
     AI_BOT_USERNAME: str = os.getenv("AI_BOT_USERNAME", "AImarzau_bot")
     CONSTRUCTOR_URL: str = os.getenv("CONSTRUCTOR_URL", "https://medenchi.github.io/marina-constructor")
     PROXY_URL: str = os.getenv("PROXY_URL", "http://127.0.0.1:12334")
+    # Пул прокси через запятую (если не задан - один PROXY_URL, пустой - напрямую)
+    PROXY_URLS: List[str] = field(default_factory=lambda: [
+        p.strip() for p in os.getenv("PROXY_URLS", os.getenv("PROXY_URL", "http://127.0.0.1:12334")).split(",")
+        if p.strip()
+    ])
+    # Свой сервер Bot API (например локальный или фейковый для тестов)
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "")
+    
+    # HTTP соединения с Bot API
+    TG_CONNECTOR_LIMIT: int = int(os.getenv("TG_CONNECTOR_LIMIT", "100"))  # соединений на прокси
+    TG_CONNECTOR_LIMIT_PER_HOST: int = int(os.getenv("TG_CONNECTOR_LIMIT_PER_HOST", "0"))  # 0 - без лимита
+    TG_KEEPALIVE_TIMEOUT: float = float(os.getenv("TG_KEEPALIVE_TIMEOUT", "60"))  # секунды
+    TG_DNS_TTL: int = int(os.getenv("TG_DNS_TTL", "300"))  # секунды
+    TG_CONNECT_TIMEOUT: float = float(os.getenv("TG_CONNECT_TIMEOUT", "10"))
+    TG_REQUEST_TIMEOUT: float = float(os.getenv("TG_REQUEST_TIMEOUT", "60"))
+    TG_PROXY_HEALTH_INTERVAL: float = float(os.getenv("TG_PROXY_HEALTH_INTERVAL", "30"))
+    
+    # Ограничение исходящих сообщений Bot API (на бота)
+    TG_RATE_LIMIT_ENABLED: bool = os.getenv("TG_RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+    TG_GLOBAL_RATE: float = float(os.getenv("TG_GLOBAL_RATE", "25"))  # сообщений в секунду
+    TG_GLOBAL_BURST: float = float(os.getenv("TG_GLOBAL_BURST", "25"))
+    TG_CHAT_RATE: float = float(os.getenv("TG_CHAT_RATE", "1"))  # в личный чат, в секунду
+    TG_CHAT_BURST: float = float(os.getenv("TG_CHAT_BURST", "3"))
+    TG_GROUP_RATE: float = float(os.getenv("TG_GROUP_RATE", str(20 / 60)))  # в группу, в секунду
+    TG_RETRY_AFTER_ATTEMPTS: int = int(os.getenv("TG_RETRY_AFTER_ATTEMPTS", "3"))
+    
+    # Outbox уведомлений: воркеры доставки, опрос (секунды), попыток до dead
+    OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", "4"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+    # Окно сводки для админов (секунды): заявки и интерес к товарам за окно
+    # приходят одним сообщением. 0 - каждое уведомление отдельно
+    OUTBOX_DIGEST_WINDOW: int = int(os.getenv("OUTBOX_DIGEST_WINDOW", "0"))
+    
+    # Webhook режим: один aiohttp сервер для обоих ботов
+    WEBHOOK_ENABLED: bool = os.getenv("WEBHOOK_ENABLED", "").lower() in ("1", "true", "yes")
+    WEBHOOK_BASE_URL: str = os.getenv("WEBHOOK_BASE_URL", "")  # публичный https адрес
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    
+    # Параллельная обработка апдейтов основного бота: общий лимит
+    # одновременно обрабатываемых апдейтов, апдейты одного чата идут по порядку.
+    # 0 - обычная обработка aiogram
+    UPDATE_CONCURRENCY: int = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+    
+    # Локальный эндпоинт метрик Prometheus (GET /metrics), порт 0 - выключен.
+    # В webhook режиме метрики обоих ботов - на MAIN_METRICS_PORT, не на webhook порту
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    MAIN_METRICS_PORT: int = int(os.getenv("MAIN_METRICS_PORT", "9101"))
+    AI_METRICS_PORT: int = int(os.getenv("AI_METRICS_PORT", "9102"))
+    
+    # Профилировщик из админки: длительность по умолчанию и шаг семплирования (секунды)
+    PROFILER_SECONDS: int = int(os.getenv("PROFILER_SECONDS", "30"))
+    PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+    
+    # Учёт SQL по обработчикам: бюджет запросов на один вызов обработчика
+    # (не на апдейт: фильтры и outer middleware не считаются; 0 - без бюджета)
+    # и сколько одинаковых запросов за вызов считать подозрением на N+1.
+    # В DEV_MODE превышение бюджета - исключение (после commit сессии апдейта,
+    # записи обработчика сохраняются), иначе предупреждение в лог
+    DEV_MODE: bool = os.getenv("DEV_MODE", "").lower() in ("1", "true", "yes")
+    SQL_QUERY_BUDGET: int = int(os.getenv("SQL_QUERY_BUDGET", "10"))
+    SQL_REPEAT_THRESHOLD: int = int(os.getenv("SQL_REPEAT_THRESHOLD", "3"))
+    
+    # Сколько ждать обработчики и досылку outbox при остановке (секунды)
+    SHUTDOWN_TIMEOUT: float = float(os.getenv("SHUTDOWN_TIMEOUT", "15"))
+    
+    # Логирование: запись уходит в очередь, вывод делает фоновый поток.
+    # LOG_LEVELS - уровни отдельных логгеров: "aiogram.event=WARNING,sqlalchemy.engine=INFO".
+    # Одинаковые предупреждения/ошибки с одного места пишутся раз в LOG_REPEAT_WINDOW секунд
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text / json
+    LOG_FILE: str = os.getenv("LOG_FILE", "")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_REPEAT_WINDOW: float = float(os.getenv("LOG_REPEAT_WINDOW", "60"))
+    
+    # Супервизор run_all (секунды)
+    SUPERVISOR_BACKOFF_MIN: float = float(os.getenv("SUPERVISOR_BACKOFF_MIN", "1"))
+    SUPERVISOR_BACKOFF_MAX: float = float(os.getenv("SUPERVISOR_BACKOFF_MAX", "60"))
+    SUPERVISOR_STABLE_AFTER: float = float(os.getenv("SUPERVISOR_STABLE_AFTER", "60"))
+    SUPERVISOR_REPORT_INTERVAL: float = float(os.getenv("SUPERVISOR_REPORT_INTERVAL", "60"))
+    SUPERVISOR_STOP_TIMEOUT: float = float(os.getenv("SUPERVISOR_STOP_TIMEOUT", "20"))
+    
+    # Память диалога AI ассистента
+    AI_HISTORY_TOKEN_BUDGET: int = int(os.getenv("AI_HISTORY_TOKEN_BUDGET", "600"))
+    AI_HISTORY_TTL: int = int(os.getenv("AI_HISTORY_TTL", "1800"))  # секунды
+    
+    # Модели OpenRouter в порядке приоритета и лимиты времени (секунды)
+    AI_MODELS: List[str] = field(default_factory=lambda: [
+        m.strip() for m in os.getenv(
+            "AI_MODELS",
+            "openai/gpt-oss-20b:free,meta-llama/llama-3.3-70b-instruct:free"
+        ).split(",") if m.strip()
+    ])
+    AI_INLINE_DEADLINE: float = float(os.getenv("AI_INLINE_DEADLINE", "8"))
+    AI_CHAT_DEADLINE: float = float(os.getenv("AI_CHAT_DEADLINE", "30"))
+    AI_HEDGE_DELAY: float = float(os.getenv("AI_HEDGE_DELAY", "3"))
+    
+    # Сколько позиций каталога отправлять в промпт и как часто обновлять индекс
+    AI_CATALOG_TOP_K: int = int(os.getenv("AI_CATALOG_TOP_K", "5"))
+    CATALOG_INDEX_TTL: int = int(os.getenv("CATALOG_INDEX_TTL", "60"))
+    # Как часто сверять версию каталога для карусели с БД (секунды)
+    CATALOG_VERSION_CHECK: float = float(os.getenv("CATALOG_VERSION_CHECK", "5"))
+    # Сколько inline запросов (со всеми страницами) держать в кэше
+    INLINE_PAGE_CACHE_SIZE: int = int(os.getenv("INLINE_PAGE_CACHE_SIZE", "256"))
+    # Картинка прайса/каталога не загрузилась - через сколько секунд пробовать
+    # снова (дальше интервал удваивается до 30 минут), до тех пор отдаём текст
+    INLINE_IMAGE_RETRY: float = float(os.getenv("INLINE_IMAGE_RETRY", "60"))
+    
+    # Файл для выгрузки телеметрии AI (/ai_export)
+    AI_TELEMETRY_EXPORT_PATH: str = os.getenv("AI_TELEMETRY_EXPORT_PATH", "ai_telemetry.jsonl")
     
     def __post_init__(self):
         admin_id = os.getenv("ADMIN_ID")
@@ -1,9 +1,16 @@
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import select, func
-from database import Service, Product, Booking, async_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from database import Service, Product, Booking
 from keyboards.keyboards import (
     admin_panel_kb,
     admin_services_kb,
@@ -12,9 +19,16 @@ from keyboards.keyboards import (
     admin_product_edit_kb,
     admin_bookings_kb,
     admin_booking_view_kb,
+    admin_profiler_kb,
     main_menu_kb
 )
 from config import config
+from utils.outbox import enqueue, outbox
+from utils import profiler
+from utils.catalog import catalog
+from utils.tg_session import api_timings
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
@@ -113,17 +127,16 @@ async def admin_deeplinks(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "admin_deeplinks_services")
-async def admin_deeplinks_services(callback: CallbackQuery):
+async def admin_deeplinks_services(callback: CallbackQuery, session: AsyncSession):
     """Ссылки на услуги"""
     if not is_admin(callback.from_user.id):
         return
     
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
-    async with async_session() as session:
-        query = select(Service).where(Service.is_active == True).order_by(Service.order)
-        result = await session.execute(query)
-        services = result.scalars().all()
+    query = select(Service).where(Service.is_active == True).order_by(Service.order)
+    result = await session.execute(query)
+    services = result.scalars().all()
     
     text = "📸 <b>Ссылки на услуги:</b>\n\n"
     
@@ -143,17 +156,16 @@ async def admin_deeplinks_services(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "admin_deeplinks_products")
-async def admin_deeplinks_products(callback: CallbackQuery):
+async def admin_deeplinks_products(callback: CallbackQuery, session: AsyncSession):
     """Ссылки на товары"""
     if not is_admin(callback.from_user.id):
         return
     
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
-    async with async_session() as session:
-        query = select(Product).where(Product.is_active == True).order_by(Product.order)
-        result = await session.execute(query)
-        products = result.scalars().all()
+    query = select(Product).where(Product.is_active == True).order_by(Product.order)
+    result = await session.execute(query)
+    products = result.scalars().all()
     
     text = "🎨 <b>Ссылки на товары:</b>\n\n"
     
@@ -257,15 +269,14 @@ async def process_deeplink_button(message: Message, state: FSMContext):
 # ============ УПРАВЛЕНИЕ УСЛУГАМИ ============
 
 @router.callback_query(F.data == "admin_services")
-async def admin_services(callback: CallbackQuery):
+async def admin_services(callback: CallbackQuery, session: AsyncSession):
     """Список услуг"""
     if not is_admin(callback.from_user.id):
         return
     
-    async with async_session() as session:
-        query = select(Service).order_by(Service.order)
-        result = await session.execute(query)
-        services = result.scalars().all()
+    query = select(Service).order_by(Service.order)
+    result = await session.execute(query)
+    services = result.scalars().all()
     
     await callback.message.edit_text(
         "📸 <b>Управление услугами</b>\n\n"
@@ -352,42 +363,42 @@ async def admin_add_service_duration(message: Message, state: FSMContext):
 
 
 @router.message(AdminStates.adding_service_photo, F.photo)
-async def admin_add_service_photo(message: Message, state: FSMContext):
+async def admin_add_service_photo(message: Message, state: FSMContext, session: AsyncSession):
     """Фото услуги"""
     photo_id = message.photo[-1].file_id
     admin_temp_data[message.from_user.id]["photo_url"] = photo_id
-    await save_new_service(message, state)
+    await save_new_service(message, state, session)
 
 
 @router.message(AdminStates.adding_service_photo)
-async def admin_add_service_skip_photo(message: Message, state: FSMContext):
+async def admin_add_service_skip_photo(message: Message, state: FSMContext, session: AsyncSession):
     """Пропуск фото"""
     if message.text.lower() in ["пропустить", "skip", "-"]:
         admin_temp_data[message.from_user.id]["photo_url"] = None
-        await save_new_service(message, state)
+        await save_new_service(message, state, session)
     else:
         await message.answer("Отправьте фото или напишите 'пропустить'")
 
 
-async def save_new_service(message: Message, state: FSMContext):
+async def save_new_service(message: Message, state: FSMContext, session: AsyncSession):
     """Сохранение новой услуги"""
     data = admin_temp_data.get(message.from_user.id, {})
     
-    async with async_session() as session:
-        max_order = await session.execute(select(func.max(Service.order)))
-        new_order = (max_order.scalar() or 0) + 1
-        
-        service = Service(
-            name=data.get("name"),
-            description=data.get("description"),
-            price=data.get("price"),
-            duration=data.get("duration"),
-            photo_url=data.get("photo_url"),
-            order=new_order,
-            is_active=True
-        )
-        session.add(service)
-        await session.commit()
+    max_order = await session.execute(select(func.max(Service.order)))
+    new_order = (max_order.scalar() or 0) + 1
+    
+    service = Service(
+        name=data.get("name"),
+        description=data.get("description"),
+        price=data.get("price"),
+        duration=data.get("duration"),
+        photo_url=data.get("photo_url"),
+        order=new_order,
+        is_active=True
+    )
+    session.add(service)
+    await catalog.bump(session)
+    await session.commit()
     
     admin_temp_data.pop(message.from_user.id, None)
     await state.clear()
@@ -400,15 +411,14 @@ async def save_new_service(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_service_edit:"))
-async def admin_edit_service(callback: CallbackQuery):
+async def admin_edit_service(callback: CallbackQuery, session: AsyncSession):
     """Редактирование услуги"""
     if not is_admin(callback.from_user.id):
         return
     
     service_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
+    service = await session.get(Service, service_id)
     
     if not service:
         await callback.answer("Услуга не найдена", show_alert=True)
@@ -434,47 +444,46 @@ async def admin_edit_service(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_se_toggle:"))
-async def admin_toggle_service(callback: CallbackQuery):
+async def admin_toggle_service(callback: CallbackQuery, session: AsyncSession):
     """Переключение активности услуги"""
     if not is_admin(callback.from_user.id):
         return
     
     service_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
-        if service:
-            service.is_active = not service.is_active
-            await session.commit()
-            status = "активирована ✅" if service.is_active else "деактивирована ❌"
-            await callback.answer(f"Услуга {status}")
+    service = await session.get(Service, service_id)
+    if service:
+        service.is_active = not service.is_active
+        await catalog.bump(session)
+        await session.commit()
+        status = "активирована ✅" if service.is_active else "деактивирована ❌"
+        await callback.answer(f"Услуга {status}")
     
     # Обновляем сообщение
     callback.data = f"admin_service_edit:{service_id}"
-    await admin_edit_service(callback)
+    await admin_edit_service(callback, session)
 
 
 @router.callback_query(F.data.startswith("admin_se_delete:"))
-async def admin_delete_service(callback: CallbackQuery):
+async def admin_delete_service(callback: CallbackQuery, session: AsyncSession):
     """Удаление услуги"""
     if not is_admin(callback.from_user.id):
         return
     
     service_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
-        if service:
-            await session.delete(service)
-            await session.commit()
+    service = await session.get(Service, service_id)
+    if service:
+        await session.delete(service)
+        await catalog.bump(session)
     
-    await callback.answer("Услуга удалена! 🗑")
+    # Возвращаемся к списку - читаем в той же транзакции, удалённая услуга уже не видна
+    query = select(Service).order_by(Service.order)
+    result = await session.execute(query)
+    services = result.scalars().all()
+    await session.commit()
     
-    # Возвращаемся к списку
-    async with async_session() as session:
-        query = select(Service).order_by(Service.order)
-        result = await session.execute(query)
-        services = result.scalars().all()
+    await callback.answer("Услуга удалена! 🗑")
     
     await callback.message.edit_text(
         "📸 <b>Управление услугами</b>",
@@ -486,15 +495,14 @@ async def admin_delete_service(callback: CallbackQuery):
 # ============ ПОДРОБНАЯ СТРАНИЦА УСЛУГИ ============
 
 @router.callback_query(F.data.startswith("admin_se_detail:"))
-async def admin_service_detail(callback: CallbackQuery, state: FSMContext):
+async def admin_service_detail(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Добавление/редактирование подробной страницы услуги"""
     if not is_admin(callback.from_user.id):
         return
     
     service_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
+    service = await session.get(Service, service_id)
     
     if not service:
         await callback.answer("Услуга не найдена", show_alert=True)
@@ -600,7 +608,7 @@ async def admin_service_detail_manual(callback: CallbackQuery, state: FSMContext
 
 
 @router.message(AdminStates.editing_service_detail_page)
-async def process_service_detail_page_url(message: Message, state: FSMContext):
+async def process_service_detail_page_url(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка ссылки на страницу услуги"""
     if not is_admin(message.from_user.id):
         return
@@ -622,14 +630,14 @@ async def process_service_detail_page_url(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
-        if service:
-            service.detail_page_url = url
-            await session.commit()
-            service_name = service.name
-        else:
-            service_name = "Услуга"
+    service = await session.get(Service, service_id)
+    if service:
+        service.detail_page_url = url
+        await catalog.bump(session)
+        await session.commit()
+        service_name = service.name
+    else:
+        service_name = "Услуга"
     
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
@@ -653,37 +661,36 @@ async def process_service_detail_page_url(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_se_detail_delete:"))
-async def admin_delete_service_detail_page(callback: CallbackQuery):
+async def admin_delete_service_detail_page(callback: CallbackQuery, session: AsyncSession):
     """Удаление ссылки на страницу услуги"""
     if not is_admin(callback.from_user.id):
         return
     
     service_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
-        if service:
-            service.detail_page_url = None
-            await session.commit()
+    service = await session.get(Service, service_id)
+    if service:
+        service.detail_page_url = None
+        await catalog.bump(session)
+        await session.commit()
     
     await callback.answer("Страница удалена! ✅")
     
     callback.data = f"admin_service_edit:{service_id}"
-    await admin_edit_service(callback)
+    await admin_edit_service(callback, session)
 
 
 # ============ УПРАВЛЕНИЕ ТОВАРАМИ ============
 
 @router.callback_query(F.data == "admin_products")
-async def admin_products(callback: CallbackQuery):
+async def admin_products(callback: CallbackQuery, session: AsyncSession):
     """Список товаров"""
     if not is_admin(callback.from_user.id):
         return
     
-    async with async_session() as session:
-        query = select(Product).order_by(Product.order)
-        result = await session.execute(query)
-        products = result.scalars().all()
+    query = select(Product).order_by(Product.order)
+    result = await session.execute(query)
+    products = result.scalars().all()
     
     await callback.message.edit_text(
         "🎨 <b>Управление товарами</b>\n\n"
@@ -766,37 +773,37 @@ async def admin_add_product_price(message: Message, state: FSMContext):
 
 
 @router.message(AdminStates.adding_product_photo, F.photo)
-async def admin_add_product_photo(message: Message, state: FSMContext):
+async def admin_add_product_photo(message: Message, state: FSMContext, session: AsyncSession):
     photo_id = message.photo[-1].file_id
     admin_temp_data[message.from_user.id]["photo_url"] = photo_id
-    await save_new_product(message, state)
+    await save_new_product(message, state, session)
 
 
 @router.message(AdminStates.adding_product_photo)
-async def admin_add_product_skip_photo(message: Message, state: FSMContext):
+async def admin_add_product_skip_photo(message: Message, state: FSMContext, session: AsyncSession):
     if message.text.lower() in ["пропустить", "skip", "-"]:
         admin_temp_data[message.from_user.id]["photo_url"] = None
-        await save_new_product(message, state)
+        await save_new_product(message, state, session)
 
 
-async def save_new_product(message: Message, state: FSMContext):
+async def save_new_product(message: Message, state: FSMContext, session: AsyncSession):
     data = admin_temp_data.get(message.from_user.id, {})
     
-    async with async_session() as session:
-        max_order = await session.execute(select(func.max(Product.order)))
-        new_order = (max_order.scalar() or 0) + 1
-        
-        product = Product(
-            name=data.get("name"),
-            description=data.get("description"),
-            price=data.get("price"),
-            product_type=data.get("product_type"),
-            photo_url=data.get("photo_url"),
-            order=new_order,
-            is_active=True
-        )
-        session.add(product)
-        await session.commit()
+    max_order = await session.execute(select(func.max(Product.order)))
+    new_order = (max_order.scalar() or 0) + 1
+    
+    product = Product(
+        name=data.get("name"),
+        description=data.get("description"),
+        price=data.get("price"),
+        product_type=data.get("product_type"),
+        photo_url=data.get("photo_url"),
+        order=new_order,
+        is_active=True
+    )
+    session.add(product)
+    await catalog.bump(session)
+    await session.commit()
     
     admin_temp_data.pop(message.from_user.id, None)
     await state.clear()
@@ -809,15 +816,14 @@ async def save_new_product(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_product_edit:"))
-async def admin_edit_product(callback: CallbackQuery):
+async def admin_edit_product(callback: CallbackQuery, session: AsyncSession):
     """Редактирование товара"""
     if not is_admin(callback.from_user.id):
         return
     
     product_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
+    product = await session.get(Product, product_id)
     
     if not product:
         await callback.answer("Товар не найден", show_alert=True)
@@ -844,45 +850,44 @@ async def admin_edit_product(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_pe_toggle:"))
-async def admin_toggle_product(callback: CallbackQuery):
+async def admin_toggle_product(callback: CallbackQuery, session: AsyncSession):
     """Переключение активности товара"""
     if not is_admin(callback.from_user.id):
         return
     
     product_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
-        if product:
-            product.is_active = not product.is_active
-            await session.commit()
-            status = "активирован ✅" if product.is_active else "деактивирован ❌"
-            await callback.answer(f"Товар {status}")
+    product = await session.get(Product, product_id)
+    if product:
+        product.is_active = not product.is_active
+        await catalog.bump(session)
+        await session.commit()
+        status = "активирован ✅" if product.is_active else "деактивирован ❌"
+        await callback.answer(f"Товар {status}")
     
     callback.data = f"admin_product_edit:{product_id}"
-    await admin_edit_product(callback)
+    await admin_edit_product(callback, session)
 
 
 @router.callback_query(F.data.startswith("admin_pe_delete:"))
-async def admin_delete_product(callback: CallbackQuery):
+async def admin_delete_product(callback: CallbackQuery, session: AsyncSession):
     """Удаление товара"""
     if not is_admin(callback.from_user.id):
         return
     
     product_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
-        if product:
-            await session.delete(product)
-            await session.commit()
+    product = await session.get(Product, product_id)
+    if product:
+        await session.delete(product)
+        await catalog.bump(session)
     
-    await callback.answer("Товар удалён! 🗑")
+    query = select(Product).order_by(Product.order)
+    result = await session.execute(query)
+    products = result.scalars().all()
+    await session.commit()
     
-    async with async_session() as session:
-        query = select(Product).order_by(Product.order)
-        result = await session.execute(query)
-        products = result.scalars().all()
+    await callback.answer("Товар удалён! 🗑")
     
     await callback.message.edit_text(
         "🎨 <b>Управление товарами</b>",
@@ -894,15 +899,14 @@ async def admin_delete_product(callback: CallbackQuery):
 # ============ ПОДРОБНАЯ СТРАНИЦА ТОВАРА ============
 
 @router.callback_query(F.data.startswith("admin_pe_detail:"))
-async def admin_product_detail(callback: CallbackQuery, state: FSMContext):
+async def admin_product_detail(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Добавление/редактирование подробной страницы товара"""
     if not is_admin(callback.from_user.id):
         return
     
     product_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
+    product = await session.get(Product, product_id)
     
     if not product:
         await callback.answer("Товар не найден", show_alert=True)
@@ -976,7 +980,7 @@ async def admin_product_detail_manual(callback: CallbackQuery, state: FSMContext
 
 
 @router.message(AdminStates.editing_product_detail_page)
-async def process_product_detail_page_url(message: Message, state: FSMContext):
+async def process_product_detail_page_url(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка ссылки на страницу товара"""
     if not is_admin(message.from_user.id):
         return
@@ -995,14 +999,14 @@ async def process_product_detail_page_url(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
-        if product:
-            product.detail_page_url = url
-            await session.commit()
-            product_name = product.name
-        else:
-            product_name = "Товар"
+    product = await session.get(Product, product_id)
+    if product:
+        product.detail_page_url = url
+        await catalog.bump(session)
+        await session.commit()
+        product_name = product.name
+    else:
+        product_name = "Товар"
     
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
@@ -1025,37 +1029,36 @@ async def process_product_detail_page_url(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_pe_detail_delete:"))
-async def admin_delete_product_detail_page(callback: CallbackQuery):
+async def admin_delete_product_detail_page(callback: CallbackQuery, session: AsyncSession):
     """Удаление ссылки на страницу товара"""
     if not is_admin(callback.from_user.id):
         return
     
     product_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
-        if product:
-            product.detail_page_url = None
-            await session.commit()
+    product = await session.get(Product, product_id)
+    if product:
+        product.detail_page_url = None
+        await catalog.bump(session)
+        await session.commit()
     
     await callback.answer("Страница удалена! ✅")
     
     callback.data = f"admin_product_edit:{product_id}"
-    await admin_edit_product(callback)
+    await admin_edit_product(callback, session)
 
 
 # ============ УПРАВЛЕНИЕ ЗАЯВКАМИ ============
 
 @router.callback_query(F.data == "admin_bookings")
-async def admin_bookings(callback: CallbackQuery):
+async def admin_bookings(callback: CallbackQuery, session: AsyncSession):
     """Список заявок"""
     if not is_admin(callback.from_user.id):
         return
     
-    async with async_session() as session:
-        query = select(Booking).order_by(Booking.created_at.desc()).limit(10)
-        result = await session.execute(query)
-        bookings = result.scalars().all()
+    query = select(Booking).order_by(Booking.created_at.desc()).limit(10)
+    result = await session.execute(query)
+    bookings = result.scalars().all()
     
     if not bookings:
         await callback.message.edit_text(
@@ -1075,20 +1078,18 @@ async def admin_bookings(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_booking_view:"))
-async def admin_view_booking(callback: CallbackQuery):
+async def admin_view_booking(callback: CallbackQuery, session: AsyncSession):
     """Просмотр заявки"""
     if not is_admin(callback.from_user.id):
         return
     
     booking_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        booking = await session.get(Booking, booking_id)
-        if booking and booking.service_id:
-            service = await session.get(Service, booking.service_id)
-            service_name = service.name if service else "Не указана"
-        else:
-            service_name = "Не указана"
+    # populate_existing: после смены статуса заявка уже в сессии, но без загруженной услуги
+    booking = await session.get(
+        Booking, booking_id, options=[joinedload(Booking.service)], populate_existing=True
+    )
+    service_name = booking.service.name if booking and booking.service else "Не указана"
     
     if not booking:
         await callback.answer("Заявка не найдена", show_alert=True)
@@ -1128,77 +1129,67 @@ async def admin_view_booking(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_b_confirm:"))
-async def admin_confirm_booking(callback: CallbackQuery):
+async def admin_confirm_booking(callback: CallbackQuery, session: AsyncSession):
     """Подтверждение заявки"""
     booking_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        booking = await session.get(Booking, booking_id)
-        if booking:
-            booking.status = "confirmed"
-            await session.commit()
-            
-            # Уведомляем клиента
-            from main_bot import bot
-            try:
-                await bot.send_message(
-                    booking.user_id,
-                    f"✅ <b>Ваша заявка #{booking_id} подтверждена!</b>\n\n"
-                    "Марина скоро свяжется с вами для уточнения деталей.",
-                    parse_mode="HTML"
-                )
-            except:
-                pass
+    booking = await session.get(Booking, booking_id)
+    if booking:
+        booking.status = "confirmed"
+        # Уведомляем клиента - в той же транзакции, что и смена статуса
+        enqueue(
+            session,
+            booking.user_id,
+            f"✅ <b>Ваша заявка #{booking_id} подтверждена!</b>\n\n"
+            "Марина скоро свяжется с вами для уточнения деталей."
+        )
+        await session.commit()
+        outbox.wake()
     
     await callback.answer("Заявка подтверждена!")
     
     callback.data = f"admin_booking_view:{booking_id}"
-    await admin_view_booking(callback)
+    await admin_view_booking(callback, session)
 
 
 @router.callback_query(F.data.startswith("admin_b_complete:"))
-async def admin_complete_booking(callback: CallbackQuery):
+async def admin_complete_booking(callback: CallbackQuery, session: AsyncSession):
     """Завершение заявки"""
     booking_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        booking = await session.get(Booking, booking_id)
-        if booking:
-            booking.status = "completed"
-            await session.commit()
+    booking = await session.get(Booking, booking_id)
+    if booking:
+        booking.status = "completed"
+        await session.commit()
     
     await callback.answer("Заявка завершена!")
     
     callback.data = f"admin_booking_view:{booking_id}"
-    await admin_view_booking(callback)
+    await admin_view_booking(callback, session)
 
 
 @router.callback_query(F.data.startswith("admin_b_cancel:"))
-async def admin_cancel_booking(callback: CallbackQuery):
+async def admin_cancel_booking(callback: CallbackQuery, session: AsyncSession):
     """Отмена заявки"""
     booking_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        booking = await session.get(Booking, booking_id)
-        if booking:
-            booking.status = "cancelled"
-            await session.commit()
-            
-            from main_bot import bot
-            try:
-                await bot.send_message(
-                    booking.user_id,
-                    f"❌ <b>Ваша заявка #{booking_id} отменена.</b>\n\n"
-                    "Если у вас есть вопросы, свяжитесь с фотографом.",
-                    parse_mode="HTML"
-                )
-            except:
-                pass
+    booking = await session.get(Booking, booking_id)
+    if booking:
+        booking.status = "cancelled"
+        # Уведомляем клиента - в той же транзакции, что и смена статуса
+        enqueue(
+            session,
+            booking.user_id,
+            f"❌ <b>Ваша заявка #{booking_id} отменена.</b>\n\n"
+            "Если у вас есть вопросы, свяжитесь с фотографом."
+        )
+        await session.commit()
+        outbox.wake()
     
     await callback.answer("Заявка отменена")
     
     callback.data = f"admin_booking_view:{booking_id}"
-    await admin_view_booking(callback)
+    await admin_view_booking(callback, session)
 
 
 @router.callback_query(F.data.startswith("admin_b_message:"))
@@ -1229,12 +1220,11 @@ async def admin_message_client_start(callback: CallbackQuery, state: FSMContext)
 
 
 @router.message(AdminStates.messaging_client)
-async def admin_send_message_to_client(message: Message, state: FSMContext):
+async def admin_send_message_to_client(message: Message, state: FSMContext, session: AsyncSession):
     """Отправка сообщения клиенту"""
     if not is_admin(message.from_user.id):
         return
     
-    from main_bot import bot
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
     data = admin_temp_data.get(message.from_user.id, {})
@@ -1245,8 +1235,7 @@ async def admin_send_message_to_client(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    async with async_session() as session:
-        booking = await session.get(Booking, booking_id)
+    booking = await session.get(Booking, booking_id)
     
     if not booking:
         await message.answer("❌ Заявка не найдена")
@@ -1254,7 +1243,7 @@ async def admin_send_message_to_client(message: Message, state: FSMContext):
         return
     
     try:
-        await bot.send_message(
+        await message.bot.send_message(
             booking.user_id,
             f"💬 <b>Сообщение от фотографа:</b>\n\n{message.text}",
             parse_mode="HTML"
@@ -1283,55 +1272,40 @@ async def admin_send_message_to_client(message: Message, state: FSMContext):
 # ============ СТАТИСТИКА ============
 
 @router.callback_query(F.data == "admin_stats")
-async def admin_stats(callback: CallbackQuery):
+async def admin_stats(callback: CallbackQuery, session: AsyncSession):
     """Статистика"""
     if not is_admin(callback.from_user.id):
         return
     
-    async with async_session() as session:
-        total_bookings = await session.execute(select(func.count(Booking.id)))
-        total = total_bookings.scalar()
-        
-        new_count = await session.execute(
-            select(func.count(Booking.id)).where(Booking.status == "new")
-        )
-        confirmed_count = await session.execute(
-            select(func.count(Booking.id)).where(Booking.status == "confirmed")
-        )
-        completed_count = await session.execute(
-            select(func.count(Booking.id)).where(Booking.status == "completed")
-        )
-        cancelled_count = await session.execute(
-            select(func.count(Booking.id)).where(Booking.status == "cancelled")
-        )
-        
-        services_count = await session.execute(
-            select(func.count(Service.id)).where(Service.is_active == True)
-        )
-        products_count = await session.execute(
-            select(func.count(Product.id)).where(Product.is_active == True)
-        )
-        
-        # Считаем услуги с подробными страницами
-        services_with_pages = await session.execute(
-            select(func.count(Service.id)).where(
-                Service.is_active == True,
-                Service.detail_page_url.isnot(None)
-            )
-        )
+    result = await session.execute(
+        select(Booking.status, func.count(Booking.id)).group_by(Booking.status)
+    )
+    by_status = dict(result.all())
+    
+    services_count, services_with_pages = (await session.execute(
+        select(func.count(Service.id), func.count(Service.detail_page_url))
+        .where(Service.is_active == True)
+    )).one()
+    products_count = await session.scalar(
+        select(func.count(Product.id)).where(Product.is_active == True)
+    )
     
     text = f"""📊 <b>Статистика</b>
 
 📋 <b>Заявки:</b>
-• Всего: {total}
-• 🆕 Новых: {new_count.scalar()}
-• ✅ Подтверждённых: {confirmed_count.scalar()}
-• ✨ Завершённых: {completed_count.scalar()}
-• ❌ Отменённых: {cancelled_count.scalar()}
+• Всего: {sum(by_status.values())}
+• 🆕 Новых: {by_status.get("new", 0)}
+• ✅ Подтверждённых: {by_status.get("confirmed", 0)}
+• ✨ Завершённых: {by_status.get("completed", 0)}
+• ❌ Отменённых: {by_status.get("cancelled", 0)}
 
-📸 <b>Активных услуг:</b> {services_count.scalar()}
-   ↳ С подробной страницей: {services_with_pages.scalar()}
-🎨 <b>Активных товаров:</b> {products_count.scalar()}"""
+📸 <b>Активных услуг:</b> {services_count}
+   ↳ С подробной страницей: {services_with_pages}
+🎨 <b>Активных товаров:</b> {products_count}"""
+    
+    timings = api_timings.summary()
+    if timings:
+        text += "\n\n" + timings
     
     await callback.message.edit_text(
         text,
@@ -1339,3 +1313,80 @@ async def admin_stats(callback: CallbackQuery):
         reply_markup=admin_panel_kb()
     )
     await callback.answer()
+
+
+# ============ ПРОФИЛИРОВЩИК ============
+
+PROFILER_DURATIONS = [10, 30, 60]
+
+# Фоновые задачи профилирования (ссылки, чтобы их не собрал GC)
+_profiler_tasks = set()
+
+
+def profiler_peers() -> dict:
+    """Соседние процессы, чей профиль забираем через эндпоинт метрик.
+    Если AI бот работает в этом же процессе, его покрывает локальный профиль"""
+    if "ai_bot" in sys.modules or not config.AI_METRICS_PORT:
+        return {}
+    return {"ai": f"http://{config.METRICS_HOST}:{config.AI_METRICS_PORT}"}
+
+
+@router.callback_query(F.data == "admin_profiler")
+async def admin_profiler(callback: CallbackQuery):
+    """Выбор длительности профилирования"""
+    if not is_admin(callback.from_user.id):
+        return
+    
+    durations = sorted(set(PROFILER_DURATIONS + [config.PROFILER_SECONDS]))
+    await callback.message.edit_text(
+        "🔥 <b>Профилировщик</b>\n\n"
+        "Семплирующий профиль обоих ботов за выбранное время. "
+        "Результат придёт файлом в формате collapsed stacks — "
+        "его открывают speedscope.app или flamegraph.pl.",
+        parse_mode="HTML",
+        reply_markup=admin_profiler_kb(durations)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("admin_profiler_run:"))
+async def admin_profiler_run(callback: CallbackQuery):
+    """Запуск профилирования в фоне - апдейты админа не ждут его окончания"""
+    if not is_admin(callback.from_user.id):
+        return
+    
+    if profiler.is_busy():
+        await callback.answer("Профилирование уже идёт", show_alert=True)
+        return
+    
+    seconds = min(int(callback.data.split(":")[1]), 300)
+    await callback.message.edit_text(
+        f"⏳ Профилирую {seconds} с...",
+        reply_markup=admin_panel_kb()
+    )
+    await callback.answer()
+    
+    task = asyncio.create_task(send_profile(callback.bot, callback.from_user.id, seconds))
+    _profiler_tasks.add(task)
+    task.add_done_callback(_profiler_tasks.discard)
+
+
+async def send_profile(bot, chat_id: int, seconds: int):
+    try:
+        stacks, errors = await profiler.profile_all(
+            "main", profiler_peers(), seconds, config.PROFILER_INTERVAL
+        )
+        if not stacks:
+            await bot.send_message(chat_id, "Профиль пуст: " + "; ".join(errors.values()))
+            return
+        
+        filename = f"profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed.txt"
+        await bot.send_document(
+            chat_id,
+            BufferedInputFile(profiler.collapsed(stacks).encode(), filename=filename),
+            caption=profiler.describe(stacks, errors)[:1024],
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка профилирования: {e}")
+        await bot.send_message(chat_id, f"❌ Ошибка профилирования: {e}")
@@ -4,8 +4,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import StateFilter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from database import Booking, Service, async_session
+from database import Booking, Service
 from keyboards.keyboards import (
     booking_hours_kb, 
     booking_people_kb,
@@ -14,7 +13,10 @@ from keyboards.keyboards import (
     main_menu_kb,
     services_navigation_kb
 )
-from config import config
+from utils.catalog import CatalogItem, CatalogSnapshot, catalog
+from utils.carousel import show_card
+from utils.render_cache import cards
+from utils.outbox import notify_admins, outbox
 from datetime import datetime
 
 router = Router()
@@ -33,17 +35,22 @@ class BookingStates(StatesGroup):
 # Временное хранение данных записи
 booking_data = {}
 
+# Заявки на ближайшие дни не ждут сводки - Марине нужно ответить сразу
+URGENT_WORDS = ("сегодня", "завтра", "срочно")
+
+
+def is_urgent_booking(data: dict) -> bool:
+    text = f"{data.get('datetime_text', '')} {data.get('wishes', '')}".lower()
+    return any(word in text for word in URGENT_WORDS)
+
 @router.callback_query(F.data == "booking_start")
-async def start_booking(callback: CallbackQuery, state: FSMContext):
+async def start_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начало записи"""
     await state.clear()
     
-    async with async_session() as session:
-        query = select(Service).where(Service.is_active == True).order_by(Service.order)
-        result = await session.execute(query)
-        services = result.scalars().all()
+    snapshot = await catalog.current(session)
     
-    if not services:
+    if not snapshot.services:
         await callback.message.edit_text(
             "😔 К сожалению, сейчас нет доступных услуг.\n"
             "Свяжитесь с фотографом напрямую.",
@@ -51,23 +58,18 @@ async def start_booking(callback: CallbackQuery, state: FSMContext):
         )
         return
     
-    # Сохраняем данные
-    booking_data[callback.from_user.id] = {
-        "services": services,
-        "current_index": 0
-    }
+    booking_data.pop(callback.from_user.id, None)
     
-    await show_service_for_booking(callback.message, callback.from_user.id, 0, edit=True)
+    await show_service_for_booking(callback.message, snapshot, 0, edit=True)
     await state.set_state(BookingStates.choosing_service)
     await callback.answer()
 
 @router.callback_query(F.data.startswith("book_service:"))
-async def select_service_for_booking(callback: CallbackQuery, state: FSMContext):
+async def select_service_for_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Выбор услуги для записи"""
     service_id = int(callback.data.split(":")[1])
     
-    async with async_session() as session:
-        service = await session.get(Service, service_id)
+    service = await session.get(Service, service_id)
     
     if not service:
         await callback.answer("Услуга не найдена", show_alert=True)
@@ -217,43 +219,29 @@ async def process_wishes(message: Message, state: FSMContext):
     await state.set_state(BookingStates.confirming)
 
 @router.callback_query(BookingStates.confirming, F.data == "booking_confirm")
-async def confirm_booking(callback: CallbackQuery, state: FSMContext):
+async def confirm_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтверждение записи"""
     data = booking_data.get(callback.from_user.id, {})
     
-    async with async_session() as session:
-        # Создаём запись
-        booking = Booking(
-            user_id=callback.from_user.id,
-            username=callback.from_user.username,
-            first_name=data.get('first_name'),
-            last_name=data.get('last_name'),
-            phone=data.get('phone'),
-            service_id=data.get('service_id'),
-            hours=int(data.get('hours', '1').replace('+', '')),
-            people_count=int(str(data.get('people_count', '1')).replace('+', '')),
-            studio=data.get('studio'),
-            wishes=f"Дата: {data.get('datetime_text')}\n{data.get('wishes', '')}",
-            status="new"
-        )
-        session.add(booking)
-        await session.commit()
-        
-        booking_id = booking.id
-    
-    # Уведомление пользователю
-    await callback.message.edit_text(
-        "✅ <b>Заявка успешно отправлена!</b>\n\n"
-        f"Номер заявки: #{booking_id}\n\n"
-        "Марина свяжется с вами в ближайшее время для подтверждения деталей.\n\n"
-        "Спасибо, что выбрали меня! 📸",
-        parse_mode="HTML",
-        reply_markup=main_menu_kb()
+    # Создаём запись
+    booking = Booking(
+        user_id=callback.from_user.id,
+        username=callback.from_user.username,
+        first_name=data.get('first_name'),
+        last_name=data.get('last_name'),
+        phone=data.get('phone'),
+        service_id=data.get('service_id'),
+        hours=int(data.get('hours', '1').replace('+', '')),
+        people_count=int(str(data.get('people_count', '1')).replace('+', '')),
+        studio=data.get('studio'),
+        wishes=f"Дата: {data.get('datetime_text')}\n{data.get('wishes', '')}",
+        status="new"
     )
+    session.add(booking)
+    await session.flush()
+    booking_id = booking.id
     
-    # Уведомление админу (Марине)
-    from main_bot import bot
-    
+    # Уведомление админу (Марине) - в той же транзакции, что и заявка
     admin_text = f"""🆕 <b>Новая заявка #{booking_id}</b>
 
 👤 {data.get('first_name', '')} {data.get('last_name', '')}
@@ -268,16 +256,22 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
 
 💭 <b>Пожелания:</b>
 {data.get('wishes', 'Нет')}"""
+    notify_admins(session, admin_text, digest_key="booking", urgent=is_urgent_booking(data))
+    # Блокировка записи SQLite держится с flush() до commit: до первого запроса
+    # к Telegram транзакция должна быть закрыта, ниже - только booking_id и data
+    await session.commit()
     
-    for admin_id in config.ADMIN_IDS:
-        try:
-            await bot.send_message(
-                admin_id,
-                admin_text,
-                parse_mode="HTML"
-            )
-        except:
-            pass
+    outbox.wake()
+    
+    # Уведомление пользователю
+    await callback.message.edit_text(
+        "✅ <b>Заявка успешно отправлена!</b>\n\n"
+        f"Номер заявки: #{booking_id}\n\n"
+        "Марина свяжется с вами в ближайшее время для подтверждения деталей.\n\n"
+        "Спасибо, что выбрали меня! 📸",
+        parse_mode="HTML",
+        reply_markup=main_menu_kb()
+    )
     
     # Очищаем данные
     booking_data.pop(callback.from_user.id, None)
@@ -299,15 +293,14 @@ async def cancel_booking(callback: CallbackQuery, state: FSMContext):
 
 # ============ DEEPLINK ОБРАБОТКА ============
 
-async def handle_booking_deeplink(message: Message, state: FSMContext, param: str = None):
+async def handle_booking_deeplink(message: Message, state: FSMContext, session: AsyncSession, param: str = None):
     """Обработка deeplink для записи"""
     
     if param and param.startswith("book_"):
         # Запись на конкретную услугу
         service_id = int(param.replace("book_", ""))
         
-        async with async_session() as session:
-            service = await session.get(Service, service_id)
+        service = await session.get(Service, service_id)
         
         if service:
             booking_data[message.from_user.id] = {
@@ -333,41 +326,29 @@ async def handle_booking_deeplink(message: Message, state: FSMContext, param: st
     )
     
     # Триггерим выбор услуги
-    from aiogram.types import CallbackQuery
-    # Симулируем callback
-    async with async_session() as session:
-        query = select(Service).where(Service.is_active == True).order_by(Service.order)
-        result = await session.execute(query)
-        services = result.scalars().all()
+    snapshot = await catalog.current(session)
     
-    if services:
-        booking_data[message.from_user.id] = {
-            "services": services,
-            "current_index": 0
-        }
-        await show_service_for_booking(message, message.from_user.id, 0)
+    if snapshot.services:
+        booking_data.pop(message.from_user.id, None)
+        await show_service_for_booking(message, snapshot, 0)
         await state.set_state(BookingStates.choosing_service)
 
-async def show_service_for_booking(message: Message, user_id: int, index: int, edit: bool = False):
-    """Показать услугу для выбора при записи"""
-    data = booking_data.get(user_id, {})
-    services = data.get("services", [])
-    
-    if not services or index >= len(services):
-        return
-    
-    service = services[index]
-    
-    text = f"""📸 <b>{service.name}</b>
+def booking_card_text(service: CatalogItem) -> str:
+    return f"""📸 <b>{service.name}</b>
 
 {service.description or ''}
 
 💰 <b>Стоимость:</b> {service.price:,.0f} руб.
 ⏱ <b>Длительность:</b> {service.duration or 'По договорённости'}"""
+
+
+async def show_service_for_booking(message: Message, snapshot: CatalogSnapshot, index: int, edit: bool = False):
+    """Показать услугу для выбора при записи"""
+    services = snapshot.services
+    if not services or index >= len(services):
+        return
     
-    kb = services_navigation_kb(index, len(services), service.id)
-    
-    if edit:
-        await message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-    else:
-        await message.answer(text, parse_mode="HTML", reply_markup=kb)
+    service = services[index]
+    text = cards.get(service.id, snapshot.version, "booking", booking_card_text, service)
+    kb = services_navigation_kb(index, len(services), service.id, version=snapshot.version)
+    await show_card(message, text, kb, edit=edit)
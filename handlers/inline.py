@@ -8,15 +8,35 @@ from aiogram.types import (
     InlineKeyboardButton,
     BufferedInputFile
 )
-from sqlalchemy import select
-from database import Service, Product, async_session
-from keyboards.keyboards import inline_service_kb, inline_product_kb
+from sqlalchemy.ext.asyncio import AsyncSession
+from keyboards.keyboards import inline_service_kb, inline_product_kb, inline_price_kb, inline_catalog_kb
 from config import config
+from utils.catalog import CatalogItem, CatalogSnapshot, catalog
 from utils.image_generator import price_generator
+from utils.metrics import registry
+from utils.singleflight import SingleFlight
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+import asyncio
 import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
+# Больше 50 результатов в одном ответе Telegram не принимает
+INLINE_PAGE_SIZE = 50
+
+INLINE_PAGES = registry.counter(
+    "inline_page_cache_requests_total", "Обращения к кэшу страниц inline ответов", labels=("result",)
+)
+INLINE_RESULTS_BUILT = registry.counter(
+    "inline_results_built_total", "Собранные inline результаты отдельных услуг и товаров", labels=("kind",)
+)
+
 # Кэш для file_id картинок
 image_file_ids = {}
 
@@ -31,7 +51,12 @@ async def get_or_create_price_image(bot, services: list) -> str:
     if cache_key in image_file_ids:
         return image_file_ids[cache_key]
     
-    # Генерируем картинку
+    # Загрузить картинку некуда - не тратим время на генерацию
+    admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else None
+    if not admin_id:
+        return None
+    
+    # Генерируем картинку (PIL в потоке, чтобы не блокировать event loop)
     services_for_image = [
         {
             'name': s.name,
@@ -41,7 +66,8 @@ async def get_or_create_price_image(bot, services: list) -> str:
         for s in services
     ]
     
-    image_buffer = price_generator.generate_price_image(
+    image_buffer = await asyncio.to_thread(
+        price_generator.generate_price_image,
         services=services_for_image,
         title="ПРАЙС НА УСЛУГИ",
         photographer_name="Марина Заугольникова",
@@ -56,21 +82,19 @@ async def get_or_create_price_image(bot, services: list) -> str:
     
     # Отправляем себе (первому админу) и сразу удаляем
     try:
-        admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else None
-        if admin_id:
-            msg = await bot.send_photo(
-                chat_id=admin_id,
-                photo=photo,
-                caption="🔄 Генерация прайса... (это сообщение удалится)"
-            )
-            file_id = msg.photo[-1].file_id
-            await msg.delete()
-            
-            # Сохраняем в кэш
-            image_file_ids[cache_key] = file_id
-            return file_id
+        msg = await bot.send_photo(
+            chat_id=admin_id,
+            photo=photo,
+            caption="🔄 Генерация прайса... (это сообщение удалится)"
+        )
+        file_id = msg.photo[-1].file_id
+        await msg.delete()
+        
+        # Сохраняем в кэш
+        image_file_ids[cache_key] = file_id
+        return file_id
     except Exception as e:
-        print(f"Error creating price image: {e}")
+        logger.error(f"Ошибка генерации картинки прайса: {e}")
     
     return None
 
@@ -83,6 +107,10 @@ async def get_or_create_catalog_image(bot, products: list) -> str:
     if cache_key in image_file_ids:
         return image_file_ids[cache_key]
     
+    admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else None
+    if not admin_id:
+        return None
+    
     products_for_image = [
         {
             'name': p.name,
@@ -92,7 +120,8 @@ async def get_or_create_catalog_image(bot, products: list) -> str:
         for p in products
     ]
     
-    image_buffer = price_generator.generate_product_image(
+    image_buffer = await asyncio.to_thread(
+        price_generator.generate_product_image,
         products=products_for_image,
         title="КАТАЛОГ ТОВАРОВ",
         photographer_name="Марина Заугольникова"
@@ -104,74 +133,173 @@ async def get_or_create_catalog_image(bot, products: list) -> str:
     )
     
     try:
-        admin_id = config.ADMIN_IDS[0] if config.ADMIN_IDS else None
-        if admin_id:
-            msg = await bot.send_photo(
-                chat_id=admin_id,
-                photo=photo,
-                caption="🔄 Генерация каталога... (это сообщение удалится)"
-            )
-            file_id = msg.photo[-1].file_id
-            await msg.delete()
-            
-            image_file_ids[cache_key] = file_id
-            return file_id
+        msg = await bot.send_photo(
+            chat_id=admin_id,
+            photo=photo,
+            caption="🔄 Генерация каталога... (это сообщение удалится)"
+        )
+        file_id = msg.photo[-1].file_id
+        await msg.delete()
+        
+        image_file_ids[cache_key] = file_id
+        return file_id
     except Exception as e:
-        print(f"Error creating catalog image: {e}")
+        logger.error(f"Ошибка генерации картинки каталога: {e}")
     
     return None
 
+class InlinePageCache:
+    """Страницы inline ответов по (запрос, offset, версия каталога).
+    
+    При промахе весь список результатов запроса режется на страницы
+    сразу, так что следующие страницы того же запроса уже в кэше.
+    LRU по запросам: старые версии каталога вытесняются сами. Страницы
+    с expires_at (набор без картинки) живут до повторной попытки картинки.
+    """
+    
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+        # (запрос, версия) -> (expires_at по monotonic или None, страницы по offset)
+        self._pages: "OrderedDict[Tuple[str, int], Tuple[Optional[float], Dict[int, Tuple[tuple, str]]]]" = OrderedDict()
+    
+    def get(self, query: str, offset: int, version: int) -> Optional[Tuple[tuple, str]]:
+        entry = self._pages.get((query, version))
+        if entry is not None and entry[0] is not None and time.monotonic() >= entry[0]:
+            del self._pages[(query, version)]
+            entry = None
+        if entry is None:
+            INLINE_PAGES.inc("miss")
+            return None
+        self._pages.move_to_end((query, version))
+        INLINE_PAGES.inc("hit")
+        return entry[1].get(offset, ((), ""))
+    
+    def put(self, query: str, version: int, results: tuple,
+            expires_at: Optional[float] = None) -> Dict[int, Tuple[tuple, str]]:
+        pages = {}
+        for start in range(0, max(len(results), 1), INLINE_PAGE_SIZE):
+            end = start + INLINE_PAGE_SIZE
+            pages[start] = (results[start:end], str(end) if end < len(results) else "")
+        self._pages[(query, version)] = (expires_at, pages)
+        self._pages.move_to_end((query, version))
+        while len(self._pages) > self.max_queries:
+            self._pages.popitem(last=False)
+        return pages
+
+inline_pages = InlinePageCache(config.INLINE_PAGE_CACHE_SIZE)
+
+async def build_inline_results(query: str, snapshot: CatalogSnapshot, bot) -> Tuple[tuple, bool, Optional[float]]:
+    """Все результаты запроса в постоянном порядке, можно ли их кэшировать
+    и до какого момента (None - пока не сменится версия каталога)"""
+    kind = None
+    if not query or query in ["прайс", "price", "услуги", "цены"]:
+        kind = "services"
+    elif query in ["товары", "товар", "коллаж", "коллажи", "products"]:
+        kind = "products"
+    
+    if kind is not None:
+        results = await inline_results.get(kind, snapshot, bot)
+        cacheable = inline_results.is_current(kind, snapshot.version)
+        expires_at = inline_results.image_retry_at(kind)
+    
+    elif query in ["запись", "записаться", "book", "booking"]:
+        results, cacheable, expires_at = (get_booking_inline_result(),), True, None
+    
+    else:
+        results, cacheable, expires_at = search_inline_results(snapshot, query), True, None
+    
+    return results or get_default_menu_results(), cacheable, expires_at
+
 @router.inline_query()
-async def inline_handler(inline_query: InlineQuery):
-    """Обработка inline запросов"""
+async def inline_handler(inline_query: InlineQuery, session: AsyncSession):
+    """Обработка inline запросов, по INLINE_PAGE_SIZE результатов через next_offset"""
     query = inline_query.query.lower().strip()
-    results = []
-    bot = inline_query.bot
-    
-    async with async_session() as session:
-        if not query or query in ["прайс", "price", "услуги", "цены"]:
-            results.extend(await get_services_inline_results(session, bot))
-        
-        elif query in ["товары", "товар", "коллаж", "коллажи", "products"]:
-            results.extend(await get_products_inline_results(session, bot))
-        
-        elif query in ["запись", "записаться", "book", "booking"]:
-            results.append(get_booking_inline_result())
-        
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    snapshot = await catalog.current(session)
+    
+    page = inline_pages.get(query, offset, snapshot.version)
+    if page is None:
+        results, cacheable, expires_at = await build_inline_results(query, snapshot, inline_query.bot)
+        if cacheable:
+            pages = inline_pages.put(query, snapshot.version, results, expires_at)
+            page = pages.get(offset, ((), ""))
         else:
-            results.extend(await search_inline_results(session, query))
-    
-    if not results:
-        results = get_default_menu_results()
+            end = offset + INLINE_PAGE_SIZE
+            page = (results[offset:end], str(end) if end < len(results) else "")
     
+    results, next_offset = page
     await inline_query.answer(
-        results=results[:50],
+        results=list(results),
         cache_time=60,
-        is_personal=False
+        is_personal=False,
+        next_offset=next_offset
     )
 
-async def get_services_inline_results(session, bot) -> list:
-    """Получить услуги для inline с картинкой"""
-    results = []
+def price_list_text(services) -> str:
+    """Текстовый прайс всех услуг"""
+    price_text = "📸 <b>ПРАЙС НА УСЛУГИ</b>\n"
+    price_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
+    
+    for s in services:
+        price_text += f"✨ <b>{s.name}</b>\n"
+        price_text += f"    💰 {s.price:,.0f} ₽"
+        if s.duration:
+            price_text += f"  •  ⏱ {s.duration}"
+        price_text += "\n\n"
     
-    query = select(Service).where(Service.is_active == True).order_by(Service.order)
-    result = await session.execute(query)
-    services = result.scalars().all()
+    price_text += "━━━━━━━━━━━━━━━━━━━━\n"
+    price_text += "👩‍🎨 <b>Марина Заугольникова</b>"
+    return price_text
+
+def inline_service_texts(service) -> tuple:
+    """Описание результата и текст сообщения услуги"""
+    description = f"💰 {service.price:,.0f} ₽"
+    if service.duration:
+        description += f" • ⏱ {service.duration}"
     
-    if not services:
-        return results
+    message_text = f"""📸 <b>{service.name}</b>
+
+{service.description or ''}
+
+💰 <b>Стоимость:</b> {service.price:,.0f} ₽
+⏱ <b>Длительность:</b> {service.duration or 'По договорённости'}
+
+━━━━━━━━━━━━━━━━━━━━
+👩‍🎨 <b>Марина Заугольникова</b>"""
+    return description, message_text
+
+def catalog_list_text(products) -> str:
+    """Текстовый каталог всех товаров"""
+    catalog_text = "🎨 <b>КАТАЛОГ ТОВАРОВ</b>\n"
+    catalog_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
     
-    # Кнопки под картинкой
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="📝 Записаться на съёмку",
-            url=f"https://t.me/{config.MAIN_BOT_USERNAME}?start=booking"
-        )],
-        [InlineKeyboardButton(
-            text="📸 Подробнее об услугах",
-            url=f"https://t.me/{config.MAIN_BOT_USERNAME}?start=services"
-        )]
-    ])
+    for p in products:
+        type_emoji = "📱" if p.product_type == "digital" else "📄"
+        catalog_text += f"{type_emoji} <b>{p.name}</b>\n"
+        catalog_text += f"    💰 {p.price:,.0f} ₽\n\n"
+    
+    catalog_text += "━━━━━━━━━━━━━━━━━━━━\n"
+    catalog_text += "👩‍🎨 <b>Марина Заугольникова</b>"
+    return catalog_text
+
+def inline_product_text(product) -> str:
+    """Текст сообщения товара"""
+    type_emoji = "📱" if product.product_type == "digital" else "📄"
+    type_text = "Цифровой" if product.product_type == "digital" else "Бумажный"
+    return f"""{type_emoji} <b>{product.name}</b>
+
+{product.description or ''}
+
+💰 <b>Стоимость:</b> {product.price:,.0f} ₽
+📦 <b>Тип:</b> {type_text}
+
+━━━━━━━━━━━━━━━━━━━━
+👩‍🎨 <b>Марина Заугольникова</b>"""
+
+async def services_header_results(bot, services) -> list:
+    """Прайс картинкой и текстом перед отдельными услугами"""
+    results = []
+    kb = inline_price_kb(config.MAIN_BOT_USERNAME)
     
     # Пробуем получить картинку
     try:
@@ -194,22 +322,9 @@ async def get_services_inline_results(session, bot) -> list:
                 )
             )
     except Exception as e:
-        print(f"Price image error: {e}")
+        logger.warning(f"Картинка прайса недоступна: {e}")
     
     # Текстовый прайс как запасной вариант
-    price_text = "📸 <b>ПРАЙС НА УСЛУГИ</b>\n"
-    price_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
-    
-    for s in services:
-        price_text += f"✨ <b>{s.name}</b>\n"
-        price_text += f"    💰 {s.price:,.0f} ₽"
-        if s.duration:
-            price_text += f"  •  ⏱ {s.duration}"
-        price_text += "\n\n"
-    
-    price_text += "━━━━━━━━━━━━━━━━━━━━\n"
-    price_text += "👩‍🎨 <b>Марина Заугольникова</b>"
-    
     results.append(
         InlineQueryResultArticle(
             id="price_text",
@@ -217,79 +332,44 @@ async def get_services_inline_results(session, bot) -> list:
             description="Текстовый вариант прайса",
             thumbnail_url="https://i.imgur.com/8QZQY9L.png",
             input_message_content=InputTextMessageContent(
-                message_text=price_text,
+                message_text=price_list_text(services),
                 parse_mode="HTML"
             ),
             reply_markup=kb
         )
     )
-    
-    # Отдельные услуги
-    for service in services:
-        description = f"💰 {service.price:,.0f} ₽"
-        if service.duration:
-            description += f" • ⏱ {service.duration}"
-        
-        message_text = f"""📸 <b>{service.name}</b>
-
-{service.description or ''}
-
-💰 <b>Стоимость:</b> {service.price:,.0f} ₽
-⏱ <b>Длительность:</b> {service.duration or 'По договорённости'}
-
-━━━━━━━━━━━━━━━━━━━━
-👩‍🎨 <b>Марина Заугольникова</b>"""
-
-        if service.photo_url:
-            results.append(
-                InlineQueryResultCachedPhoto(
-                    id=f"service_{service.id}",
-                    photo_file_id=service.photo_url,
-                    title=service.name,
-                    description=description,
-                    caption=message_text,
-                    parse_mode="HTML",
-                    reply_markup=inline_service_kb(service.id, config.MAIN_BOT_USERNAME)
-                )
-            )
-        else:
-            results.append(
-                InlineQueryResultArticle(
-                    id=f"service_{service.id}",
-                    title=f"📸 {service.name}",
-                    description=description,
-                    thumbnail_url="https://i.imgur.com/8QZQY9L.png",
-                    input_message_content=InputTextMessageContent(
-                        message_text=message_text,
-                        parse_mode="HTML"
-                    ),
-                    reply_markup=inline_service_kb(service.id, config.MAIN_BOT_USERNAME)
-                )
-            )
-    
     return results
 
-async def get_products_inline_results(session, bot) -> list:
-    """Получить товары для inline с картинкой"""
+def service_result(service):
+    """Inline результат одной услуги"""
+    description, message_text = inline_service_texts(service)
+    
+    if service.photo_url:
+        return InlineQueryResultCachedPhoto(
+            id=f"service_{service.id}",
+            photo_file_id=service.photo_url,
+            title=service.name,
+            description=description,
+            caption=message_text,
+            parse_mode="HTML",
+            reply_markup=inline_service_kb(service.id, config.MAIN_BOT_USERNAME)
+        )
+    return InlineQueryResultArticle(
+        id=f"service_{service.id}",
+        title=f"📸 {service.name}",
+        description=description,
+        thumbnail_url="https://i.imgur.com/8QZQY9L.png",
+        input_message_content=InputTextMessageContent(
+            message_text=message_text,
+            parse_mode="HTML"
+        ),
+        reply_markup=inline_service_kb(service.id, config.MAIN_BOT_USERNAME)
+    )
+
+async def products_header_results(bot, products) -> list:
+    """Каталог картинкой и текстом перед отдельными товарами"""
     results = []
-    
-    query = select(Product).where(Product.is_active == True).order_by(Product.order)
-    result = await session.execute(query)
-    products = result.scalars().all()
-    
-    if not products:
-        return results
-    
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="🎨 Посмотреть каталог",
-            url=f"https://t.me/{config.MAIN_BOT_USERNAME}?start=products"
-        )],
-        [InlineKeyboardButton(
-            text="💬 Связаться",
-            url=f"https://t.me/{config.MAIN_BOT_USERNAME}"
-        )]
-    ])
+    kb = inline_catalog_kb(config.MAIN_BOT_USERNAME)
     
     # Пробуем получить картинку каталога
     try:
@@ -311,20 +391,9 @@ async def get_products_inline_results(session, bot) -> list:
                 )
             )
     except Exception as e:
-        print(f"Catalog image error: {e}")
+        logger.warning(f"Картинка каталога недоступна: {e}")
     
     # Текстовый каталог
-    catalog_text = "🎨 <b>КАТАЛОГ ТОВАРОВ</b>\n"
-    catalog_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
-    
-    for p in products:
-        type_emoji = "📱" if p.product_type == "digital" else "📄"
-        catalog_text += f"{type_emoji} <b>{p.name}</b>\n"
-        catalog_text += f"    💰 {p.price:,.0f} ₽\n\n"
-    
-    catalog_text += "━━━━━━━━━━━━━━━━━━━━\n"
-    catalog_text += "👩‍🎨 <b>Марина Заугольникова</b>"
-    
     results.append(
         InlineQueryResultArticle(
             id="catalog_text",
@@ -332,69 +401,142 @@ async def get_products_inline_results(session, bot) -> list:
             description="Текстовый вариант каталога",
             thumbnail_url="https://i.imgur.com/YqQYz0L.png",
             input_message_content=InputTextMessageContent(
-                message_text=catalog_text,
+                message_text=catalog_list_text(products),
                 parse_mode="HTML"
             ),
             reply_markup=kb
         )
     )
-    
-    # Отдельные товары
-    for product in products:
-        type_emoji = "📱" if product.product_type == "digital" else "📄"
-        type_text = "Цифровой" if product.product_type == "digital" else "Бумажный"
-        
-        message_text = f"""{type_emoji} <b>{product.name}</b>
-
-{product.description or ''}
-
-💰 <b>Стоимость:</b> {product.price:,.0f} ₽
-📦 <b>Тип:</b> {type_text}
+    return results
 
-━━━━━━━━━━━━━━━━━━━━
-👩‍🎨 <b>Марина Заугольникова</b>"""
+def product_result(product):
+    """Inline результат одного товара"""
+    type_emoji = "📱" if product.product_type == "digital" else "📄"
+    type_text = "Цифровой" if product.product_type == "digital" else "Бумажный"
+    message_text = inline_product_text(product)
+    
+    if product.photo_url:
+        return InlineQueryResultCachedPhoto(
+            id=f"product_{product.id}",
+            photo_file_id=product.photo_url,
+            title=f"{type_emoji} {product.name}",
+            description=f"💰 {product.price:,.0f} ₽",
+            caption=message_text,
+            parse_mode="HTML",
+            reply_markup=inline_product_kb(product.id, config.MAIN_BOT_USERNAME)
+        )
+    return InlineQueryResultArticle(
+        id=f"product_{product.id}",
+        title=f"{type_emoji} {product.name}",
+        description=f"💰 {product.price:,.0f} ₽ • {type_text}",
+        thumbnail_url="https://i.imgur.com/YqQYz0L.png",
+        input_message_content=InputTextMessageContent(
+            message_text=message_text,
+            parse_mode="HTML"
+        ),
+        reply_markup=inline_product_kb(product.id, config.MAIN_BOT_USERNAME)
+    )
 
-        if product.photo_url:
-            results.append(
-                InlineQueryResultCachedPhoto(
-                    id=f"product_{product.id}",
-                    photo_file_id=product.photo_url,
-                    title=f"{type_emoji} {product.name}",
-                    description=f"💰 {product.price:,.0f} ₽",
-                    caption=message_text,
-                    parse_mode="HTML",
-                    reply_markup=inline_product_kb(product.id, config.MAIN_BOT_USERNAME)
-                )
-            )
+class InlineResultSets:
+    """Готовые наборы inline результатов услуг и товаров по версии каталога.
+    
+    Набор собирается один раз на версию и дальше отдаётся из памяти.
+    При новой версии пересобираются только изменившиеся карточки
+    (CatalogItem сравнивается целиком), а если изменилась другая часть
+    каталога - набор переиспользуется как есть. Одновременные запросы
+    новой версии ждут одну сборку. Если картинку загрузить не удалось,
+    запоминается набор с текстовым заголовком, а картинка пробуется снова
+    не раньше чем через INLINE_IMAGE_RETRY секунд (интервал удваивается).
+    """
+    
+    BUILDERS = {
+        "services": (services_header_results, service_result),
+        "products": (products_header_results, product_result),
+    }
+    IMAGE_RETRY_MAX = 1800
+    
+    def __init__(self):
+        self._sets: Dict[str, Tuple[int, tuple, tuple]] = {}  # вид -> (версия, элементы, результаты)
+        self._items: Dict[Tuple[str, int], Tuple[CatalogItem, Any]] = {}
+        self._flight = SingleFlight()
+        self._image_retry: Dict[str, Tuple[int, float]] = {}  # вид -> (неудач подряд, когда повторить)
+    
+    async def get(self, kind: str, snapshot: CatalogSnapshot, bot) -> tuple:
+        cached = self._sets.get(kind)
+        if cached is not None and cached[0] == snapshot.version and not self._image_retry_due(kind):
+            return cached[2]
+        results, _ = await self._flight.do(
+            (kind, snapshot.version), lambda: self._build(kind, snapshot, bot)
+        )
+        return results
+    
+    async def _build(self, kind: str, snapshot: CatalogSnapshot, bot) -> tuple:
+        items = snapshot.services if kind == "services" else snapshot.products
+        previous = self._sets.get(kind)
+        if previous is not None and previous[1] == items and not self._image_retry_due(kind):
+            self._store(kind, snapshot.version, items, previous[2])
+            return previous[2]
+        if not items:
+            self._store(kind, snapshot.version, items, ())
+            return ()
+        
+        build_header, build_item = self.BUILDERS[kind]
+        header = await build_header(bot, items)
+        results = tuple(header) + tuple(self._item(kind, item, build_item) for item in items)
+        
+        ids = {item.id for item in items}
+        for key in [k for k in self._items if k[0] == kind and k[1] not in ids]:
+            del self._items[key]
+        
+        self._store(kind, snapshot.version, items, results)
+        if header[0].id.endswith("_image") or not config.ADMIN_IDS:
+            self._image_retry.pop(kind, None)
         else:
-            results.append(
-                InlineQueryResultArticle(
-                    id=f"product_{product.id}",
-                    title=f"{type_emoji} {product.name}",
-                    description=f"💰 {product.price:,.0f} ₽ • {type_text}",
-                    thumbnail_url="https://i.imgur.com/YqQYz0L.png",
-                    input_message_content=InputTextMessageContent(
-                        message_text=message_text,
-                        parse_mode="HTML"
-                    ),
-                    reply_markup=inline_product_kb(product.id, config.MAIN_BOT_USERNAME)
-                )
-            )
+            # Картинка не получилась, хотя загрузить её было через кого: отдаём
+            # текст и пробуем снова позже, а не на каждом запросе
+            failures = self._image_retry.get(kind, (0, 0.0))[0] + 1
+            delay = min(config.INLINE_IMAGE_RETRY * 2 ** (failures - 1), self.IMAGE_RETRY_MAX)
+            self._image_retry[kind] = (failures, time.monotonic() + delay)
+            logger.warning(f"Inline {kind}: картинка не загружена, повтор через {delay:.0f} с")
+        return results
     
-    return results
+    def _item(self, kind: str, item: CatalogItem, build_item):
+        cached = self._items.get((kind, item.id))
+        if cached is not None and cached[0] == item:
+            return cached[1]
+        INLINE_RESULTS_BUILT.inc(kind)
+        result = build_item(item)
+        self._items[(kind, item.id)] = (item, result)
+        return result
+    
+    def is_current(self, kind: str, version: int) -> bool:
+        """Набор этой версии запомнен"""
+        cached = self._sets.get(kind)
+        return cached is not None and cached[0] == version
+    
+    def image_retry_at(self, kind: str) -> Optional[float]:
+        """Когда (по monotonic) пробовать картинку снова, None - набор полный"""
+        retry = self._image_retry.get(kind)
+        return retry[1] if retry is not None else None
+    
+    def _image_retry_due(self, kind: str) -> bool:
+        retry = self._image_retry.get(kind)
+        return retry is not None and time.monotonic() >= retry[1]
+    
+    def _store(self, kind: str, version: int, items: tuple, results: tuple):
+        current = self._sets.get(kind)
+        if current is None or current[0] <= version:
+            self._sets[kind] = (version, items, results)
+
+inline_results = InlineResultSets()
 
-async def search_inline_results(session, query: str) -> list:
-    """Поиск"""
+def search_inline_results(snapshot: CatalogSnapshot, query: str) -> tuple:
+    """Поиск по названию в снимке каталога: сначала услуги, потом товары, в порядке каталога"""
     results = []
     
-    services_query = select(Service).where(
-        Service.is_active == True,
-        Service.name.ilike(f"%{query}%")
-    )
-    services_result = await session.execute(services_query)
-    services = services_result.scalars().all()
-    
-    for service in services:
+    for service in snapshot.services:
+        if query not in service.name.lower():
+            continue
         results.append(
             InlineQueryResultArticle(
                 id=f"search_service_{service.id}",
@@ -408,14 +550,9 @@ async def search_inline_results(session, query: str) -> list:
             )
         )
     
-    products_query = select(Product).where(
-        Product.is_active == True,
-        Product.name.ilike(f"%{query}%")
-    )
-    products_result = await session.execute(products_query)
-    products = products_result.scalars().all()
-    
-    for product in products:
+    for product in snapshot.products:
+        if query not in product.name.lower():
+            continue
         type_emoji = "📱" if product.product_type == "digital" else "📄"
         results.append(
             InlineQueryResultArticle(
@@ -430,8 +567,9 @@ async def search_inline_results(session, query: str) -> list:
             )
         )
     
-    return results
+    return tuple(results)
 
+@lru_cache(maxsize=None)
 def get_booking_inline_result():
     """Запись"""
     return InlineQueryResultArticle(
@@ -454,9 +592,10 @@ def get_booking_inline_result():
         ]])
     )
 
-def get_default_menu_results() -> list:
+@lru_cache(maxsize=None)
+def get_default_menu_results() -> tuple:
     """Меню по умолчанию"""
-    return [
+    return (
         InlineQueryResultArticle(
             id="menu_price",
             title="📋 Прайс",
@@ -487,4 +626,4 @@ def get_default_menu_results() -> list:
                 parse_mode="HTML"
             )
         )
-    ]
+    )
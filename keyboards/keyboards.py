@@ -6,11 +6,51 @@ from aiogram.types import (
     WebAppInfo
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List, Optional
+from copy import copy
+from functools import lru_cache, wraps
+from typing import List, Optional, Union
+
+# Сколько разных наборов аргументов помнят параметризованные клавиатуры
+KEYBOARD_CACHE_SIZE = 1024
+
+Markup = Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]
+
+
+def _rows_field(markup: Markup) -> str:
+    return "inline_keyboard" if isinstance(markup, InlineKeyboardMarkup) else "keyboard"
+
+
+def cached_kb(maxsize: Optional[int] = None):
+    """Фабрика клавиатуры собирает разметку один раз на набор аргументов.
+    maxsize=None - для клавиатур без параметров или с парой флагов,
+    для клавиатур с id и индексами - LRU на KEYBOARD_CACHE_SIZE.
+
+    В кэше ряды лежат кортежами, а вызывающий получает свою копию разметки
+    со своими списками и кнопками: поменять закэшированную клавиатуру
+    для остальных апдейтов через неё нельзя"""
+    def decorator(factory):
+        @lru_cache(maxsize=maxsize)
+        def build(*args, **kwargs):
+            markup = factory(*args, **kwargs)
+            rows = tuple(tuple(row) for row in getattr(markup, _rows_field(markup)))
+            return markup, rows
+
+        @wraps(factory)
+        def wrapper(*args, **kwargs) -> Markup:
+            markup, rows = build(*args, **kwargs)
+            return markup.model_copy(
+                update={_rows_field(markup): [[copy(button) for button in row] for row in rows]}
+            )
+
+        wrapper.cache_info = build.cache_info
+        wrapper.cache_clear = build.cache_clear
+        return wrapper
+    return decorator
 
 
 # ============ ГЛАВНОЕ МЕНЮ ============
 
+@cached_kb()
 def main_menu_kb(is_admin: bool = False) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -36,12 +76,14 @@ def main_menu_kb(is_admin: bool = False) -> InlineKeyboardMarkup:
 
 # ============ НАВИГАЦИЯ ПО УСЛУГАМ ============
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def services_navigation_kb(
     current_index: int, 
     total: int,
     service_id: int,
     has_detail_page: bool = False,
-    detail_page_url: str = None
+    detail_page_url: str = None,
+    version: int = 0
 ) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -49,7 +91,7 @@ def services_navigation_kb(
     
     if current_index > 0:
         nav_buttons.append(
-            InlineKeyboardButton(text="⬅️", callback_data=f"service_nav:{current_index - 1}")
+            InlineKeyboardButton(text="⬅️", callback_data=f"service_nav:{version}:{current_index - 1}")
         )
     
     nav_buttons.append(
@@ -58,7 +100,7 @@ def services_navigation_kb(
     
     if current_index < total - 1:
         nav_buttons.append(
-            InlineKeyboardButton(text="➡️", callback_data=f"service_nav:{current_index + 1}")
+            InlineKeyboardButton(text="➡️", callback_data=f"service_nav:{version}:{current_index + 1}")
         )
     
     builder.row(*nav_buttons)
@@ -88,6 +130,7 @@ def services_navigation_kb(
 
 # ============ НАВИГАЦИЯ ПО ТОВАРАМ ============
 
+@cached_kb()
 def products_filter_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -105,13 +148,15 @@ def products_filter_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def products_navigation_kb(
     current_index: int, 
     total: int,
     product_id: int,
     filter_type: str = "all",
     has_detail_page: bool = False,
-    detail_page_url: str = None
+    detail_page_url: str = None,
+    version: int = 0
 ) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -121,7 +166,7 @@ def products_navigation_kb(
         nav_buttons.append(
             InlineKeyboardButton(
                 text="⬅️", 
-                callback_data=f"product_nav:{current_index - 1}:{filter_type}"
+                callback_data=f"product_nav:{version}:{filter_type}:{current_index - 1}"
             )
         )
     
@@ -133,7 +178,7 @@ def products_navigation_kb(
         nav_buttons.append(
             InlineKeyboardButton(
                 text="➡️", 
-                callback_data=f"product_nav:{current_index + 1}:{filter_type}"
+                callback_data=f"product_nav:{version}:{filter_type}:{current_index + 1}"
             )
         )
     
@@ -180,6 +225,7 @@ def booking_services_kb(services: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb()
 def booking_hours_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -200,6 +246,7 @@ def booking_hours_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb()
 def booking_people_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -221,6 +268,7 @@ def booking_people_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb()
 def booking_confirm_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -235,6 +283,7 @@ def booking_confirm_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb()
 def share_phone_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -248,6 +297,7 @@ def share_phone_kb() -> ReplyKeyboardMarkup:
 
 # ============ АДМИН-ПАНЕЛЬ ============
 
+@cached_kb()
 def admin_panel_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -264,7 +314,8 @@ def admin_panel_kb() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="🔗 Генератор ссылок", callback_data="admin_deeplinks")
     )
     builder.row(
-        InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")
+        InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"),
+        InlineKeyboardButton(text="🔥 Профилировщик", callback_data="admin_profiler")
     )
     builder.row(
         InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")
@@ -296,6 +347,7 @@ def admin_services_kb(services: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def admin_service_edit_kb(service_id: int, is_active: bool, has_detail_page: bool = False) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -360,6 +412,7 @@ def admin_products_kb(products: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def admin_product_edit_kb(product_id: int, is_active: bool, has_detail_page: bool = False) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -441,6 +494,7 @@ def admin_bookings_kb(bookings: list, page: int = 0) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def admin_booking_view_kb(booking_id: int, status: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -467,6 +521,7 @@ def admin_booking_view_kb(booking_id: int, status: str) -> InlineKeyboardMarkup:
 
 # ============ INLINE РЕЗУЛЬТАТЫ ============
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def inline_service_kb(service_id: int, bot_username: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -486,6 +541,7 @@ def inline_service_kb(service_id: int, bot_username: str) -> InlineKeyboardMarku
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def inline_product_kb(product_id: int, bot_username: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -505,6 +561,7 @@ def inline_product_kb(product_id: int, bot_username: str) -> InlineKeyboardMarku
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def inline_price_kb(bot_username: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -524,6 +581,7 @@ def inline_price_kb(bot_username: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def inline_catalog_kb(bot_username: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -543,6 +601,7 @@ def inline_catalog_kb(bot_username: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def inline_booking_kb(bot_username: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -558,6 +617,7 @@ def inline_booking_kb(bot_username: str) -> InlineKeyboardMarkup:
 
 # ============ ПОДТВЕРЖДЕНИЯ ============
 
+@cached_kb(KEYBOARD_CACHE_SIZE)
 def confirm_delete_kb(item_type: str, item_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -577,6 +637,7 @@ def confirm_delete_kb(item_type: str, item_id: int) -> InlineKeyboardMarkup:
 
 # ============ ОТМЕНА ============
 
+@cached_kb()
 def cancel_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -587,6 +648,21 @@ def cancel_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def admin_profiler_kb(durations: list) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(*[
+        InlineKeyboardButton(text=f"⏱ {seconds} с", callback_data=f"admin_profiler_run:{seconds}")
+        for seconds in durations
+    ])
+    builder.row(
+        InlineKeyboardButton(text="⬅️ Админ-панель", callback_data="admin_panel")
+    )
+    
+    return builder.as_markup()
+
+
+@cached_kb()
 def back_to_admin_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
@@ -1,15 +1,14 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher, F
+from aiogram import Bot, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.client.session.aiohttp import AiohttpSession
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
-from database import init_db, Service, Product, async_session
+from database import init_db, engine, async_session, Product
 from keyboards.keyboards import (
     main_menu_kb, 
     services_navigation_kb, 
@@ -18,29 +17,119 @@ from keyboards.keyboards import (
 )
 from handlers import inline, booking, admin
 from handlers.booking import handle_booking_deeplink
+from utils.tg_session import create_session
+from utils.dispatcher import create_dispatcher
+from utils.outbox import notify_admins, outbox
+from utils.shutdown import graceful_shutdown, polling_tasks, run_process
+from utils.metrics import registry, setup_db_metrics, setup_handler_metrics, start_metrics_server
+from utils.logging_setup import setup_logging
+from utils.query_audit import setup_query_audit
+from utils.db_session import setup_db_session
+from utils.catalog import CatalogItem, CatalogSnapshot, catalog, parse_nav
+from utils.carousel import show_card
+from utils.render_cache import cards
 
 # Логирование
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 
 # Инициализация бота с прокси
-session = AiohttpSession(proxy=config.PROXY_URL)
+session = create_session()
 bot = Bot(token=config.MAIN_BOT_TOKEN, session=session)
 storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+dp = create_dispatcher(config.UPDATE_CONCURRENCY, storage=storage)
 
 # Подключаем роутеры
 dp.include_router(inline.router)
 dp.include_router(booking.router)
 dp.include_router(admin.router)
 
-# Временное хранилище для навигации
-user_navigation = {}
+# Метрики обработчиков и SQL
+setup_handler_metrics(dp, "main")
+setup_db_metrics(engine)
+setup_query_audit(dp, "main", engine)
+setup_db_session(dp, async_session)
+if hasattr(dp, "peak_active"):
+    registry.callback("bot_updates_in_progress", "Апдейты в обработке", lambda: dp.active)
+    registry.callback("bot_chats_queued", "Чаты с апдейтами в очереди", lambda: dp.queued_chats)
+
+# Подсказка при нажатии кнопки от прежней версии каталога
+CATALOG_UPDATED = "Каталог обновился - показываю актуальный"
+
+# Статичные страницы собираются один раз при запуске
+WELCOME_TEXT = f"""👋 <b>Добро пожаловать!</b>
+
+📸 Я бот фотографа <b>Марины Заугольниковой</b>
+
+Здесь вы можете:
+• Посмотреть услуги и цены
+• Выбрать товары (коллажи)
+• Записаться на фотосессию
+
+💡 <b>Подсказка:</b> Вы можете использовать меня в любом чате!
+Просто введите <code>@{config.MAIN_BOT_USERNAME} прайс</code> или <code>@{config.MAIN_BOT_USERNAME} товары</code>
+
+Выберите действие:"""
+
+HELP_TEXT = f"""📖 <b>Помощь</b>
+
+<b>Основные команды:</b>
+/start - Главное меню
+/services - Услуги и цены
+/products - Товары
+/booking - Записаться на съёмку
+/contacts - Контакты
+
+<b>Inline режим:</b>
+Введите в любом чате:
+• <code>@{config.MAIN_BOT_USERNAME} прайс</code> - показать услуги
+• <code>@{config.MAIN_BOT_USERNAME} товары</code> - показать товары
+• <code>@{config.MAIN_BOT_USERNAME} запись</code> - ссылка на запись
+
+<b>AI Ассистент:</b>
+Если фотограф не отвечает, используйте:
+<code>@{config.AI_BOT_USERNAME} ваш вопрос</code>"""
+
+CONTACTS_TEXT = """📞 <b>Контакты</b>
+
+👩‍🎨 <b>Фотограф:</b> Марина Заугольникова
+
+📱 <b>Telegram:</b> @marina_photo
+📷 <b>Instagram:</b> @marina_photo
+📧 <b>Email:</b> marina@photo.ru
+
+🕐 <b>Время работы:</b> 
+Пн-Пт: 10:00 - 20:00
+Сб-Вс: по договорённости"""
+
+FAQ_TEXT = """❓ <b>Часто задаваемые вопросы</b>
+
+<b>Q: Как записаться на съёмку?</b>
+A: Нажмите "Записаться на съёмку" в главном меню и заполните форму.
+
+<b>Q: Можно ли отменить запись?</b>
+A: Да, свяжитесь с фотографом минимум за 24 часа.
+
+<b>Q: Когда будут готовы фото?</b>
+A: Обычно 7-14 дней в зависимости от объёма.
+
+<b>Q: Как получить цифровые коллажи?</b>
+A: После оплаты вы получите ссылку для скачивания.
+
+<b>Q: Можно ли взять несколько образов?</b>
+A: Да, количество образов обсуждается индивидуально."""
+
+PRODUCTS_FILTER_TEXT = """🎨 <b>Товары</b>
+
+Выберите категорию:
+
+📱 <b>Цифровые коллажи</b> - получите файл для печати
+📄 <b>Бумажные коллажи</b> - готовый напечатанный коллаж"""
 
 
 # ============ ОСНОВНЫЕ КОМАНДЫ ============
 
 @dp.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка /start и deeplinks"""
     await state.clear()
     
@@ -50,11 +139,11 @@ async def cmd_start(message: Message, state: FSMContext):
         param = args[1]
         
         if param == "booking" or param.startswith("book_"):
-            await handle_booking_deeplink(message, state, param)
+            await handle_booking_deeplink(message, state, session, param)
             return
         
         elif param == "services":
-            await show_services(message)
+            await show_services(message, session)
             return
         
         elif param == "products":
@@ -63,27 +152,13 @@ async def cmd_start(message: Message, state: FSMContext):
         
         elif param.startswith("order_"):
             product_id = int(param.replace("order_", ""))
-            await handle_product_order(message, product_id)
+            await handle_product_order(message, session, product_id)
             return
     
     is_admin = message.from_user.id in config.ADMIN_IDS
     
-    welcome_text = """👋 <b>Добро пожаловать!</b>
-
-📸 Я бот фотографа <b>Марины Заугольниковой</b>
-
-Здесь вы можете:
-• Посмотреть услуги и цены
-• Выбрать товары (коллажи)
-• Записаться на фотосессию
-
-💡 <b>Подсказка:</b> Вы можете использовать меня в любом чате!
-Просто введите <code>@{bot_username} прайс</code> или <code>@{bot_username} товары</code>
-
-Выберите действие:"""
-    
     await message.answer(
-        welcome_text.format(bot_username=config.MAIN_BOT_USERNAME),
+        WELCOME_TEXT,
         parse_mode="HTML",
         reply_markup=main_menu_kb(is_admin)
     )
@@ -92,32 +167,13 @@ async def cmd_start(message: Message, state: FSMContext):
 @dp.message(Command("help"))
 async def cmd_help(message: Message):
     """Помощь"""
-    help_text = f"""📖 <b>Помощь</b>
-
-<b>Основные команды:</b>
-/start - Главное меню
-/services - Услуги и цены
-/products - Товары
-/booking - Записаться на съёмку
-/contacts - Контакты
-
-<b>Inline режим:</b>
-Введите в любом чате:
-• <code>@{config.MAIN_BOT_USERNAME} прайс</code> - показать услуги
-• <code>@{config.MAIN_BOT_USERNAME} товары</code> - показать товары
-• <code>@{config.MAIN_BOT_USERNAME} запись</code> - ссылка на запись
-
-<b>AI Ассистент:</b>
-Если фотограф не отвечает, используйте:
-<code>@{config.AI_BOT_USERNAME} ваш вопрос</code>"""
-    
-    await message.answer(help_text, parse_mode="HTML")
+    await message.answer(HELP_TEXT, parse_mode="HTML")
 
 
 @dp.message(Command("services"))
-async def cmd_services(message: Message):
+async def cmd_services(message: Message, session: AsyncSession):
     """Команда просмотра услуг"""
-    await show_services(message)
+    await show_services(message, session)
 
 
 @dp.message(Command("products"))
@@ -127,28 +183,16 @@ async def cmd_products(message: Message):
 
 
 @dp.message(Command("booking"))
-async def cmd_booking(message: Message, state: FSMContext):
+async def cmd_booking(message: Message, state: FSMContext, session: AsyncSession):
     """Команда записи"""
-    await handle_booking_deeplink(message, state)
+    await handle_booking_deeplink(message, state, session)
 
 
 @dp.message(Command("contacts"))
 async def cmd_contacts(message: Message):
     """Контакты"""
-    contacts_text = """📞 <b>Контакты</b>
-
-👩‍🎨 <b>Фотограф:</b> Марина Заугольникова
-
-📱 <b>Telegram:</b> @marina_photo
-📷 <b>Instagram:</b> @marina_photo
-📧 <b>Email:</b> marina@photo.ru
-
-🕐 <b>Время работы:</b> 
-Пн-Пт: 10:00 - 20:00
-Сб-Вс: по договорённости"""
-    
     await message.answer(
-        contacts_text,
+        CONTACTS_TEXT,
         parse_mode="HTML",
         reply_markup=main_menu_kb(message.from_user.id in config.ADMIN_IDS)
     )
@@ -171,18 +215,19 @@ async def callback_main_menu(callback: CallbackQuery, state: FSMContext):
 
 
 @dp.callback_query(F.data == "services")
-async def callback_services(callback: CallbackQuery):
+async def callback_services(callback: CallbackQuery, session: AsyncSession):
     """Показать услуги"""
-    await show_services(callback.message, edit=True)
+    await show_services(callback.message, session, edit=True)
     await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("service_nav:"))
-async def callback_service_nav(callback: CallbackQuery):
+async def callback_service_nav(callback: CallbackQuery, session: AsyncSession):
     """Навигация по услугам"""
-    index = int(callback.data.split(":")[1])
-    await show_service_by_index(callback.message, callback.from_user.id, index, edit=True)
-    await callback.answer()
+    version, index, _ = parse_nav(callback.data)
+    snapshot, stale = await catalog.get(session, version)
+    await show_service_by_index(callback.message, snapshot, index, edit=True)
+    await callback.answer(CATALOG_UPDATED if stale else None)
 
 
 @dp.callback_query(F.data == "products")
@@ -193,28 +238,27 @@ async def callback_products(callback: CallbackQuery):
 
 
 @dp.callback_query(F.data.startswith("products_filter:"))
-async def callback_products_filter(callback: CallbackQuery):
+async def callback_products_filter(callback: CallbackQuery, session: AsyncSession):
     """Фильтр товаров"""
     filter_type = callback.data.split(":")[1]
-    await show_products(callback.message, callback.from_user.id, filter_type, edit=True)
+    await show_products(callback.message, session, filter_type, edit=True)
     await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("product_nav:"))
-async def callback_product_nav(callback: CallbackQuery):
+async def callback_product_nav(callback: CallbackQuery, session: AsyncSession):
     """Навигация по товарам"""
-    parts = callback.data.split(":")
-    index = int(parts[1])
-    filter_type = parts[2] if len(parts) > 2 else "all"
-    await show_product_by_index(callback.message, callback.from_user.id, index, filter_type, edit=True)
-    await callback.answer()
+    version, index, filter_type = parse_nav(callback.data)
+    snapshot, stale = await catalog.get(session, version)
+    await show_product_by_index(callback.message, snapshot, index, filter_type, edit=True)
+    await callback.answer(CATALOG_UPDATED if stale else None)
 
 
 @dp.callback_query(F.data.startswith("order_product:"))
-async def callback_order_product(callback: CallbackQuery):
+async def callback_order_product(callback: CallbackQuery, session: AsyncSession):
     """Заказ товара"""
     product_id = int(callback.data.split(":")[1])
-    await handle_product_order_callback(callback, product_id)
+    await handle_product_order_callback(callback, session, product_id)
     await callback.answer()
 
 
@@ -228,41 +272,57 @@ async def callback_contacts(callback: CallbackQuery):
 @dp.callback_query(F.data == "faq")
 async def callback_faq(callback: CallbackQuery):
     """FAQ"""
-    faq_text = """❓ <b>Часто задаваемые вопросы</b>
-
-<b>Q: Как записаться на съёмку?</b>
-A: Нажмите "Записаться на съёмку" в главном меню и заполните форму.
-
-<b>Q: Можно ли отменить запись?</b>
-A: Да, свяжитесь с фотографом минимум за 24 часа.
-
-<b>Q: Когда будут готовы фото?</b>
-A: Обычно 7-14 дней в зависимости от объёма.
-
-<b>Q: Как получить цифровые коллажи?</b>
-A: После оплаты вы получите ссылку для скачивания.
-
-<b>Q: Можно ли взять несколько образов?</b>
-A: Да, количество образов обсуждается индивидуально."""
-    
     await callback.message.edit_text(
-        faq_text,
+        FAQ_TEXT,
         parse_mode="HTML",
         reply_markup=main_menu_kb(callback.from_user.id in config.ADMIN_IDS)
     )
     await callback.answer()
 
 
+# ============ КАРТОЧКИ ============
+# Тексты карточек кэшируются в utils.render_cache по (id, версия каталога, вариант)
+
+def service_card_text(service: CatalogItem) -> str:
+    return f"""📸 <b>{service.name}</b>
+
+{service.description or 'Описание скоро появится...'}
+
+💰 <b>Стоимость:</b> {service.price:,.0f} руб.
+⏱ <b>Длительность:</b> {service.duration or 'По договорённости'}"""
+
+
+def product_card_text(product: CatalogItem) -> str:
+    type_emoji = "📱" if product.product_type == "digital" else "📄"
+    type_text = "Цифровой" if product.product_type == "digital" else "Бумажный"
+    return f"""{type_emoji} <b>{product.name}</b>
+
+{product.description or 'Описание скоро появится...'}
+
+💰 <b>Стоимость:</b> {product.price:,.0f} руб.
+📦 <b>Тип:</b> {type_text}"""
+
+
+def product_order_text(product: CatalogItem) -> str:
+    type_emoji = "📱" if product.product_type == "digital" else "📄"
+    return f"""✅ Вы хотите заказать:
+
+{type_emoji} <b>{product.name}</b>
+💰 <b>Цена:</b> {product.price:,.0f} руб.
+
+Для оформления заказа свяжитесь с фотографом:
+📱 @marina_photo
+
+Или напишите прямо сюда, и мы свяжемся с вами!"""
+
+
 # ============ ФУНКЦИИ ОТОБРАЖЕНИЯ ============
 
-async def show_services(message: Message, edit: bool = False):
+async def show_services(message: Message, session: AsyncSession, edit: bool = False):
     """Показать первую услугу"""
-    async with async_session() as session:
-        query = select(Service).where(Service.is_active == True).order_by(Service.order)
-        result = await session.execute(query)
-        services = result.scalars().all()
+    snapshot = await catalog.current(session)
     
-    if not services:
+    if not snapshot.services:
         text = "😔 Пока нет доступных услуг."
         if edit:
             await message.edit_text(text, reply_markup=main_menu_kb())
@@ -270,38 +330,18 @@ async def show_services(message: Message, edit: bool = False):
             await message.answer(text, reply_markup=main_menu_kb())
         return
     
-    user_navigation[message.chat.id] = {
-        "services": services,
-        "type": "services"
-    }
-    
-    await show_service_by_index(message, message.chat.id, 0, edit)
+    await show_service_by_index(message, snapshot, 0, edit)
 
 
-async def show_service_by_index(message: Message, user_id: int, index: int, edit: bool = False):
-    """Показать услугу по индексу"""
-    data = user_navigation.get(user_id, {})
-    services = data.get("services", [])
-    
+async def show_service_by_index(message: Message, snapshot: CatalogSnapshot, index: int, edit: bool = False):
+    """Показать услугу по индексу из снимка каталога"""
+    services = snapshot.services
     if not services:
-        async with async_session() as session:
-            query = select(Service).where(Service.is_active == True).order_by(Service.order)
-            result = await session.execute(query)
-            services = result.scalars().all()
-        
-        user_navigation[user_id] = {"services": services, "type": "services"}
-    
-    if not services or index >= len(services):
         return
-    
+    # Кнопка от старой версии каталога могла указывать за конец списка
+    index = min(max(index, 0), len(services) - 1)
     service = services[index]
-    
-    text = f"""📸 <b>{service.name}</b>
-
-{service.description or 'Описание скоро появится...'}
-
-💰 <b>Стоимость:</b> {service.price:,.0f} руб.
-⏱ <b>Длительность:</b> {service.duration or 'По договорённости'}"""
+    text = cards.get(service.id, snapshot.version, "service", service_card_text, service)
     
     # Проверяем есть ли подробная страница
     has_detail = bool(service.detail_page_url)
@@ -311,59 +351,26 @@ async def show_service_by_index(message: Message, user_id: int, index: int, edit
         len(services), 
         service.id,
         has_detail_page=has_detail,
-        detail_page_url=service.detail_page_url
+        detail_page_url=service.detail_page_url,
+        version=snapshot.version
     )
     
-    if service.photo_url:
-        try:
-            if edit:
-                await message.delete()
-            await message.answer_photo(
-                photo=service.photo_url,
-                caption=text,
-                parse_mode="HTML",
-                reply_markup=kb
-            )
-            return
-        except:
-            pass
-    
-    if edit:
-        await message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-    else:
-        await message.answer(text, parse_mode="HTML", reply_markup=kb)
+    return await show_card(message, text, kb, photo_url=service.photo_url, edit=edit)
 
 
 async def show_products_filter(message: Message, edit: bool = False):
     """Показать фильтр товаров"""
-    text = """🎨 <b>Товары</b>
-
-Выберите категорию:
-
-📱 <b>Цифровые коллажи</b> - получите файл для печати
-📄 <b>Бумажные коллажи</b> - готовый напечатанный коллаж"""
-    
     if edit:
-        await message.edit_text(text, parse_mode="HTML", reply_markup=products_filter_kb())
+        await message.edit_text(PRODUCTS_FILTER_TEXT, parse_mode="HTML", reply_markup=products_filter_kb())
     else:
-        await message.answer(text, parse_mode="HTML", reply_markup=products_filter_kb())
+        await message.answer(PRODUCTS_FILTER_TEXT, parse_mode="HTML", reply_markup=products_filter_kb())
 
 
-async def show_products(message: Message, user_id: int, filter_type: str = "all", edit: bool = False):
+async def show_products(message: Message, session: AsyncSession, filter_type: str = "all", edit: bool = False):
     """Показать товары"""
-    async with async_session() as session:
-        if filter_type == "all":
-            query = select(Product).where(Product.is_active == True).order_by(Product.order)
-        else:
-            query = select(Product).where(
-                Product.is_active == True,
-                Product.product_type == filter_type
-            ).order_by(Product.order)
-        
-        result = await session.execute(query)
-        products = result.scalars().all()
+    snapshot = await catalog.current(session)
     
-    if not products:
+    if not snapshot.products_for(filter_type):
         text = "😔 В этой категории пока нет товаров."
         if edit:
             await message.edit_text(text, reply_markup=products_filter_kb())
@@ -371,33 +378,17 @@ async def show_products(message: Message, user_id: int, filter_type: str = "all"
             await message.answer(text, reply_markup=products_filter_kb())
         return
     
-    user_navigation[user_id] = {
-        "products": products,
-        "filter": filter_type,
-        "type": "products"
-    }
-    
-    await show_product_by_index(message, user_id, 0, filter_type, edit)
+    await show_product_by_index(message, snapshot, 0, filter_type, edit)
 
 
-async def show_product_by_index(message: Message, user_id: int, index: int, filter_type: str, edit: bool = False):
-    """Показать товар по индексу"""
-    data = user_navigation.get(user_id, {})
-    products = data.get("products", [])
-    
-    if not products or index >= len(products):
+async def show_product_by_index(message: Message, snapshot: CatalogSnapshot, index: int, filter_type: str, edit: bool = False):
+    """Показать товар по индексу из снимка каталога"""
+    products = snapshot.products_for(filter_type)
+    if not products:
         return
-    
+    index = min(max(index, 0), len(products) - 1)
     product = products[index]
-    type_emoji = "📱" if product.product_type == "digital" else "📄"
-    type_text = "Цифровой" if product.product_type == "digital" else "Бумажный"
-    
-    text = f"""{type_emoji} <b>{product.name}</b>
-
-{product.description or 'Описание скоро появится...'}
-
-💰 <b>Стоимость:</b> {product.price:,.0f} руб.
-📦 <b>Тип:</b> {type_text}"""
+    text = cards.get(product.id, snapshot.version, "product", product_card_text, product)
     
     # Проверяем есть ли подробная страница
     has_detail = bool(product.detail_page_url)
@@ -408,79 +399,57 @@ async def show_product_by_index(message: Message, user_id: int, index: int, filt
         product.id, 
         filter_type,
         has_detail_page=has_detail,
-        detail_page_url=product.detail_page_url
+        detail_page_url=product.detail_page_url,
+        version=snapshot.version
     )
     
-    if product.photo_url:
-        try:
-            if edit:
-                await message.delete()
-            await message.answer_photo(
-                photo=product.photo_url,
-                caption=text,
-                parse_mode="HTML",
-                reply_markup=kb
-            )
-            return
-        except:
-            pass
-    
-    if edit:
-        await message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-    else:
-        await message.answer(text, parse_mode="HTML", reply_markup=kb)
+    return await show_card(message, text, kb, photo_url=product.photo_url, edit=edit)
 
 
-async def handle_product_order(message: Message, product_id: int):
+async def handle_product_order(message: Message, session: AsyncSession, product_id: int):
     """Обработка заказа товара через deeplink"""
-    async with async_session() as session:
+    snapshot = await catalog.current(session)
+    item = snapshot.product(product_id)
+    if item is not None:
+        text = cards.get(item.id, snapshot.version, "product_order", product_order_text, item)
+    else:
+        # Неактивного товара нет в снимке - ссылка могла остаться в старом сообщении
         product = await session.get(Product, product_id)
-    
-    if not product:
-        await message.answer("Товар не найден 😔", reply_markup=main_menu_kb())
-        return
-    
-    type_emoji = "📱" if product.product_type == "digital" else "📄"
-    
-    text = f"""✅ Вы хотите заказать:
-
-{type_emoji} <b>{product.name}</b>
-💰 <b>Цена:</b> {product.price:,.0f} руб.
-
-Для оформления заказа свяжитесь с фотографом:
-📱 @marina_photo
-
-Или напишите прямо сюда, и мы свяжемся с вами!"""
+        if not product:
+            await message.answer("Товар не найден 😔", reply_markup=main_menu_kb())
+            return
+        text = product_order_text(CatalogItem.from_product(product))
     
     await message.answer(text, parse_mode="HTML", reply_markup=main_menu_kb())
 
 
-async def handle_product_order_callback(callback: CallbackQuery, product_id: int):
+async def handle_product_order_callback(callback: CallbackQuery, session: AsyncSession, product_id: int):
     """Обработка заказа товара через callback"""
-    async with async_session() as session:
-        product = await session.get(Product, product_id)
+    product = await session.get(Product, product_id)
+    product_name = product.name if product else None
+    
+    # Уведомляем админа
+    if product:
+        notify_admins(
+            session,
+            f"🛒 <b>Интерес к товару!</b>\n\n"
+            f"Товар: {product.name}\n"
+            f"Цена: {product.price:,.0f} руб.\n\n"
+            f"Пользователь: @{callback.from_user.username or 'нет'}\n"
+            f"ID: {callback.from_user.id}",
+            digest_key="product"
+        )
+    # Транзакция заканчивается до запросов к Telegram: медленный ответ API
+    # не держит соединение и блокировку записи SQLite против воркеров outbox
+    await session.commit()
     
     if not product:
         await callback.message.edit_text("Товар не найден 😔", reply_markup=main_menu_kb())
         return
     
-    # Уведомляем админа
-    for admin_id in config.ADMIN_IDS:
-        try:
-            await bot.send_message(
-                admin_id,
-                f"🛒 <b>Интерес к товару!</b>\n\n"
-                f"Товар: {product.name}\n"
-                f"Цена: {product.price:,.0f} руб.\n\n"
-                f"Пользователь: @{callback.from_user.username or 'нет'}\n"
-                f"ID: {callback.from_user.id}",
-                parse_mode="HTML"
-            )
-        except:
-            pass
-    
+    outbox.wake()
     await callback.message.edit_text(
-        f"✅ Заявка на товар '<b>{product.name}</b>' отправлена!\n\n"
+        f"✅ Заявка на товар '<b>{product_name}</b>' отправлена!\n\n"
         "Марина свяжется с вами в ближайшее время.",
         parse_mode="HTML",
         reply_markup=main_menu_kb()
@@ -489,7 +458,7 @@ async def handle_product_order_callback(callback: CallbackQuery, product_id: int
 
 # ============ ЗАПУСК ============
 
-async def main():
+async def main(handle_signals: bool = True):
     """Главная функция запуска"""
     # Инициализируем БД
     await init_db()
@@ -497,9 +466,18 @@ async def main():
     logging.info("🚀 Бот запускается...")
     logging.info(f"📡 Прокси: {config.PROXY_URL}")
     
-    # Запускаем polling
-    await dp.start_polling(bot)
+    # Доставка уведомлений из outbox
+    await outbox.start(bot)
+    await start_metrics_server(config.METRICS_HOST, config.MAIN_METRICS_PORT)
+    
+    # Запускаем polling (вебхук, если остался от webhook режима, снимаем).
+    # SIGINT/SIGTERM останавливают только приём апдейтов, дальше - graceful_shutdown
+    await bot.delete_webhook()
+    try:
+        await dp.start_polling(bot, handle_signals=handle_signals, close_bot_session=False)
+    finally:
+        await graceful_shutdown("main_bot", [bot], polling_tasks(dp), config.SHUTDOWN_TIMEOUT, outbox=outbox)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run_process(main()))
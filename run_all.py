@@ -1,23 +1,231 @@
+"""Запуск обоих ботов.
+
+По умолчанию run_all работает как супервизор: каждый бот запускается
+в отдельном процессе, упавшие процессы перезапускаются с нарастающей
+задержкой, SIGINT/SIGTERM пересылаются детям для корректной остановки,
+а раз в SUPERVISOR_REPORT_INTERVAL секунд в лог пишется CPU и RSS
+каждого процесса. В webhook режиме оба бота живут в одном процессе,
+так как их обслуживает один HTTP сервер.
+
+    python run_all.py                  # процесс на бота
+    python run_all.py --single-process # оба бота в одном event loop
+"""
 import asyncio
 import logging
-from main_bot import main as main_bot_start
-from ai_bot import main as ai_bot_start
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from config import config
+from utils.logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger("supervisor")
+
+# Имя процесса -> модуль с async def main()
+CHILDREN = {
+    "main": "main_bot",
+    "ai": "ai_bot",
+}
+WEBHOOK_CHILDREN = {
+    "webhook": "webhook",
+}
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
 async def run_all():
-    """Запуск обоих ботов одновременно"""
-    await asyncio.gather(
-        main_bot_start(),
-        ai_bot_start()
-    )
+    """Запуск обоих ботов одновременно в одном процессе"""
+    from utils.shutdown import install_stop_signals, run_process
+
+    if config.WEBHOOK_ENABLED:
+        from webhook import main as webhook_start
+        await run_process(webhook_start())
+        return
+
+    import ai_bot
+    import main_bot
+
+    # Обработчик сигнала в loop один - останавливаем polling обоих ботов сами
+    async def stop_polling(dp):
+        try:
+            await dp.stop_polling()
+        except RuntimeError:  # polling ещё не запущен
+            pass
+
+    install_stop_signals(lambda: [
+        asyncio.create_task(stop_polling(dp)) for dp in (main_bot.dp, ai_bot.dp)
+    ])
+    # Outbox досылает main_bot, а БД и сервер метрик общие - их закрывает
+    # run_process, когда остановились оба бота
+    await run_process(asyncio.gather(
+        main_bot.main(handle_signals=False),
+        ai_bot.main(handle_signals=False)
+    ))
+
+
+def run_child(name: str, module_name: str):
+    """Точка входа дочернего процесса"""
+    import importlib
+
+    setup_logging(name, force=True)
+    # Ctrl+C получает вся группа процессов - останавливаемся по SIGTERM от супервизора
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    module = importlib.import_module(module_name)
+    from utils.shutdown import run_process
+
+    async def runner():
+        task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+        await run_process(module.main())
+
+    try:
+        asyncio.run(runner())
+    except asyncio.CancelledError:
+        pass
+
+
+def read_proc_stats(pid: int):
+    """CPU время (секунды) и RSS (МБ) процесса из /proc. None, если недоступно"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+        rss = 0.0
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024
+                    break
+        return cpu, rss
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class Child:
+    """Дочерний процесс бота и его состояние перезапусков"""
+
+    def __init__(self, name: str, module_name: str):
+        self.name = name
+        self.module_name = module_name
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = config.SUPERVISOR_BACKOFF_MIN
+        self.restart_at = None
+        self.last_cpu = None
+
+    def start(self, ctx):
+        self.process = ctx.Process(
+            target=run_child, args=(self.name, self.module_name), name=f"bot-{self.name}"
+        )
+        self.process.start()
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        self.last_cpu = None
+        logger.info(f"▶️ {self.name}: запущен (pid {self.process.pid})")
+
+
+class Supervisor:
+    def __init__(self, children: dict):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.children = [Child(name, module) for name, module in children.items()]
+        self.stopping = False
+        self.last_report = time.monotonic()
+
+    def request_stop(self, signum, frame):
+        if not self.stopping:
+            logger.info(f"Получен сигнал {signal.Signals(signum).name}, останавливаем ботов...")
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+
+        for child in self.children:
+            child.start(self.ctx)
+
+        while True:
+            time.sleep(0.5)
+            if self.stopping:
+                break
+            self.check_children()
+            if time.monotonic() - self.last_report >= config.SUPERVISOR_REPORT_INTERVAL:
+                self.report()
+
+        self.shutdown()
+
+    def check_children(self):
+        now = time.monotonic()
+        for child in self.children:
+            if child.restart_at is not None:
+                if now >= child.restart_at:
+                    child.restarts += 1
+                    child.start(self.ctx)
+                continue
+
+            if child.process.is_alive():
+                # Долго проработал без падений - сбрасываем задержку
+                if now - child.started_at > config.SUPERVISOR_STABLE_AFTER:
+                    child.backoff = config.SUPERVISOR_BACKOFF_MIN
+                continue
+
+            logger.error(
+                f"💥 {child.name}: процесс завершился (код {child.process.exitcode}), "
+                f"перезапуск через {child.backoff:.0f} с"
+            )
+            child.restart_at = now + child.backoff
+            child.backoff = min(child.backoff * 2, config.SUPERVISOR_BACKOFF_MAX)
+
+    def report(self):
+        now = time.monotonic()
+        interval = now - self.last_report
+        self.last_report = now
+
+        parts = []
+        for child in self.children:
+            if not child.process or not child.process.is_alive():
+                parts.append(f"{child.name}: не запущен")
+                continue
+            stats = read_proc_stats(child.process.pid)
+            if stats is None:
+                continue
+            cpu, rss = stats
+            cpu_percent = 0.0
+            if child.last_cpu is not None and interval > 0:
+                cpu_percent = (cpu - child.last_cpu) / interval * 100
+            child.last_cpu = cpu
+            parts.append(
+                f"{child.name} (pid {child.process.pid}): CPU {cpu_percent:.1f}%, "
+                f"RSS {rss:.1f} МБ, перезапусков {child.restarts}"
+            )
+        if parts:
+            logger.info("📊 " + "; ".join(parts))
+
+    def shutdown(self):
+        alive = [c for c in self.children if c.process and c.process.is_alive()]
+        for child in alive:
+            child.process.terminate()  # SIGTERM - корректная остановка
+
+        deadline = time.monotonic() + config.SUPERVISOR_STOP_TIMEOUT
+        for child in alive:
+            child.process.join(max(deadline - time.monotonic(), 0))
+            if child.process.is_alive():
+                logger.warning(f"⚠️ {child.name}: не остановился вовремя, завершаем принудительно")
+                child.process.kill()
+                child.process.join()
+            logger.info(f"⏹ {child.name}: остановлен (код {child.process.exitcode})")
+
 
 if __name__ == "__main__":
     print("🚀 Запуск ботов...")
     print("📸 Основной бот Марины")
     print("🤖 AI Ассистент")
     print("-" * 30)
-    asyncio.run(run_all())
\ No newline at end of file
+
+    if "--single-process" in sys.argv:
+        asyncio.run(run_all())
+    else:
+        Supervisor(WEBHOOK_CHILDREN if config.WEBHOOK_ENABLED else CHILDREN).run()
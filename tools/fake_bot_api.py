@@ -0,0 +1,97 @@
+"""Фейковый сервер Bot API для сквозных тестов webhook и polling режимов.
+
+Отвечает на /bot<token>/<method> правдоподобными результатами и
+запоминает все вызовы. Боты направляются на него через TELEGRAM_API_URL.
+"""
+import asyncio
+import itertools
+import time
+
+from aiohttp import web
+
+MESSAGE_METHODS = {
+    "sendMessage", "sendPhoto", "sendDocument", "editMessageText",
+    "editMessageMedia", "editMessageCaption", "editMessageReplyMarkup",
+}
+
+
+class FakeBotAPI:
+    def __init__(self):
+        self.calls = []  # (token, метод, параметры)
+        self.webhooks = {}  # token -> параметры setWebhook
+        self.updates = []  # апдейты для getUpdates (polling)
+        self._message_ids = itertools.count(1)
+
+    def push_update(self, update: dict):
+        """Поставить апдейт в очередь getUpdates"""
+        self.updates.append(update)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.match_info["token"]
+        method = request.match_info["method"]
+
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        params = {k: v for k, v in params.items() if not hasattr(v, "file")}
+        self.calls.append((token, method, params))
+
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self.get_updates(params)})
+        return web.json_response({"ok": True, "result": self.result(token, method, params)})
+
+    async def get_updates(self, params: dict) -> list:
+        """Длинный опрос, укороченный до 0.5 с"""
+        offset = int(params.get("offset") or 0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates:
+            await asyncio.sleep(min(float(params.get("timeout") or 0), 0.5))
+        return self.updates
+
+    def result(self, token: str, method: str, params: dict):
+        bot_id = int(token.split(":")[0]) if token.split(":")[0].isdigit() else 1
+        if method == "getMe":
+            return {"id": bot_id, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+        if method == "setWebhook":
+            self.webhooks[token] = params
+            return True
+        if method == "getWebhookInfo":
+            info = self.webhooks.get(token, {})
+            return {"url": info.get("url", ""), "has_custom_certificate": False, "pending_update_count": 0}
+        if method in MESSAGE_METHODS:
+            chat_id = params.get("chat_id", 1)
+            message = {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else 1, "type": "private"},
+                "from": {"id": bot_id, "is_bot": True, "first_name": "FakeBot"},
+            }
+            if method in ("sendPhoto", "editMessageMedia"):
+                message["photo"] = [{"file_id": "fake", "file_unique_id": "fake", "width": 1, "height": 1}]
+            else:
+                message["text"] = params.get("text", "")
+            return message
+        return True
+
+    def methods(self, token: str = None) -> list:
+        return [m for t, m, _ in self.calls if token is None or t == token]
+
+
+def create_app(api: FakeBotAPI = None) -> web.Application:
+    api = api or FakeBotAPI()
+    app = web.Application()
+    app["api"] = api
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    return app
+
+
+async def start_fake_bot_api(host: str = "127.0.0.1", port: int = 0):
+    """Запустить сервер в текущем event loop. Возвращает (runner, api, base_url)"""
+    app = create_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, app["api"], f"http://{host}:{port}"
@@ -0,0 +1,98 @@
+"""Сессия aiogram без сети: записывает вызовы Bot API и возвращает правдоподобные ответы.
+
+Используется нагрузочными скриптами и бенчмарками, чтобы гонять
+обработчики ботов без Telegram.
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+
+# Методы, которые возвращают Message
+MESSAGE_METHODS = {
+    "sendMessage", "sendPhoto", "sendDocument", "editMessageText",
+    "editMessageMedia", "editMessageCaption", "editMessageReplyMarkup",
+}
+
+_message_ids = itertools.count(1000)
+
+
+def fake_message(method: TelegramMethod, bot: Bot) -> Dict[str, Any]:
+    chat_id = getattr(method, "chat_id", None) or 1
+    message = {
+        "message_id": getattr(method, "message_id", None) or next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": bot.id, "is_bot": True, "first_name": "Bot"},
+    }
+    name = method.__api_method__
+    if name in ("sendPhoto", "editMessageMedia"):
+        # Разные картинки - разные file_id, повторная отправка по file_id - тот же
+        source = getattr(method, "photo", None) or getattr(getattr(method, "media", None), "media", None)
+        source = source if isinstance(source, str) else "upload"
+        unique = source[len("photo:"):] if source.startswith("photo:") else source
+        message["photo"] = [{"file_id": f"photo:{unique}", "file_unique_id": unique, "width": 1, "height": 1}]
+        message["caption"] = getattr(method, "caption", None) or getattr(getattr(method, "media", None), "caption", None)
+    elif name == "sendDocument":
+        message["document"] = {"file_id": "fake_doc", "file_unique_id": "fake_doc"}
+    else:
+        message["text"] = getattr(method, "text", None) or getattr(method, "caption", None) or ""
+    return message
+
+
+class RecordingSession(BaseSession):
+    """Фейковая сессия: каждый вызов записывается, сеть не используется"""
+
+    def __init__(self, latency: float = 0.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: List[Tuple[str, float]] = []  # (метод, время вызова в секундах)
+        self.photos: Dict[Tuple[Any, int], list] = {}  # (чат, сообщение) -> фото, для editMessageCaption
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        # Сериализуем запрос как AiohttpSession.build_form_data, чтобы ломаные
+        # модели (reply_markup и т.п.) падали здесь, а не только в проде
+        for value in method.model_dump(warnings=False).values():
+            self.prepare_value(value, bot=bot, files={})
+
+        name = method.__api_method__
+        result: Any = fake_message(method, bot) if name in MESSAGE_METHODS else True
+        if isinstance(result, dict):
+            key = (result["chat"]["id"], result["message_id"])
+            if "photo" in result:
+                self.photos[key] = result["photo"]
+            elif name == "editMessageCaption" and key in self.photos:
+                result["photo"], result["caption"] = self.photos[key], result.pop("text")
+        response = self.check_response(
+            bot=bot, method=method, status_code=200,
+            content=json.dumps({"ok": True, "result": result})
+        )
+        self.calls.append((name, time.perf_counter() - started))
+        return response.result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+    def count(self, method: str = None) -> int:
+        return sum(1 for name, _ in self.calls if method is None or name == method)
+
+    def reset(self):
+        self.calls.clear()
+
+
+def fake_bot(latency: float = 0.0) -> Bot:
+    """Bot с RecordingSession и фиктивным токеном"""
+    return Bot(token="42:FAKE-TOKEN-FOR-LOCAL-TESTS", session=RecordingSession(latency=latency))
@@ -0,0 +1,165 @@
+"""Нагрузочный прогон AI бота против mock OpenRouter.
+
+Прогоняет смесь inline-запросов и личных сообщений через dp.feed_update
+(настоящие обработчики ai_bot), Bot API подменён RecordingSession.
+
+Примеры:
+    python tools/load_ai_bot.py --requests 500 --concurrency 50
+    python tools/load_ai_bot.py --mix inline=1 --latency lognormal:0,0.8 --rate-429 0.1
+    python tools/load_ai_bot.py --url http://127.0.0.1:8089/api/v1/chat/completions
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import Chat, InlineQuery, Message, Update, User
+
+import ai_bot
+from config import config
+from utils.ai_telemetry import percentile
+from utils.catalog_index import CatalogIndex, product_entry, service_entry
+from tools.fake_telegram import fake_bot
+from tools.mock_openrouter import add_mock_arguments, settings_from_args, start_mock_server
+
+DEFAULT_QUESTIONS = [
+    "Сколько стоит семейная фотосессия?",
+    "А на двоих?",
+    "Какие есть коллажи?",
+    "Сколько стоит свадебная съёмка?",
+    "Как записаться?",
+    "Можно с собакой?",
+    "Сколько по времени длится съёмка?",
+    "Есть цифровые коллажи?",
+]
+
+
+def seed_catalog():
+    """Фиксированный каталог, чтобы прогон не зависел от БД"""
+    services = [
+        SimpleNamespace(name=n, price=p, duration="1-2 часа", description="")
+        for n, p in [("Индивидуальная фотосессия", 4000), ("Семейная фотосессия", 5000),
+                     ("Свадебная съёмка", 25000), ("Love story", 6000)]
+    ]
+    products = [
+        SimpleNamespace(name=n, price=p, product_type=t, description="")
+        for n, p, t in [("Коллаж из 4 фото", 500, "digital"), ("Коллаж из 9 фото", 900, "paper")]
+    ]
+    ai_bot._catalog_index = CatalogIndex(
+        [service_entry(s) for s in services] + [product_entry(p) for p in products]
+    )
+    ai_bot._catalog_index_built_at = asyncio.get_running_loop().time()
+    config.CATALOG_INDEX_TTL = 10 ** 9
+
+
+def make_update(i: int, kind: str, user_id: int, question: str) -> Update:
+    user = User(id=user_id, is_bot=False, first_name="Load")
+    if kind == "inline":
+        return Update(update_id=i, inline_query=InlineQuery(
+            id=str(i), from_user=user, query=question, offset=""
+        ))
+    return Update(update_id=i, message=Message(
+        message_id=i, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+        from_user=user, text=question
+    ))
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+async def run(args):
+    runner = None
+    if args.url:
+        ai_bot.OPENROUTER_URL = args.url
+    else:
+        runner, ai_bot.OPENROUTER_URL = await start_mock_server(settings_from_args(args))
+
+    seed_catalog()
+    if args.hedge_delay is not None:
+        config.AI_HEDGE_DELAY = args.hedge_delay
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        questions = [q.strip() for q in Path(args.questions).read_text(encoding="utf-8").splitlines() if q.strip()]
+
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    bot = fake_bot(latency=args.tg_latency)
+    rng = random.Random(args.seed)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = {kind: [] for kind in kinds}
+    errors = Counter()
+    outcomes_before = len(ai_bot.ai_telemetry.records)
+
+    async def one(i: int):
+        kind = rng.choices(kinds, weights)[0]
+        update = make_update(i, kind, rng.randint(1, args.users), rng.choice(questions))
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await ai_bot.dp.feed_update(bot, update)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    records = list(ai_bot.ai_telemetry.records)[outcomes_before:]
+    outcomes = Counter(r.outcome for r in records)
+
+    print(f"Запросов: {args.requests}, параллельно: {args.concurrency}, время: {elapsed:.2f} с")
+    print(f"Пропускная способность: {args.requests / elapsed:.1f} обновлений/с")
+    all_latencies = [x for values in latencies.values() for x in values]
+    for title, values in [("все", all_latencies)] + list(latencies.items()):
+        if values:
+            ms = [v * 1000 for v in values]
+            print(f"  {title:>7}: n={len(ms):<5} p50={percentile(ms, 50):.0f} мс  "
+                  f"p95={percentile(ms, 95):.0f} мс  p99={percentile(ms, 99):.0f} мс")
+    print("Исходы AI: " + ", ".join(f"{k}={v}" for k, v in outcomes.most_common()))
+    print(f"Объединено одинаковых вопросов: {sum(r.cache_hit for r in records)}")
+    if errors:
+        print("Исключения обработчиков: " + ", ".join(f"{k}={v}" for k, v in errors.most_common()))
+    print(f"Вызовов Bot API: {bot.session.count()}")
+
+    if runner is not None:
+        print(f"Mock OpenRouter: {runner.app['mock'].stats}")
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load harness for ai_bot")
+    parser.add_argument("--url", help="внешний mock/прокси вместо встроенного")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--mix", default="inline=0.7,chat=0.3")
+    parser.add_argument("--questions", help="файл с вопросами, по одному на строку")
+    parser.add_argument("--tg-latency", type=float, default=0.0, help="задержка фейкового Bot API, с")
+    parser.add_argument("--hedge-delay", type=float)
+    parser.add_argument("--seed", type=int, default=1)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    
+    # Лог на каждый апдейт только мешает читать результат
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
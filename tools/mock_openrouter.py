@@ -0,0 +1,180 @@
+"""Локальная замена OpenRouter /api/v1/chat/completions для тестов и нагрузки.
+
+Запуск:
+    python tools/mock_openrouter.py --port 8089 --latency lognormal:-0.5,0.6 --rate-429 0.05
+    OPENROUTER_URL=http://127.0.0.1:8089/api/v1/chat/completions python ai_bot.py
+
+Распределения задержки (секунды):
+    fixed:0.3  uniform:0.1,1.5  exp:0.5  lognormal:mu,sigma  normal:mean,std
+Задержку можно задать отдельно для модели: --model-latency openai/gpt-oss-20b:free=fixed:5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from aiohttp import web
+
+
+def parse_latency(spec: str):
+    """Строка вида 'uniform:0.1,1.5' -> функция, возвращающая задержку"""
+    name, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x]
+
+    if name == "fixed":
+        return lambda: params[0]
+    if name == "uniform":
+        return lambda: random.uniform(params[0], params[1])
+    if name == "exp":
+        return lambda: random.expovariate(1 / params[0])
+    if name == "lognormal":
+        return lambda: random.lognormvariate(params[0], params[1])
+    if name == "normal":
+        return lambda: max(0.0, random.gauss(params[0], params[1]))
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+@dataclass
+class MockSettings:
+    latency: str = "fixed:0.2"
+    model_latency: Dict[str, str] = field(default_factory=dict)
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    answer: str = "📸 Семейная фотосессия стоит 5 000 руб. Записаться: @MarinaZaugolnikova_bot"
+    chunk_delay: float = 0.02
+
+
+class MockOpenRouter:
+    """Обработчик запросов с настраиваемыми задержками и ошибками"""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self._latency = parse_latency(settings.latency)
+        self._model_latency = {m: parse_latency(s) for m, s in settings.model_latency.items()}
+        self.stats = {"requests": 0, "429": 0, "5xx": 0, "ok": 0, "stream": 0}
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        body = await request.json()
+        model = body.get("model", "mock")
+
+        await asyncio.sleep(self._model_latency.get(model, self._latency)())
+
+        roll = random.random()
+        if roll < self.settings.rate_429:
+            self.stats["429"] += 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Rate limit exceeded (mock)"}},
+                status=429, headers={"Retry-After": "1"}
+            )
+        if roll < self.settings.rate_429 + self.settings.rate_5xx:
+            self.stats["5xx"] += 1
+            status = random.choice([500, 502, 503])
+            return web.json_response({"error": {"code": status, "message": "Upstream error (mock)"}}, status=status)
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 3 + 1
+        completion_tokens = len(self.settings.answer) // 3 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"gen-mock-{int(time.time() * 1000)}"
+
+        if body.get("stream"):
+            self.stats["stream"] += 1
+            return await self._stream(request, completion_id, model, usage)
+
+        self.stats["ok"] += 1
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.settings.answer},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    async def _stream(self, request, completion_id, model, usage) -> web.StreamResponse:
+        """Ответ в формате SSE, как у OpenRouter при stream=true"""
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+
+        words = self.settings.answer.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}}],
+            }
+            await resp.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            await asyncio.sleep(self.settings.chunk_delay)
+
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+        await resp.write(f"data: {json.dumps(final)}\n\n".encode())
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        self.stats["ok"] += 1
+        return resp
+
+
+def create_app(settings: MockSettings = None) -> web.Application:
+    mock = MockOpenRouter(settings or MockSettings())
+    app = web.Application()
+    app["mock"] = mock
+    app.router.add_post("/api/v1/chat/completions", mock.chat_completions)
+    return app
+
+
+async def start_mock_server(settings: MockSettings = None, host: str = "127.0.0.1", port: int = 0):
+    """Запустить сервер в текущем event loop. Возвращает (runner, url)"""
+    app = create_app(settings)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/api/v1/chat/completions"
+
+
+def settings_from_args(args) -> MockSettings:
+    model_latency = {}
+    for item in args.model_latency or []:
+        model, _, spec = item.rpartition("=")
+        model_latency[model] = spec
+    return MockSettings(
+        latency=args.latency,
+        model_latency=model_latency,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+    )
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="fixed:0.2")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=SPEC")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenRouter server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(create_app(settings_from_args(args)), host=args.host, port=args.port)
@@ -0,0 +1,146 @@
+"""Проверка учёта SQL запросов по обработчикам (utils/query_audit.py).
+
+Прогоняет апдейты через диспетчер с сессией на апдейт и учётом запросов:
+просмотр заявки в админке укладывается в один запрос, превышение бюджета
+в DEV_MODE - исключение без отката записей обработчика, без него -
+предупреждение и счётчик, повторяющийся запрос отмечается как возможный
+N+1, упавший запрос не оставляет мусора на соединении. Bot API - RecordingSession.
+
+    python tools/query_audit_check.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Конфиг читается при импорте, поэтому окружение задаём до импорта ботов
+_db_dir = tempfile.mkdtemp()
+os.environ.update({
+    "MAIN_BOT_TOKEN": "111:QUERY-AUDIT",
+    "DATABASE_URL": f"sqlite+aiosqlite:///{_db_dir}/audit.db",
+    "PROXY_URL": "",
+})
+
+from aiogram import Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+from sqlalchemy import select, text
+
+from config import config
+from database import Booking, Service, async_session, engine, init_db
+from tools.fake_telegram import fake_bot
+from utils.db_session import setup_db_session
+from utils.query_audit import (
+    BUDGET_EXCEEDED, QUERIES_PER_UPDATE, REPEATED_QUERIES, QueryBudgetExceeded, query_budget,
+    setup_query_audit,
+)
+
+ADMIN_ID = 4242
+
+
+def make_update(update_id: int, kind: str, payload: str) -> Update:
+    user = User(id=ADMIN_ID, is_bot=False, first_name="Audit")
+    message = Message(message_id=update_id, date=datetime.now(), chat=Chat(id=ADMIN_ID, type="private"),
+                      from_user=user, text=payload)
+    if kind == "callback":
+        return Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id), from_user=user, chat_instance="audit", data=payload, message=message
+        ))
+    return Update(update_id=update_id, message=message)
+
+
+def queries_of(bot_name: str, handler: str) -> int:
+    series = QUERIES_PER_UPDATE.series.get((bot_name, handler))
+    return int(series[-2]) if series else -1  # сумма наблюдений
+
+
+def budget_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message(Command("two"))
+    @query_budget(1)
+    async def two_queries(message: Message, session):
+        await session.execute(select(Service.id))
+        session.add(Service(name=f"Бюджет {message.message_id}", price=1, is_active=False, order=99))
+        await session.flush()
+
+    @router.message(Command("repeat"))
+    async def repeated_queries(message: Message, session):
+        for i in range(config.SQL_REPEAT_THRESHOLD):
+            await session.execute(text("SELECT :n"), {"n": i})
+
+    @router.message(Command("broken"))
+    async def broken_query(message: Message, session, stacks: list):
+        try:
+            await session.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            conn = await session.connection()
+            stacks.append(len(conn.info.get("audit_started", [])))
+            await session.rollback()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    setup_query_audit(dp, "check", engine)
+    setup_db_session(dp, async_session)
+    return dp
+
+
+async def run() -> bool:
+    checks = []
+
+    def check(name: str, ok: bool):
+        checks.append(ok)
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    import main_bot
+
+    config.ADMIN_IDS[:] = [ADMIN_ID]
+    await init_db()
+    async with async_session() as session:
+        service = Service(name="Портрет", price=3000, is_active=True, order=0)
+        session.add(service)
+        await session.flush()
+        session.add(Booking(user_id=1, first_name="Клиент", service_id=service.id, status="new"))
+        await session.commit()
+
+    bot = fake_bot()
+    await main_bot.dp.feed_update(bot, make_update(1, "callback", "admin_booking_view:1"))
+    count = queries_of("main", "admin_view_booking")
+    check(f"просмотр заявки с услугой - один запрос ({count})", count == 1)
+
+    dp = budget_dispatcher()
+    config.DEV_MODE = True
+    try:
+        await dp.feed_update(bot, make_update(2, "message", "/two"))
+        raised = False
+    except QueryBudgetExceeded:
+        raised = True
+    check("DEV_MODE: превышение бюджета - QueryBudgetExceeded", raised)
+    async with async_session() as session:
+        saved = await session.scalar(select(Service.id).where(Service.name == "Бюджет 2"))
+    check("DEV_MODE: запись обработчика сохранена, несмотря на исключение", saved is not None)
+
+    config.DEV_MODE = False
+    before = BUDGET_EXCEEDED.get("check", "two_queries")
+    await dp.feed_update(bot, make_update(3, "message", "/two"))
+    check("без DEV_MODE: превышение бюджета только в счётчике",
+          BUDGET_EXCEEDED.get("check", "two_queries") == before + 1)
+
+    await dp.feed_update(bot, make_update(4, "message", "/repeat"))
+    check("повторяющийся запрос отмечен как возможный N+1",
+          REPEATED_QUERIES.get("check", "repeated_queries") == 1)
+
+    stacks = []
+    await dp.feed_update(bot, make_update(5, "message", "/broken"), stacks=stacks)
+    check("упавший запрос не оставляет отметку времени на соединении", stacks == [0])
+
+    await engine.dispose()
+    return all(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,127 @@
+"""Сквозная проверка webhook режима на локальном фейковом Bot API.
+
+Поднимает фейковый Bot API и mock OpenRouter, запускает webhook сервер
+обоих ботов и отправляет в него обновления так, как это делает Telegram.
+
+    python tools/webhook_e2e.py
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiohttp
+from aiohttp import web
+
+from tools.fake_bot_api import start_fake_bot_api
+from tools.mock_openrouter import MockSettings, start_mock_server
+
+MAIN_TOKEN = "111:MAIN-E2E"
+AI_TOKEN = "222:AI-E2E"
+SECRET = "e2e-secret"
+
+
+async def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+async def run() -> bool:
+    api_runner, api, api_url = await start_fake_bot_api()
+    ai_runner, ai_url = await start_mock_server(MockSettings(latency="fixed:0.05"))
+    db_dir = tempfile.mkdtemp()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        metrics_port = sock.getsockname()[1]
+
+    # Конфиг читается при импорте, поэтому окружение задаём до импорта ботов
+    os.environ.update({
+        "MAIN_BOT_TOKEN": MAIN_TOKEN,
+        "AI_BOT_TOKEN": AI_TOKEN,
+        "TELEGRAM_API_URL": api_url,
+        "PROXY_URL": "",
+        "OPENROUTER_URL": ai_url,
+        "WEBHOOK_BASE_URL": "https://bot.example.test",
+        "WEBHOOK_SECRET": SECRET,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{db_dir}/e2e.db",
+        "METRICS_HOST": "127.0.0.1",
+        "MAIN_METRICS_PORT": str(metrics_port),
+    })
+    import webhook
+    from utils.metrics import stop_metrics_server
+
+    runner = web.AppRunner(webhook.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    checks = []
+
+    def check(name: str, ok: bool):
+        checks.append(ok)
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    check("setWebhook для обоих ботов с секретом", all(
+        api.webhooks.get(t, {}).get("secret_token") == SECRET for t in (MAIN_TOKEN, AI_TOKEN)
+    ))
+
+    user = {"id": 777, "is_bot": False, "first_name": "E2E"}
+    start_update = {
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": int(time.time()), "text": "/start",
+            "chat": {"id": 777, "type": "private"}, "from": user,
+        },
+    }
+    inline_update = {
+        "update_id": 2,
+        "inline_query": {"id": "q1", "from": user, "query": "сколько стоит съёмка?", "offset": ""},
+    }
+
+    async with aiohttp.ClientSession() as http:
+        async with http.post(f"{base}/webhook/main", json=start_update,
+                             headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as resp:
+            check("неверный секрет отклонён (401)", resp.status == 401)
+
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        started = time.perf_counter()
+        async with http.post(f"{base}/webhook/main", json=start_update, headers=headers) as resp:
+            ack_ms = (time.perf_counter() - started) * 1000
+            check(f"main: апдейт принят ({resp.status}, {ack_ms:.1f} мс)", resp.status == 200)
+        check("main: ответ на /start отправлен",
+              await wait_for(lambda: "sendMessage" in api.methods(MAIN_TOKEN)))
+
+        started = time.perf_counter()
+        async with http.post(f"{base}/webhook/ai", json=inline_update, headers=headers) as resp:
+            ack_ms = (time.perf_counter() - started) * 1000
+            # Подтверждение приходит раньше, чем ответ модели (50 мс в mock)
+            check(f"ai: апдейт подтверждён до ответа модели ({ack_ms:.1f} мс)", resp.status == 200 and ack_ms < 50)
+        check("ai: answerInlineQuery отправлен",
+              await wait_for(lambda: "answerInlineQuery" in api.methods(AI_TOKEN)))
+        check("обновления не перепутаны между ботами",
+              "answerInlineQuery" not in api.methods(MAIN_TOKEN))
+
+        async with http.get(f"{base}/metrics") as resp:
+            check("метрики не отдаются на webhook порту", resp.status == 404)
+        async with http.get(f"http://127.0.0.1:{metrics_port}/metrics") as resp:
+            check("метрики на локальном порту", resp.status == 200)
+
+    await stop_metrics_server()
+    await runner.cleanup()
+    await ai_runner.cleanup()
+    await api_runner.cleanup()
+    return all(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
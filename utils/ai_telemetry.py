@@ -0,0 +1,122 @@
+import json
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional
+
+from utils.metrics import AI_REQUEST_SECONDS
+
+
+class AIRequestError(Exception):
+    """Ошибка запроса к модели с кодом исхода (http_429, empty, ...)"""
+
+    def __init__(self, outcome: str, message: str = ""):
+        super().__init__(message or outcome)
+        self.outcome = outcome
+
+
+@dataclass
+class AICallRecord:
+    """Один вызов get_ai_response"""
+    kind: str  # "inline" или "chat"
+    outcome: str = "ok"  # ok, timeout, cancelled, error, http_<код>, empty
+    model: Optional[str] = None
+    cache_hit: bool = False  # ответ получен из чужого одновременного запроса
+    prompt_build_ms: float = 0.0
+    queue_wait_ms: float = 0.0  # от готового промпта до отправки победившего запроса
+    ttfb_ms: float = 0.0  # от отправки до заголовков ответа
+    total_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    ts: float = field(default_factory=time.time)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class AITelemetry:
+    """Скользящее окно последних вызовов AI и счётчики попыток к OpenRouter"""
+
+    TIMINGS = (
+        ("prompt_build_ms", "сборка промпта"),
+        ("queue_wait_ms", "ожидание отправки"),
+        ("ttfb_ms", "до первого байта"),
+        ("total_ms", "всего"),
+    )
+
+    def __init__(self, window: int = 1000):
+        self.records: deque = deque(maxlen=window)
+        self.attempts: Counter = Counter()  # (модель, исход) -> количество
+
+    def record(self, record: AICallRecord):
+        self.records.append(record)
+        AI_REQUEST_SECONDS.observe(record.total_ms / 1000, record.kind, record.outcome)
+
+    def record_attempt(self, model: str, outcome: str):
+        self.attempts[(model, outcome)] += 1
+
+    def percentiles(self, field_name: str, records: List[AICallRecord] = None) -> Dict[str, float]:
+        records = self.records if records is None else records
+        values = [getattr(r, field_name) for r in records]
+        return {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+
+    def summary(self) -> str:
+        """Сводка для админа (HTML)"""
+        records = list(self.records)
+        if not records:
+            return "🤖 <b>AI телеметрия</b>\n\nПока нет вызовов."
+
+        outcomes = Counter(r.outcome for r in records)
+        models = Counter(r.model for r in records if r.model)
+        ok = [r for r in records if r.outcome == "ok"]
+        upstream = [r for r in ok if not r.cache_hit]
+
+        text = f"🤖 <b>AI телеметрия</b> (последние {len(records)} вызовов)\n\n"
+        text += "<b>Исходы:</b> " + ", ".join(f"{k} {v}" for k, v in outcomes.most_common()) + "\n"
+        text += f"<b>Объединённые запросы:</b> {sum(r.cache_hit for r in records)}\n\n"
+
+        text += "<b>Время успешных, мс (p50 / p95 / p99):</b>\n"
+        for name, title in self.TIMINGS:
+            source = ok if name == "total_ms" else upstream
+            p = self.percentiles(name, source)
+            text += f"• {title}: {p['p50']:.0f} / {p['p95']:.0f} / {p['p99']:.0f}\n"
+
+        prompt = self.percentiles("prompt_tokens", upstream)
+        completion = self.percentiles("completion_tokens", upstream)
+        text += "\n<b>Токены (p50 / p95):</b>\n"
+        text += f"• prompt: {prompt['p50']:.0f} / {prompt['p95']:.0f}\n"
+        text += f"• completion: {completion['p50']:.0f} / {completion['p95']:.0f}\n"
+        text += (
+            f"• всего: {sum(r.prompt_tokens for r in upstream)} + "
+            f"{sum(r.completion_tokens for r in upstream)}\n"
+        )
+
+        if models:
+            text += "\n<b>Модели:</b>\n"
+            for model, count in models.most_common():
+                text += f"• {model}: {count}\n"
+
+        if self.attempts:
+            text += "\n<b>Попытки к OpenRouter:</b>\n"
+            for (model, outcome), count in sorted(self.attempts.items()):
+                text += f"• {model} — {outcome}: {count}\n"
+
+        return text
+
+    def export(self, path: str) -> int:
+        """Выгрузить записи окна в JSONL. Возвращает количество записей"""
+        records = list(self.records)
+        with open(path, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(asdict(r), ensure_ascii=False) + "\n")
+        return len(records)
+
+
+ai_telemetry = AITelemetry()
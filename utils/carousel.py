@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InputMediaPhoto, Message
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CARD_RENDERS = registry.counter(
+    "carousel_renders_total", "Показы карточек карусели по способу обновления сообщения", labels=("mode",)
+)
+
+# photo_url -> (file_id, file_unique_id) уже отправленного фото: повторно
+# Telegram не скачивает картинку, а одинаковое фото узнаём без edit_media
+_photo_ids: Dict[str, Tuple[str, str]] = {}
+
+
+def _photo_ref(photo_url: str) -> str:
+    cached = _photo_ids.get(photo_url)
+    return cached[0] if cached else photo_url
+
+
+def _remember(photo_url: str, message: Message):
+    if isinstance(message, Message) and message.photo:
+        largest = message.photo[-1]
+        _photo_ids[photo_url] = (largest.file_id, largest.file_unique_id)
+
+
+def _same_photo(message: Message, photo_url: str) -> bool:
+    cached = _photo_ids.get(photo_url)
+    return bool(cached and message.photo and message.photo[-1].file_unique_id == cached[1])
+
+
+async def _send(message: Message, text: str, reply_markup: InlineKeyboardMarkup,
+                photo_url: Optional[str]) -> Message:
+    if photo_url:
+        try:
+            sent = await message.answer_photo(
+                photo=_photo_ref(photo_url), caption=text, parse_mode="HTML", reply_markup=reply_markup
+            )
+            _remember(photo_url, sent)
+            CARD_RENDERS.inc("send_photo")
+            return sent
+        except TelegramAPIError as e:
+            _photo_ids.pop(photo_url, None)
+            logger.warning(f"Не удалось отправить фото карточки {photo_url}: {e}")
+    CARD_RENDERS.inc("send_text")
+    return await message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+
+
+async def show_card(message: Message, text: str, reply_markup: InlineKeyboardMarkup,
+                    photo_url: Optional[str] = None, edit: bool = False) -> Message:
+    """Показать карточку карусели (HTML текст, кнопки, необязательное фото).
+
+    При edit сообщение меняется на месте одним вызовом Bot API:
+    фото -> другое фото через edit_media, то же фото -> edit_caption,
+    текст -> текст через edit_text. Текстовое сообщение нельзя превратить
+    в фото и наоборот - тогда, как и при любой ошибке Bot API, старое сообщение
+    удаляется и отправляется новое. Возвращает сообщение с карточкой.
+    """
+    if not edit:
+        return await _send(message, text, reply_markup, photo_url)
+
+    try:
+        if photo_url and message.photo:
+            if _same_photo(message, photo_url):
+                result = await message.edit_caption(caption=text, parse_mode="HTML", reply_markup=reply_markup)
+                CARD_RENDERS.inc("edit_caption")
+            else:
+                result = await message.edit_media(
+                    InputMediaPhoto(media=_photo_ref(photo_url), caption=text, parse_mode="HTML"),
+                    reply_markup=reply_markup,
+                )
+                _remember(photo_url, result)
+                CARD_RENDERS.inc("edit_media")
+            return result if isinstance(result, Message) else message
+        if not photo_url and not message.photo:
+            result = await message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+            CARD_RENDERS.inc("edit_text")
+            return result if isinstance(result, Message) else message
+    except TelegramAPIError as e:
+        # Любая ошибка Bot API (в том числе сетевая) - не падаем в обработчике
+        # навигации, а отправляем карточку заново, как раньше
+        if isinstance(e, TelegramBadRequest) and "message is not modified" in str(e):
+            CARD_RENDERS.inc("not_modified")
+            return message
+        if photo_url:
+            _photo_ids.pop(photo_url, None)
+        logger.warning(f"Не удалось изменить карточку на месте, отправляю заново: {e}")
+
+    # Смена типа карточки (текст <-> фото) или ошибка: удалить и отправить заново
+    try:
+        await message.delete()
+    except TelegramAPIError:
+        pass
+    return await _send(message, text, reply_markup, photo_url)
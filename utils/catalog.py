@@ -0,0 +1,143 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Integer, String, cast, event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from database import BotSettings, Product, Service
+
+VERSION_KEY = "catalog_version"
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    """Неизменяемая копия услуги или товара для показа"""
+    id: int
+    name: str
+    description: Optional[str]
+    price: float
+    photo_url: Optional[str]
+    detail_page_url: Optional[str]
+    duration: Optional[str] = None
+    product_type: Optional[str] = None
+
+    @classmethod
+    def from_service(cls, service: Service) -> "CatalogItem":
+        return cls(service.id, service.name, service.description, service.price or 0,
+                   service.photo_url, service.detail_page_url, duration=service.duration)
+
+    @classmethod
+    def from_product(cls, product: Product) -> "CatalogItem":
+        return cls(product.id, product.name, product.description, product.price or 0,
+                   product.photo_url, product.detail_page_url, product_type=product.product_type)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Активные услуги и товары одной версии каталога"""
+    version: int
+    services: Tuple[CatalogItem, ...]
+    products: Tuple[CatalogItem, ...]
+    _by_filter: Dict[str, Tuple[CatalogItem, ...]] = field(default_factory=dict, repr=False, compare=False)
+    _products_by_id: Dict[int, CatalogItem] = field(default_factory=dict, repr=False, compare=False)
+
+    def products_for(self, filter_type: str) -> Tuple[CatalogItem, ...]:
+        if filter_type not in self._by_filter:
+            self._by_filter[filter_type] = self.products if filter_type == "all" else tuple(
+                p for p in self.products if p.product_type == filter_type
+            )
+        return self._by_filter[filter_type]
+
+    def product(self, product_id: int) -> Optional[CatalogItem]:
+        if not self._products_by_id and self.products:
+            self._products_by_id.update((p.id, p) for p in self.products)
+        return self._products_by_id.get(product_id)
+
+
+class CatalogStore:
+    """Общий для всех пользователей снимок каталога.
+
+    Версия каталога хранится в bot_settings и увеличивается при каждом
+    изменении услуг и товаров из админки (bump в той же транзакции).
+    Кнопки карусели несут версию и индекс, поэтому любой процесс
+    отрисует страницу из своего снимка без данных о пользователе.
+    Версию в БД сверяем не чаще раза в check_interval секунд.
+    """
+
+    def __init__(self, check_interval: float = 5):
+        self.check_interval = check_interval
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def current(self, session: AsyncSession) -> CatalogSnapshot:
+        if self.snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self.snapshot
+
+        async with self._lock:
+            if self.snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self.snapshot
+            version = await self._read_version(session)
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = await self._load(session, version)
+            self._checked_at = time.monotonic()
+        return self.snapshot
+
+    async def get(self, session: AsyncSession, version: int) -> Tuple[CatalogSnapshot, bool]:
+        """Текущий снимок и признак того, что кнопка была от другой версии"""
+        snapshot = await self.current(session)
+        return snapshot, snapshot.version != version
+
+    async def bump(self, session: AsyncSession):
+        """Новая версия каталога. Вызывать перед commit изменения услуг/товаров"""
+        result = await session.execute(
+            update(BotSettings)
+            .where(BotSettings.key == VERSION_KEY)
+            .values(value=cast(cast(BotSettings.value, Integer) + 1, String))
+        )
+        if not result.rowcount:
+            session.add(BotSettings(key=VERSION_KEY, value="1"))
+        # После commit свой процесс перечитает каталог сразу, не дожидаясь check_interval
+        event.listen(session.sync_session, "after_commit", self._invalidate, once=True)
+
+    def _invalidate(self, *args):
+        self._checked_at = 0.0
+
+    async def _read_version(self, session: AsyncSession) -> int:
+        value = await session.scalar(select(BotSettings.value).where(BotSettings.key == VERSION_KEY))
+        return int(value) if value else 0
+
+    async def _load(self, session: AsyncSession, version: int) -> CatalogSnapshot:
+        services = (await session.execute(
+            select(Service).where(Service.is_active == True).order_by(Service.order)
+        )).scalars().all()
+        products = (await session.execute(
+            select(Product).where(Product.is_active == True).order_by(Product.order)
+        )).scalars().all()
+        return CatalogSnapshot(
+            version=version,
+            services=tuple(CatalogItem.from_service(s) for s in services),
+            products=tuple(CatalogItem.from_product(p) for p in products),
+        )
+
+
+catalog = CatalogStore(config.CATALOG_VERSION_CHECK)
+
+
+def parse_nav(data: str) -> Tuple[int, int, str]:
+    """service_nav:<версия>:<индекс> / product_nav:<версия>:<фильтр>:<индекс>
+    -> (версия, индекс, фильтр). Кнопки старого формата без версии - версия -1"""
+    parts = data.split(":")
+    try:
+        if parts[0] == "product_nav":
+            if len(parts) == 4:
+                return int(parts[1]), int(parts[3]), parts[2]
+            return -1, int(parts[1]), parts[2] if len(parts) > 2 else "all"
+        if len(parts) == 3:
+            return int(parts[1]), int(parts[2]), ""
+        return -1, int(parts[1]), ""
+    except (ValueError, IndexError):
+        return -1, 0, "all" if parts[0] == "product_nav" else ""
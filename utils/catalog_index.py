@@ -0,0 +1,137 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List
+
+# Короткие слова и частые вопросы, которые не помогают найти позицию
+STOP_WORDS = {
+    "а", "и", "в", "на", "с", "по", "за", "для", "до", "от", "у", "о", "об",
+    "сколько", "стоит", "стоимость", "цена", "какая", "какой", "какие", "как",
+    "можно", "есть", "ли", "что", "это", "мне", "нам", "вас", "вы", "я", "руб",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбить текст на токены с грубым стеммингом (первые 5 букв слова)"""
+    tokens = []
+    for word in re.findall(r"\w+", (text or "").lower().replace("ё", "е")):
+        if word in STOP_WORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        tokens.append(word[:5])
+    return tokens
+
+
+@dataclass
+class CatalogEntry:
+    """Позиция каталога: строка для промпта и текст для поиска"""
+    kind: str  # "service" или "product"
+    line: str
+    price: float
+    search_text: str
+    tokens: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.tokens = tokenize(self.search_text)
+
+
+class CatalogIndex:
+    """BM25-индекс по услугам и товарам"""
+
+    def __init__(self, entries: List[CatalogEntry], k1: float = 1.5, b: float = 0.75):
+        self.entries = entries
+        self.k1 = k1
+        self.b = b
+        self._tf = [Counter(e.tokens) for e in entries]
+        self._lengths = [len(e.tokens) for e in entries]
+        self._avg_len = (sum(self._lengths) / len(entries)) if entries else 0
+
+        df = Counter()
+        for tf in self._tf:
+            df.update(tf.keys())
+        n = len(entries)
+        self._idf = {
+            term: math.log(1 + (n - freq + 0.5) / (freq + 0.5))
+            for term, freq in df.items()
+        }
+
+    def search(self, query: str, k: int = 5) -> List[CatalogEntry]:
+        """Топ-k позиций по запросу (только с ненулевой релевантностью)"""
+        terms = tokenize(query)
+        if not terms or not self.entries:
+            return []
+
+        scores = []
+        for i, tf in enumerate(self._tf):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_len or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, i))
+
+        scores.sort(key=lambda x: (-x[0], x[1]))
+        return [self.entries[i] for _, i in scores[:k]]
+
+    def summary(self) -> str:
+        """Краткая сводка по всему каталогу"""
+        parts = []
+        for kind, title in (("service", "Услуг"), ("product", "Товаров")):
+            prices = [e.price for e in self.entries if e.kind == kind and e.price is not None]
+            if prices:
+                parts.append(f"{title}: {len(prices)} (от {min(prices):,.0f} до {max(prices):,.0f} руб.)")
+        return "; ".join(parts)
+
+    def full_text(self) -> str:
+        """Весь каталог в том виде, как он шёл в промпт раньше"""
+        services = [e.line for e in self.entries if e.kind == "service"]
+        products = [e.line for e in self.entries if e.kind == "product"]
+
+        text = ""
+        if services:
+            text += "АКТУАЛЬНЫЕ УСЛУГИ И ЦЕНЫ:\n\n" + "\n".join(services) + "\n"
+        else:
+            text += "Услуги временно недоступны.\n"
+        if products:
+            text += "\nТОВАРЫ:\n\n" + "\n".join(products) + "\n"
+        return text
+
+    def relevant_text(self, query: str, k: int = 5) -> str:
+        """Сводка и только подходящие к вопросу позиции"""
+        found = self.search(query, k)
+        if not found:
+            # Ничего не нашли - показываем первые позиции каталога
+            found = self.entries[:k]
+
+        text = f"КАТАЛОГ (кратко): {self.summary() or 'пуст'}\n"
+        if found:
+            text += "\nПОДХОДЯЩИЕ ПОЗИЦИИ И ЦЕНЫ:\n\n" + "\n".join(e.line for e in found) + "\n"
+
+        # Маленький каталог целиком может оказаться короче выборки
+        full = self.full_text()
+        return full if len(full) <= len(text) else text
+
+
+def service_entry(s) -> CatalogEntry:
+    line = f"📸 {s.name} - {s.price:,.0f} руб."
+    if s.duration:
+        line += f" ({s.duration})"
+    return CatalogEntry(
+        kind="service",
+        line=line,
+        price=s.price,
+        search_text=f"{s.name} {s.description or ''} {s.duration or ''} услуга съемка фотосессия"
+    )
+
+
+def product_entry(p) -> CatalogEntry:
+    type_text = "📱" if p.product_type == "digital" else "📄"
+    type_words = "цифровой электронный файл" if p.product_type == "digital" else "бумажный печать"
+    return CatalogEntry(
+        kind="product",
+        line=f"{type_text} {p.name} - {p.price:,.0f} руб.",
+        price=p.price,
+        search_text=f"{p.name} {p.description or ''} {type_words} товар коллаж"
+    )
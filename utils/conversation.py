@@ -0,0 +1,140 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class TTLStore:
+    """Хранилище в памяти с временем жизни записей и ограничением размера"""
+
+    def __init__(self, ttl: float, max_items: int = 10000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return default
+
+        return value
+
+    def set(self, key: Any, value: Any):
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._purge()
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return item[1] if item else default
+
+    def __len__(self) -> int:
+        self._purge()
+        return len(self._data)
+
+    def _purge(self):
+        """Удаляем просроченные записи и самые старые при переполнении"""
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at >= now and len(self._data) <= self.max_items:
+                break
+            self._data.pop(key)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка количества токенов (для кириллицы ~3 символа на токен)"""
+    return len(text) // 3 + 1
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    sentence = " ".join(sentence.split())
+    if len(sentence) > limit:
+        sentence = sentence[:limit - 1].rstrip() + "…"
+    return sentence
+
+
+class ConversationMemory:
+    """История диалога с AI, ограниченная бюджетом токенов.
+
+    Когда история превышает бюджет, старые сообщения сжимаются
+    в короткую локальную сводку (без обращения к модели).
+    """
+
+    def __init__(self, token_budget: int = 600, ttl: float = 1800, max_users: int = 5000):
+        self.token_budget = token_budget
+        self.summary_budget = token_budget // 4
+        self._store = TTLStore(ttl=ttl, max_items=max_users)
+
+    def _get(self, user_id: int) -> Dict[str, Any]:
+        return self._store.get(user_id) or {"summary": "", "messages": []}
+
+    def has_history(self, user_id: int) -> bool:
+        return self._store.get(user_id) is not None
+
+    def clear(self, user_id: int):
+        self._store.pop(user_id)
+
+    def build_messages(self, user_id: Optional[int], system_prompt: str, query: str) -> List[dict]:
+        """Собрать сообщения для запроса: системный промпт, сводка, история и вопрос"""
+        messages = [{"role": "system", "content": system_prompt}]
+
+        if user_id is not None:
+            data = self._get(user_id)
+            if data["summary"]:
+                messages.append({
+                    "role": "system",
+                    "content": f"Кратко о предыдущем диалоге: {data['summary']}"
+                })
+            messages.extend(data["messages"])
+
+        messages.append({"role": "user", "content": query})
+        return messages
+
+    def add_exchange(self, user_id: int, question: str, answer: str):
+        """Сохранить пару вопрос-ответ и при необходимости сжать историю"""
+        data = self._get(user_id)
+        data["messages"].append({"role": "user", "content": question})
+        data["messages"].append({"role": "assistant", "content": answer})
+
+        if self._tokens(data) > self.token_budget:
+            self._compact(data)
+
+        self._store.set(user_id, data)
+
+    def _tokens(self, data: Dict[str, Any]) -> int:
+        total = estimate_tokens(data["summary"]) if data["summary"] else 0
+        for m in data["messages"]:
+            total += estimate_tokens(m["content"])
+        return total
+
+    def _compact(self, data: Dict[str, Any]):
+        """Переносим старые сообщения в сводку, пока история не уложится в половину бюджета"""
+        messages = data["messages"]
+        notes = []
+
+        # Последнюю пару вопрос-ответ оставляем всегда
+        while len(messages) > 2 and self._tokens(data) > self.token_budget // 2:
+            old = messages.pop(0)
+            prefix = "Клиент" if old["role"] == "user" else "Ассистент"
+            notes.append(f"{prefix}: {_first_sentence(old['content'], 80)}")
+
+        if notes:
+            summary = "; ".join(filter(None, [data["summary"]] + notes))
+            # Сводка тоже ограничена: оставляем самые свежие заметки
+            max_chars = self.summary_budget * 3
+            if len(summary) > max_chars:
+                summary = "…" + summary[-max_chars:].split("; ", 1)[-1]
+            data["summary"] = summary
+
+        # Если даже последняя пара слишком длинная - обрезаем её
+        for m in messages:
+            limit = self.token_budget * 3 // 4
+            if len(m["content"]) > limit:
+                m["content"] = m["content"][:limit] + "…"
@@ -0,0 +1,41 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия БД на апдейт - обработчики получают её параметром session.
+
+    Сессия ленивая: соединение берётся при первом запросе, апдейты без
+    обращений к БД его не открывают. В конце апдейта незакоммиченная
+    транзакция коммитится, при исключении - откатывается. Обработчики
+    с записью по-прежнему делают commit сами до ответа пользователю
+    (и до outbox.wake()), чтобы не держать блокировку записи SQLite на
+    время запросов к Telegram; после commit соединение возвращается
+    и следующий запрос возьмёт его заново.
+    """
+
+    def __init__(self, session_factory: sessionmaker):
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        session: AsyncSession
+        async with self.session_factory() as session:
+            data["session"] = session
+            result = await handler(event, data)
+            if session.in_transaction():
+                await session.commit()
+        return result
+
+
+def setup_db_session(dp: Dispatcher, session_factory: sessionmaker):
+    """Сессия на апдейт для всех обработчиков диспетчера (и вложенных роутеров)"""
+    dp.update.middleware(DbSessionMiddleware(session_factory))
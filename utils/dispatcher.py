@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+
+class _ChatQueue:
+    """Очередь апдейтов одного чата: блокировка и число ожидающих"""
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class OrderedDispatcher(Dispatcher):
+    """Dispatcher, который обрабатывает апдейты разных чатов параллельно,
+    а апдейты одного чата - строго по очереди.
+
+    Polling (handle_as_tasks) и webhook (handle_in_background) и так
+    запускают каждый апдейт в отдельной задаче, но без порядка внутри чата
+    и без общего лимита. Здесь апдейт сначала встаёт в очередь своего чата
+    (asyncio.Lock отдаёт блокировку в порядке FIFO), а затем занимает
+    один из max_concurrency общих слотов. Пока апдейт ждёт свой чат,
+    слот он не занимает.
+    """
+
+    def __init__(self, *args: Any, max_concurrency: int = 32, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._chats: Dict[int, _ChatQueue] = {}
+        self.active = 0
+        self.peak_active = 0
+
+    @staticmethod
+    def ordering_key(update: Update) -> Optional[int]:
+        """Чат апдейта, а если его нет (inline, callback без сообщения) - пользователь"""
+        chat, user, _ = UserContextMiddleware.resolve_event_context(event=update)
+        if chat is not None:
+            return chat.id
+        if user is not None:
+            return user.id
+        return None
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> Any:
+        key = self.ordering_key(update)
+        if key is None:
+            return await self._feed_with_slot(bot, update, **kwargs)
+
+        queue = self._chats.get(key)
+        if queue is None:
+            queue = self._chats[key] = _ChatQueue()
+        queue.pending += 1
+        try:
+            async with queue.lock:
+                return await self._feed_with_slot(bot, update, **kwargs)
+        finally:
+            queue.pending -= 1
+            if not queue.pending:
+                self._chats.pop(key, None)
+
+    async def _feed_with_slot(self, bot: Bot, update: Update, **kwargs: Any) -> Any:
+        async with self._slots:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            try:
+                return await super().feed_update(bot, update, **kwargs)
+            finally:
+                self.active -= 1
+
+    @property
+    def queued_chats(self) -> int:
+        return len(self._chats)
+
+
+def create_dispatcher(max_concurrency: int = 0, **kwargs: Any) -> Dispatcher:
+    """OrderedDispatcher при max_concurrency > 0, иначе обычный Dispatcher aiogram"""
+    if max_concurrency > 0:
+        return OrderedDispatcher(max_concurrency=max_concurrency, **kwargs)
+    return Dispatcher(**kwargs)
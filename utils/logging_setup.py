@@ -0,0 +1,202 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config import config
+
+TEXT_FORMAT = "%(asctime)s - {process}%(name)s - %(levelname)s - %(message)s"
+
+# Поля LogRecord, которые не считаем пользовательскими (extra=...)
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "repeated"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+_repeat_filter: Optional["RepeatFilter"] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON строка на запись: время, уровень, логгер, процесс, сообщение, extra"""
+
+    def __init__(self, process_name: Optional[str] = None):
+        super().__init__()
+        self.process_name = process_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if self.process_name:
+            entry["process"] = self.process_name
+        if getattr(record, "repeated", 0):
+            entry["repeated"] = record.repeated
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Обычный текстовый формат + пометка о подавленных повторах"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        repeated = getattr(record, "repeated", 0)
+        if repeated:
+            text += f" (ещё {repeated} раз за {config.LOG_REPEAT_WINDOW:.0f} с подавлено)"
+        return text
+
+
+class RepeatFilter(logging.Filter):
+    """Ограничение повторяющихся предупреждений и ошибок.
+
+    Повтором считается запись с того же места в коде (логгер, файл,
+    строка, уровень) - сообщения часто собираются f-строкой, поэтому
+    текст не подходит. Из серии повторов пропускаем первую запись,
+    остальные в течение window секунд считаем и отбрасываем; следующая
+    запись после окна уходит с количеством подавленных.
+    """
+
+    def __init__(self, window: float, min_level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.min_level = min_level
+        self._seen: Dict[tuple, list] = {}  # ключ -> [время пропущенной записи, подавлено]
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level or self.window <= 0:
+            return True
+
+        key = (record.name, record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        state = self._seen.get(key)
+        if state is not None and now - state[0] < self.window:
+            state[1] += 1
+            self.suppressed += 1
+            return False
+
+        if state is not None and state[1]:
+            record.repeated = state[1]
+        self._seen[key] = [now, 0]
+        if len(self._seen) > 1000:
+            self._prune(now)
+        return True
+
+    def _prune(self, now: float):
+        for key in [k for k, (at, _) in self._seen.items() if now - at >= self.window]:
+            del self._seen[key]
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполненной очереди отбрасывает запись,
+    а не блокирует event loop"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Как в QueueHandler, но traceback остаётся отдельным полем (exc_text), а не частью msg"""
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"aiogram.event=WARNING,sqlalchemy.engine=INFO" -> {логгер: уровень}"""
+    levels = {}
+    for part in spec.split(","):
+        name, sep, level = part.strip().partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(process_name: Optional[str] = None, force: bool = False):
+    """Логирование через очередь: обработчик в event loop только кладёт
+    запись в очередь, вывод в stderr/файл делает фоновый поток QueueListener.
+
+    Настройки: LOG_LEVEL, LOG_LEVELS (уровни отдельных логгеров),
+    LOG_FORMAT (text/json), LOG_FILE, LOG_QUEUE_SIZE, LOG_REPEAT_WINDOW.
+    Повторный вызов в том же процессе ничего не делает, если не задан force.
+    """
+    global _listener, _listener_pid, _queue_handler, _repeat_filter
+    if _listener is not None and _listener_pid == os.getpid():
+        if not force:
+            return
+        stop_logging()
+
+    if config.LOG_FORMAT == "json":
+        formatter = JsonFormatter(process_name)
+    else:
+        formatter = TextFormatter(TEXT_FORMAT.format(process=f"[{process_name}] " if process_name else ""))
+
+    outputs = [logging.StreamHandler(sys.stderr)]
+    if config.LOG_FILE:
+        outputs.append(logging.handlers.WatchedFileHandler(config.LOG_FILE, encoding="utf-8"))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    repeat_filter = RepeatFilter(config.LOG_REPEAT_WINDOW)
+    queue_handler.addFilter(repeat_filter)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.LOG_LEVEL.upper())
+    for name, level in parse_levels(config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *outputs, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    _queue_handler, _repeat_filter = queue_handler, repeat_filter
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописать оставшиеся записи и остановить фоновый поток"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    """Сколько записей отброшено при переполненной очереди и подавлено как повторы"""
+    return {
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "suppressed": _repeat_filter.suppressed if _repeat_filter else 0,
+    }
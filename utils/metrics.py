@@ -0,0 +1,312 @@
+import bisect
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import CallbackQuery, TelegramObject
+from sqlalchemy import event
+
+from utils.logging_setup import logging_stats
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+
+    def render(self) -> str:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels: Any) -> float:
+        return self.values.get(labels, 0)
+
+    def render(self) -> str:
+        text = self.header()
+        for labels, value in sorted(self.values.items()):
+            text += f"{self.name}{_labels_text(self.label_names, labels)} {value}\n"
+        return text
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple, list] = {}  # метки -> [счётчики корзин..., сумма, количество]
+
+    def observe(self, value: float, *labels: Any):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> str:
+        text = self.header()
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                text += f"{self.name}_bucket{_labels_text(self.label_names, labels, le_label)} {cumulative}\n"
+            label_text = _labels_text(self.label_names, labels)
+            text += f"{self.name}_sum{label_text} {series[-2]}\n"
+            text += f"{self.name}_count{label_text} {series[-1]}\n"
+        return text
+
+
+class CallbackMetric(Metric):
+    """Значения, которые считываются в момент выдачи (счётчики в других модулях)"""
+
+    def __init__(self, name: str, help_text: str, kind: str, func: Callable[[], Any], labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self.func = func
+
+    def render(self) -> str:
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.debug(f"Метрика {self.name}: {e}")
+            return ""
+        text = self.header()
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                labels = labels if isinstance(labels, tuple) else (labels,)
+                text += f"{self.name}{_labels_text(self.label_names, labels)} {v}\n"
+        else:
+            text += f"{self.name} {value}\n"
+        return text
+
+
+class Registry:
+    """Метрики процесса в текстовом формате Prometheus.
+
+    Свой маленький реестр вместо prometheus_client: счётчики, гистограммы
+    и значения, которые читаются при выдаче. Всё обновляется из одного
+    event loop, поэтому без блокировок.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets=buckets))
+
+    def callback(self, name: str, help_text: str, func: Callable[[], Any],
+                 kind: str = "gauge", labels: Iterable[str] = ()) -> CallbackMetric:
+        """Значение читается из func при выдаче. Повторная регистрация заменяет func"""
+        metric = CallbackMetric(name, help_text, kind, func, labels)
+        self.metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self.metrics.values())
+
+
+registry = Registry()
+
+# ---- Обработчики aiogram ----
+
+HANDLER_SECONDS = registry.histogram(
+    "bot_handler_seconds", "Время обработчика апдейта",
+    labels=("bot", "event", "handler", "prefix")
+)
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках",
+    labels=("bot", "event", "handler", "prefix", "error")
+)
+
+# ---- БД ----
+
+DB_QUERIES = registry.counter("db_queries_total", "SQL запросы", labels=("operation",))
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_seconds", "Время SQL запроса", labels=("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+# ---- Bot API ----
+
+BOT_API_SECONDS = registry.histogram(
+    "telegram_api_request_seconds", "Время запроса к Bot API", labels=("method",)
+)
+BOT_API_ERRORS = registry.counter("telegram_api_errors_total", "Неудачные запросы к Bot API", labels=("method",))
+
+# ---- AI ----
+
+AI_REQUEST_SECONDS = registry.histogram(
+    "ai_request_seconds", "Время ответа AI ассистента", labels=("kind", "outcome"),
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+
+# ---- Логирование ----
+
+registry.callback("log_records_dropped_total", "Записи лога, отброшенные при переполненной очереди",
+                  lambda: logging_stats()["dropped"], kind="counter")
+registry.callback("log_records_suppressed_total", "Повторяющиеся записи лога, подавленные фильтром",
+                  lambda: logging_stats()["suppressed"], kind="counter")
+
+_CALLBACK_SUFFIX = re.compile(r"_\d+$")
+
+
+def callback_prefix(data: Optional[str]) -> str:
+    """Префикс callback_data без id: admin_b_confirm:15 -> admin_b_confirm"""
+    if not data:
+        return ""
+    return _CALLBACK_SUFFIX.sub("", data.split(":", 1)[0])[:40]
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время и ошибки каждого обработчика (по имени функции и префиксу callback)"""
+
+    def __init__(self, bot_name: str, event_type: str):
+        self.bot_name = bot_name
+        self.event_type = event_type
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        prefix = callback_prefix(event.data) if isinstance(event, CallbackQuery) else ""
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(self.bot_name, self.event_type, name, prefix, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, self.bot_name, self.event_type, name, prefix)
+
+
+def setup_handler_metrics(dp: Dispatcher, bot_name: str):
+    """Повесить HandlerMetricsMiddleware на все типы событий диспетчера.
+    Внутренние middleware наследуются вложенными роутерами"""
+    for event_type, observer in dp.observers.items():
+        if event_type in ("update", "error"):
+            continue
+        observer.middleware(HandlerMetricsMiddleware(bot_name, event_type))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    DB_QUERIES.inc(operation)
+    DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation)
+
+
+def _handle_error(context):
+    # Упавший запрос не доходит до after_cursor_execute - снимаем его отметку здесь
+    conn = context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def setup_db_metrics(engine):
+    """Счётчик и время SQL запросов по типу операции"""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# ---- HTTP ----
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+_server: Optional[web.AppRunner] = None
+
+
+async def start_metrics_server(host: str, port: int) -> Optional[web.AppRunner]:
+    """Поднять /metrics (и /profile для профилировщика из админки) на локальном порту.
+    Один сервер на процесс, port 0 - выключено"""
+    from utils.profiler import profile_handler
+
+    global _server
+    if _server is not None or not port:
+        return _server
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/profile", profile_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Не удалось открыть порт метрик {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    _server = runner
+    logger.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
+
+
+async def stop_metrics_server():
+    global _server
+    if _server is not None:
+        await _server.cleanup()
+        _server = None
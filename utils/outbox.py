@@ -0,0 +1,344 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from database import Notification, async_session
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых повторять бесполезно (бот заблокирован, чат не найден, ...)
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest, TelegramNotFound)
+
+# Заголовки групп в сводке
+DIGEST_TITLES = {
+    "booking": "новых заявок",
+    "product": "интерес к товарам",
+}
+MESSAGE_LIMIT = 4000  # лимит Telegram 4096 символов, с запасом
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+def enqueue(session: AsyncSession, chat_id: int, text: str, parse_mode: Optional[str] = "HTML",
+            digest_key: Optional[str] = None, urgent: bool = False):
+    """Добавить уведомление в outbox. Уйдёт вместе с commit вызывающего.
+
+    С digest_key (и включённым OUTBOX_DIGEST_WINDOW) уведомление ждёт окно
+    и уходит одной сводкой вместе с остальными отложенными для этого чата.
+    urgent отправляет сразу, минуя сводку.
+    """
+    notification = Notification(chat_id=chat_id, text=text, parse_mode=parse_mode)
+    if digest_key and not urgent and config.OUTBOX_DIGEST_WINDOW > 0:
+        notification.digest_key = digest_key
+        notification.next_attempt_at = datetime.utcnow() + timedelta(seconds=config.OUTBOX_DIGEST_WINDOW)
+    session.add(notification)
+
+
+def notify_admins(session: AsyncSession, text: str, parse_mode: Optional[str] = "HTML",
+                  digest_key: Optional[str] = None, urgent: bool = False):
+    """Уведомление каждому админу"""
+    for admin_id in config.ADMIN_IDS:
+        enqueue(session, admin_id, text, parse_mode, digest_key=digest_key, urgent=urgent)
+
+
+def build_digest(notifications: List[Notification]) -> List[Tuple[str, List[Notification]]]:
+    """Сводка, разбитая на сообщения не длиннее MESSAGE_LIMIT:
+    (текст сообщения, уведомления, которые в него вошли)"""
+    counts = Counter(n.digest_key for n in notifications)
+    header = "📬 <b>Сводка уведомлений</b>\n" + ", ".join(
+        f"{DIGEST_TITLES.get(key, key)}: {count}" for key, count in counts.most_common()
+    )
+
+    parts = []
+    current, included = header, []
+    for n in notifications:
+        text = n.text if len(n.text) <= MESSAGE_LIMIT else n.text[:MESSAGE_LIMIT - 1] + "…"
+        if len(current) + len(DIGEST_SEPARATOR) + len(text) > MESSAGE_LIMIT:
+            parts.append((current, included))
+            current, included = text, [n]
+        else:
+            current += DIGEST_SEPARATOR + text
+            included.append(n)
+    parts.append((current, included))
+    return parts
+
+
+class NotificationOutbox:
+    """Доставка уведомлений из таблицы notifications пулом воркеров.
+
+    Опрашивающая задача забирает готовые к отправке записи (pending
+    с наступившим next_attempt_at), помечает их sending и раздаёт
+    воркерам. Записи сводки (digest_key) одного чата уходят одной
+    группой, как только наступило время самой ранней из них. Неудачная попытка откладывается с экспоненциальной
+    задержкой, после OUTBOX_MAX_ATTEMPTS или на постоянной ошибке
+    запись переходит в dead. wake() будит опрос сразу после commit,
+    чтобы не ждать интервала.
+    """
+
+    def __init__(self, workers: int = 4, poll_interval: float = 5, max_attempts: int = 6,
+                 backoff_base: float = 5, backoff_max: float = 600, batch_size: int = 50):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+
+        self.bot: Optional[Bot] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+        self.digests = 0  # отправленных сводок
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, bot: Bot):
+        """Запустить опрос и воркеры. Зависшие sending (процесс упал) возвращаем в очередь"""
+        if self.running:
+            return
+        self.bot = bot
+        self._queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        self._wakeup = asyncio.Event()
+
+        async with async_session() as session:
+            await session.execute(
+                update(Notification).where(Notification.status == "sending").values(status="pending")
+            )
+            await session.commit()
+
+        self._tasks = [asyncio.create_task(self._poll_loop(), name="outbox-poll")]
+        self._tasks += [
+            asyncio.create_task(self._worker(), name=f"outbox-worker-{i}") for i in range(self.workers)
+        ]
+        logger.info(f"📤 Outbox запущен: воркеров {self.workers}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def flush(self, timeout: float):
+        """Дослать готовые уведомления до дедлайна и остановить воркеры.
+        Возвращает (отправлено, осталось pending/sending)"""
+        if not self.running:
+            return 0, 0
+        sent_before = self.sent
+        deadline = time.monotonic() + timeout
+
+        # Опрос останавливаем, дальше забираем сами - иначе одну запись заберут дважды
+        poller, workers = self._tasks[0], self._tasks[1:]
+        poller.cancel()
+        await asyncio.gather(poller, return_exceptions=True)
+        self._tasks = workers
+
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.wait_for(self._queue.join(), deadline - time.monotonic())
+                groups = await self._claim()
+                if not groups:
+                    break
+                for group in groups:
+                    self._queue.put_nowait(group)
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка при досылке outbox: {e}")
+
+        await self.stop()
+        counts = await self.counts(("pending", "sending"))
+        return self.sent - sent_before, sum(counts.values())
+
+    def wake(self):
+        """Есть новые уведомления - не ждём следующего опроса"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                claimed = await self._claim()
+                for group in claimed:
+                    await self._queue.put(group)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка опроса outbox: {e}")
+                claimed = []
+
+            # Забрали полную пачку - скорее всего есть ещё
+            if len(claimed) >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim(self) -> List[List[int]]:
+        """Пометить готовые записи как sending и вернуть их группами id"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                select(Notification.id, Notification.chat_id, Notification.digest_key)
+                .where(Notification.status == "pending", Notification.next_attempt_at <= now)
+                .order_by(Notification.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+
+            groups = [[row.id] for row in rows if not row.digest_key]
+            digest_chats = {row.chat_id for row in rows if row.digest_key}
+            if digest_chats:
+                # Вместе с наступившей записью сводки забираем отложенные для этого
+                # чата, которые ещё ждут окна. Записи после неудачной доставки
+                # ждут своей задержки: сводка её не отменяет
+                result = await session.execute(
+                    select(Notification.id, Notification.chat_id)
+                    .where(
+                        Notification.status == "pending",
+                        Notification.digest_key.is_not(None),
+                        Notification.chat_id.in_(digest_chats),
+                        or_(Notification.attempts == 0, Notification.next_attempt_at <= now)
+                    )
+                    .order_by(Notification.id)
+                )
+                by_chat = {}
+                for row in result.all():
+                    by_chat.setdefault(row.chat_id, []).append(row.id)
+                groups += list(by_chat.values())
+
+            ids = [i for group in groups for i in group]
+            if ids:
+                await session.execute(
+                    update(Notification)
+                    .where(Notification.id.in_(ids), Notification.status == "pending")
+                    .values(status="sending")
+                )
+                await session.commit()
+        return groups
+
+    async def _worker(self):
+        while True:
+            group = await self._queue.get()
+            try:
+                await self._deliver(group)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка доставки уведомлений {group}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, ids: List[int]):
+        async with async_session() as session:
+            result = await session.execute(
+                select(Notification)
+                .where(Notification.id.in_(ids), Notification.status == "sending")
+                .order_by(Notification.id)
+            )
+            notifications = list(result.scalars())
+            if not notifications:
+                return
+
+            first = notifications[0]
+            if len(notifications) == 1 and not first.digest_key:
+                parts = [(first.text, notifications)]
+            else:
+                parts = build_digest(notifications)
+
+            for n in notifications:
+                n.attempts += 1
+            # Части сводки, которые уже ушли, отмечаем сразу: при ошибке на
+            # следующей части повторяются только недоставленные уведомления
+            pending = list(notifications)
+            try:
+                for text, included in parts:
+                    await self.bot.send_message(first.chat_id, text, parse_mode=first.parse_mode)
+                    self._mark_sent(included)
+                    pending = pending[len(included):]
+                    await session.commit()
+            except PERMANENT_ERRORS as e:
+                for n in pending:
+                    self._mark_dead(n, e)
+            except Exception as e:
+                delay = self.backoff(first.attempts)
+                if isinstance(e, TelegramRetryAfter):
+                    delay = max(delay, e.retry_after)
+                for n in pending:
+                    if n.attempts >= self.max_attempts:
+                        self._mark_dead(n, e)
+                        continue
+                    n.status = "pending"
+                    n.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    n.last_error = repr(e)
+                    self.failed += 1
+                logger.warning(
+                    f"Уведомления {[n.id for n in pending]} не доставлены (попытка {first.attempts}), "
+                    f"повтор через {delay:.0f} с: {e}"
+                )
+            else:
+                if len(notifications) > 1:
+                    self.digests += 1
+
+            await session.commit()
+
+    def _mark_sent(self, notifications: List[Notification]):
+        now = datetime.utcnow()
+        for n in notifications:
+            n.status = "sent"
+            n.sent_at = now
+            n.last_error = None
+        self.sent += len(notifications)
+
+    def _mark_dead(self, notification: Notification, error: Exception):
+        notification.status = "dead"
+        notification.last_error = repr(error)
+        self.dead += 1
+        logger.error(
+            f"☠️ Уведомление #{notification.id} для {notification.chat_id} не доставлено "
+            f"после {notification.attempts} попыток: {error}"
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с джиттером"""
+        delay = min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def counts(self, statuses: Iterable[str] = ("pending", "sending", "dead")) -> dict:
+        """Количество записей по статусам"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(Notification.status, func.count(Notification.id))
+                .where(Notification.status.in_(list(statuses)))
+                .group_by(Notification.status)
+            )
+            return dict(result.all())
+
+
+outbox = NotificationOutbox(
+    workers=config.OUTBOX_WORKERS,
+    poll_interval=config.OUTBOX_POLL_INTERVAL,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+)
+
+registry.callback("outbox_sent_total", "Доставленные уведомления", lambda: outbox.sent, kind="counter")
+registry.callback("outbox_retries_total", "Неудачные попытки доставки с повтором", lambda: outbox.failed, kind="counter")
+registry.callback("outbox_dead_total", "Уведомления, не доставленные совсем", lambda: outbox.dead, kind="counter")
+registry.callback("outbox_digests_total", "Отправленные сводки", lambda: outbox.digests, kind="counter")
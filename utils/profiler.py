@@ -0,0 +1,138 @@
+import asyncio
+import html
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+# Один профиль за раз на процесс
+_lock = asyncio.Lock()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_thread(thread_id: int, seconds: float, interval: float = 0.005, max_depth: int = 64) -> Counter:
+    """Семплирование стека потока через sys._current_frames.
+
+    Вызывается из отдельного потока: раз в interval снимаем стек
+    потока thread_id и считаем одинаковые стеки. Результат - стеки в
+    формате collapsed (корень;...;лист) и число попаданий.
+    """
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        names = []
+        while frame is not None and len(names) < max_depth:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        stacks[";".join(reversed(names))] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+async def profile_loop(seconds: float, interval: float = 0.005) -> Counter:
+    """Профиль потока текущего event loop за seconds секунд"""
+    thread_id = threading.get_ident()
+    async with _lock:
+        return await asyncio.to_thread(sample_thread, thread_id, seconds, interval)
+
+
+def collapsed(stacks: Counter) -> str:
+    """Текст для flamegraph.pl / speedscope: "стек количество" по строке"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def parse_collapsed(text: str) -> Counter:
+    stacks = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack and count.isdigit():
+            stacks[stack] += int(count)
+    return stacks
+
+
+def top_functions(stacks: Counter, limit: int = 5) -> List[tuple]:
+    """Функции, в которых чаще всего был лист стека: (имя, доля)"""
+    total = sum(stacks.values())
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return [(name, count / total) for name, count in leaves.most_common(limit)] if total else []
+
+
+async def profile_handler(request: web.Request) -> web.Response:
+    """GET /profile?seconds=N - профиль этого процесса в формате collapsed"""
+    try:
+        seconds = min(float(request.query.get("seconds", "10")), 300)
+        interval = max(float(request.query.get("interval", "0.005")), 0.001)
+    except ValueError:
+        raise web.HTTPBadRequest(text="seconds и interval должны быть числами")
+    if _lock.locked():
+        raise web.HTTPConflict(text="профилирование уже идёт")
+    stacks = await profile_loop(seconds, interval)
+    return web.Response(text=collapsed(stacks), content_type="text/plain")
+
+
+async def fetch_peer_profile(url: str, seconds: float, interval: float) -> Counter:
+    """Профиль соседнего процесса через его эндпоинт метрик"""
+    timeout = aiohttp.ClientTimeout(total=seconds + 15)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(
+            f"{url.rstrip('/')}/profile", params={"seconds": str(seconds), "interval": str(interval)}
+        ) as resp:
+            resp.raise_for_status()
+            return parse_collapsed(await resp.text())
+
+
+async def profile_all(name: str, peers: Dict[str, str], seconds: float, interval: float = 0.005):
+    """Профиль этого процесса и соседей одновременно.
+    Возвращает (общий Counter со стеками вида "процесс;...", ошибки соседей)"""
+    peer_names = list(peers)
+    results = await asyncio.gather(
+        profile_loop(seconds, interval),
+        *(fetch_peer_profile(peers[p], seconds, interval) for p in peer_names),
+        return_exceptions=True
+    )
+
+    stacks = Counter()
+    errors: Dict[str, str] = {}
+    for process, result in zip([name] + peer_names, results):
+        if isinstance(result, BaseException):
+            errors[process] = f"{type(result).__name__}: {result}"
+            continue
+        for stack, count in result.items():
+            stacks[f"{process};{stack}"] += count
+    return stacks, errors
+
+
+def is_busy() -> bool:
+    return _lock.locked()
+
+
+def describe(stacks: Counter, errors: Optional[Dict[str, str]] = None, limit: int = 5) -> str:
+    """Короткая подпись к профилю (HTML)"""
+    text = f"🔥 <b>Профиль</b>: {sum(stacks.values())} семплов\n"
+    per_process = Counter()
+    for stack, count in stacks.items():
+        per_process[stack.split(";", 1)[0]] += count
+    if per_process:
+        text += ", ".join(f"{p}: {c}" for p, c in per_process.most_common()) + "\n"
+    top = top_functions(stacks, limit)
+    if top:
+        text += "\n<b>Верх стека</b> (selectors.py:select - простой):\n"
+        text += "\n".join(f"• {html.escape(name)} — {share:.0%}" for name, share in top) + "\n"
+    for process, error in (errors or {}).items():
+        text += f"\n⚠️ {process}: {html.escape(error[:150])}"
+    return text
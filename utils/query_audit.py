@@ -0,0 +1,170 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+
+from config import config
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUERIES_PER_UPDATE = registry.histogram(
+    "db_queries_per_handler", "SQL запросов за один вызов обработчика", labels=("bot", "handler"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+)
+SQL_SECONDS_PER_UPDATE = registry.histogram(
+    "db_seconds_per_handler", "Суммарное время SQL за один вызов обработчика", labels=("bot", "handler"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+REPEATED_QUERIES = registry.counter(
+    "db_repeated_queries_total", "Вызовы обработчиков с повторяющимся запросом (подозрение на N+1)",
+    labels=("bot", "handler")
+)
+BUDGET_EXCEEDED = registry.counter(
+    "db_query_budget_exceeded_total", "Вызовы обработчиков сверх бюджета запросов", labels=("bot", "handler")
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """Обработчик сделал больше запросов, чем разрешено (только в DEV_MODE).
+    Бросается после commit сессии апдейта: аудит сообщает о нарушении,
+    но не меняет исход транзакции"""
+
+
+class QueryLog:
+    """Запросы в рамках одного вызова обработчика"""
+
+    def __init__(self):
+        self.statements = Counter()
+        self.count = 0
+        self.seconds = 0.0
+
+    def add(self, statement: str, seconds: float):
+        self.statements[statement] += 1
+        self.count += 1
+        self.seconds += seconds
+
+    def repeated(self, threshold: int):
+        """Одинаковый текст запроса (разные параметры) threshold и более раз - типичный N+1"""
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+
+
+def current_log() -> Optional[QueryLog]:
+    return _current.get()
+
+
+def query_budget(limit: int):
+    """Свой бюджет запросов на один вызов обработчика вместо SQL_QUERY_BUDGET:
+
+        @router.callback_query(F.data == "admin_stats")
+        @query_budget(4)
+        async def admin_stats(...)
+    """
+    def decorator(func):
+        func.query_budget = limit
+        return func
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("audit_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = _current.get()
+    started = conn.info.get("audit_started")
+    if log is not None and started:
+        log.add(statement, time.perf_counter() - started.pop())
+
+
+def _handle_error(context):
+    # Упавший запрос не доходит до after_cursor_execute - снимаем его отметку здесь
+    conn = context.connection
+    if _current.get() is not None and conn is not None and conn.info.get("audit_started"):
+        conn.info["audit_started"].pop()
+
+
+class QueryAuditMiddleware(BaseMiddleware):
+    """Считает SQL запросы обработчика, ищет повторы и проверяет бюджет.
+
+    Учитывается один вызов обработчика: запросы фильтров и outer
+    middleware в бюджет не входят.
+
+    Контекстная переменная видна слушателям SQLAlchemy (asyncio-драйвер
+    выполняет запросы в greenlet с тем же контекстом), поэтому запросы
+    разных апдейтов, идущих параллельно, не смешиваются.
+    """
+
+    def __init__(self, bot_name: str):
+        self.bot_name = bot_name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        callback = getattr(data.get("handler"), "callback", None)
+        name = getattr(callback, "__name__", "unknown")
+        log = QueryLog()
+        token = _current.set(log)
+        try:
+            result = await handler(event, data)
+        finally:
+            _current.reset(token)
+            QUERIES_PER_UPDATE.observe(log.count, self.bot_name, name)
+            if log.count:
+                SQL_SECONDS_PER_UPDATE.observe(log.seconds, self.bot_name, name)
+
+        violation = self._check(name, log, getattr(callback, "query_budget", config.SQL_QUERY_BUDGET))
+        if violation and config.DEV_MODE:
+            # Исключение откатило бы незакоммиченные записи обработчика в
+            # DbSessionMiddleware - сначала фиксируем их, как при успехе
+            session = data.get("session")
+            if session is not None and session.in_transaction():
+                await session.commit()
+            raise QueryBudgetExceeded(violation)
+        return result
+
+    def _check(self, name: str, log: QueryLog, budget: int) -> Optional[str]:
+        """Повторы и бюджет: в лог и метрики. Возвращает текст нарушения бюджета"""
+        repeated = log.repeated(config.SQL_REPEAT_THRESHOLD) if config.SQL_REPEAT_THRESHOLD else []
+        if repeated:
+            REPEATED_QUERIES.inc(self.bot_name, name)
+            statement, times = repeated[0]
+            logger.warning(
+                f"Возможный N+1 в {name}: запрос выполнен {times} раз за вызов: {' '.join(statement.split())[:300]}"
+            )
+
+        if budget and log.count > budget:
+            BUDGET_EXCEEDED.inc(self.bot_name, name)
+            message = (
+                f"{name}: {log.count} SQL запросов при бюджете {budget} "
+                f"({log.seconds * 1000:.1f} мс)"
+            )
+            logger.warning(message)
+            return message
+        return None
+
+
+def setup_query_audit(dp: Dispatcher, bot_name: str, engine):
+    """Повесить учёт запросов на все типы событий диспетчера"""
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+    for event_type, observer in dp.observers.items():
+        if event_type in ("update", "error"):
+            continue
+        observer.middleware(QueryAuditMiddleware(bot_name))
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# Методы, на которые действуют лимиты Telegram на отправку
+LIMITED_PREFIXES = ("send", "forward", "copy")
+# Правка уже отправленного сообщения (карусель, страницы админки) - новых
+# сообщений в чат не добавляет, поэтому только под общим лимитом бота
+GLOBAL_ONLY_PREFIXES = ("edit",)
+EXEMPT_METHODS = {"sendChatAction"}
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst подряд"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена (0 - можно сейчас)"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class _ChatState:
+    __slots__ = ("lock", "bucket", "paused_until", "pending")
+
+    def __init__(self, bucket: TokenBucket):
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        self.paused_until = 0.0
+        self.pending = 0
+
+
+class TelegramRateLimiter(BaseRequestMiddleware):
+    """Ограничитель исходящих запросов Bot API для одной сессии.
+
+    Общая корзина задаёт лимит сообщений в секунду на бота, корзина
+    каждого чата - темп отправки в этот чат (для групп медленнее).
+    editMessage* идут только через общую корзину.
+    Сообщения одного чата уходят по порядку. На TelegramRetryAfter
+    ставится на паузу только этот чат, запрос повторяется после паузы,
+    остальные чаты продолжают отправку. Вместо потери сообщений при
+    всплеске получается очередь.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 25,
+        global_burst: float = 25,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        group_burst: float = 3,
+        max_retries: int = 3,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self._global_lock = asyncio.Lock()
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._chats: Dict[Union[int, str], _ChatState] = {}
+
+        self.requests = 0
+        self.waited = 0  # запросов, которым пришлось ждать
+        self.wait_seconds = 0.0
+        self.retry_after = 0  # полученных TelegramRetryAfter
+
+    @staticmethod
+    def is_limited(method: TelegramMethod) -> bool:
+        name = method.__api_method__
+        return name.startswith(LIMITED_PREFIXES + GLOBAL_ONLY_PREFIXES) and name not in EXEMPT_METHODS
+
+    def _chat(self, chat_id: Union[int, str]) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            # Отрицательные id и @username - группы и каналы
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(
+                self.group_rate if is_group else self.chat_rate,
+                self.group_burst if is_group else self.chat_burst,
+            )
+            state = self._chats[chat_id] = _ChatState(bucket)
+            if len(self._chats) > 1000:
+                self._prune()
+        return state
+
+    def _prune(self):
+        """Убираем чаты без очереди, паузы и с полной корзиной"""
+        now = time.monotonic()
+        for chat_id, state in list(self._chats.items()):
+            if not state.pending and state.paused_until <= now and state.bucket.full:
+                del self._chats[chat_id]
+
+    async def _wait_global(self) -> float:
+        waited = 0.0
+        async with self._global_lock:
+            delay = self.global_bucket.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+                delay = self.global_bucket.delay()
+            self.global_bucket.take()
+        return waited
+
+    async def _wait_chat(self, state: _ChatState) -> float:
+        waited = 0.0
+        while True:
+            delay = max(state.paused_until - time.monotonic(), state.bucket.delay())
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+            waited += delay
+        state.bucket.take()
+        return waited
+
+    async def _send(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod,
+                    state: Optional[_ChatState]) -> Response:
+        attempt = 0
+        while True:
+            waited = await self._wait_chat(state) if state else 0.0
+            waited += await self._wait_global()
+            if waited:
+                self.waited += 1
+                self.wait_seconds += waited
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                pause = time.monotonic() + e.retry_after
+                if state:
+                    state.paused_until = max(state.paused_until, pause)
+                    logger.warning(f"Flood control в чате {method.chat_id}: пауза {e.retry_after} с")
+                else:
+                    # Чата нет (inline сообщения) - ждём только этот запрос
+                    logger.warning(f"Flood control на {method.__api_method__}: пауза {e.retry_after} с")
+                    await asyncio.sleep(e.retry_after)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod) -> Response:
+        if not self.is_limited(method):
+            return await make_request(bot, method)
+
+        self.requests += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or method.__api_method__.startswith(GLOBAL_ONLY_PREFIXES):
+            return await self._send(make_request, bot, method, None)
+
+        state = self._chat(chat_id)
+        state.pending += 1
+        try:
+            async with state.lock:
+                return await self._send(make_request, bot, method, state)
+        finally:
+            state.pending -= 1
+            if not state.pending and state.paused_until <= time.monotonic() and state.bucket.full:
+                self._chats.pop(chat_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "retry_after": self.retry_after,
+            "active_chats": len(self._chats),
+        }
@@ -0,0 +1,57 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.metrics import registry
+
+RENDER_REQUESTS = registry.counter(
+    "render_cache_requests_total", "Обращения к кэшу готовых карточек", labels=("variant", "result")
+)
+
+
+class RenderCache:
+    """Готовый HTML карточек по (id сущности, версия каталога, вариант).
+
+    Вариант - вид карточки: service, product, product_order, inline...
+    Хранятся только карточки последней запрошенной версии: при появлении
+    новой версии каталога всё старое выбрасывается, так что размер кэша
+    ограничен размером каталога.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._items: Dict[Tuple[Hashable, str], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, entity_id: Hashable, version: int, variant: str, render: Callable[..., Any], *args) -> Any:
+        if version != self.version:
+            if self.version is not None and version < self.version:
+                # Обработчик начал со снимком старее кэша - отрисуем без кэша
+                return render(*args)
+            self._items.clear()
+            self.version = version
+
+        key = (entity_id, variant)
+        value = self._items.get(key)
+        if value is not None:
+            self.hits += 1
+            RENDER_REQUESTS.inc(variant, "hit")
+            return value
+
+        self.misses += 1
+        RENDER_REQUESTS.inc(variant, "miss")
+        value = self._items[key] = render(*args)
+        return value
+
+    def clear(self):
+        self._items.clear()
+        self.version = None
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+cards = RenderCache()
+
+registry.callback("render_cache_entries", "Карточек в кэше готовых карточек", lambda: len(cards._items))
+registry.callback("render_cache_hit_ratio", "Доля попаданий в кэш готовых карточек", cards.hit_ratio)
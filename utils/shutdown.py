@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import signal
+import time
+from typing import Awaitable, Callable, Iterable, Optional, Set, TypeVar
+
+from aiogram import Bot, Dispatcher
+
+from database import engine
+from utils.metrics import stop_metrics_server
+from utils.outbox import NotificationOutbox
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+def polling_tasks(dp: Dispatcher) -> Set[asyncio.Task]:
+    """Задачи обработки апдейтов, запущенные polling (handle_as_tasks)"""
+    return set(getattr(dp, "_handle_update_tasks", ()))
+
+
+def install_stop_signals(callback: Callable[[], None]):
+    """SIGINT/SIGTERM вызывают callback вместо остановки процесса"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, callback)
+        except NotImplementedError:  # Windows
+            pass
+
+
+async def drain_tasks(tasks: Iterable[asyncio.Task], timeout: float):
+    """Ждём обработчики до дедлайна, оставшиеся отменяем. Возвращает (завершено, брошено)"""
+    tasks = {t for t in tasks if not t.done()}
+    if not tasks:
+        return 0, 0
+
+    done, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return len(done), len(pending)
+
+
+async def graceful_shutdown(name: str, bots: Iterable[Bot], tasks: Iterable[asyncio.Task], timeout: float,
+                            outbox: Optional[NotificationOutbox] = None):
+    """Упорядоченная остановка после того, как приём апдейтов уже прекращён:
+    дождаться обработчиков, дослать уведомления из outbox (если бот им
+    владеет и передал его) и закрыть HTTP сессии. В конце - сводка в лог.
+
+    Общие для процесса ресурсы (БД, сервер метрик) здесь не трогаем:
+    в одном процессе может останавливаться несколько ботов, их закрывает run_process.
+    """
+    started = time.monotonic()
+
+    def remaining() -> float:
+        return timeout - (time.monotonic() - started)
+
+    tasks = list(tasks)
+    logger.info(f"⏳ {name}: остановка, в обработке апдейтов: {sum(not t.done() for t in tasks)}")
+    drained, abandoned = await drain_tasks(tasks, remaining())
+
+    outbox_result = None
+    if outbox is not None and outbox.running:
+        outbox_result = await outbox.flush(remaining())
+
+    for bot in bots:
+        try:
+            await bot.session.close()
+        except Exception as e:
+            logger.warning(f"{name}: ошибка закрытия сессии: {e}")
+
+    summary = f"⏹ {name}: остановлен за {time.monotonic() - started:.1f} с. Апдейтов дообработано: {drained}"
+    if abandoned:
+        summary += f", прервано по таймауту: {abandoned}"
+    outbox_left = 0
+    if outbox_result is not None:
+        outbox_sent, outbox_left = outbox_result
+        summary += f". Outbox: дослано {outbox_sent}"
+        if outbox_left:
+            summary += f", осталось до следующего запуска: {outbox_left}"
+    (logger.warning if abandoned or outbox_left else logger.info)(summary)
+
+
+async def run_process(main: Awaitable[T]) -> T:
+    """Точка входа процесса: боты процесса (main), после их остановки -
+    один раз закрыть пул соединений с БД и сервер метрик"""
+    try:
+        return await main
+    finally:
+        await engine.dispose()
+        await stop_metrics_server()
@@ -0,0 +1,49 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+def normalize_question(text: str) -> str:
+    """Привести вопрос к каноническому виду для сравнения"""
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .,!?…")
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов в один вызов.
+
+    Пока вызов по ключу выполняется, остальные запросы с тем же ключом
+    ждут его результат, а не делают свой вызов.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0  # реальные вызовы
+        self.coalesced = 0  # запросы, получившие чужой результат
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Выполнить func или дождаться уже идущего вызова с тем же ключом.
+        Возвращает (результат, получен ли он из чужого вызова)"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            self.calls += 1
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+
+        # shield: отмена одного ожидающего не отменяет общий вызов
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # помечаем исключение как полученное
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
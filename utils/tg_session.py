@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import random
+import ssl
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import certifi
+from aiohttp import ClientConnectorError, ClientError, ClientSession, ClientTimeout, TCPConnector
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession, _prepare_connector
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import TelegramMethod
+
+from config import config
+from utils.ai_telemetry import percentile
+from utils.metrics import BOT_API_ERRORS, BOT_API_SECONDS
+from utils.rate_limiter import TelegramRateLimiter
+
+logger = logging.getLogger(__name__)
+
+try:
+    from aiohttp_socks import ProxyConnectionError, ProxyError, ProxyTimeoutError
+    # Ошибки до отправки запроса: его можно безопасно повторить через другой прокси
+    CONNECT_ERRORS = (ClientConnectorError, ProxyConnectionError, ProxyError, ProxyTimeoutError)
+except ImportError:  # pragma: no cover
+    CONNECT_ERRORS = (ClientConnectorError,)
+
+# Длинный опрос - его время не говорит ни о скорости прокси, ни о скорости
+# Bot API: в выбор прокси и в статистику api_timings не попадает
+LONG_POLL_METHODS = {"getUpdates"}
+
+
+class ApiTimings:
+    """Время запросов к Bot API по методам (скользящее окно)"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.durations: Dict[str, deque] = {}
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, method: str, seconds: float, ok: bool = True):
+        if method not in self.durations:
+            self.durations[method] = deque(maxlen=self.window)
+        self.durations[method].append(seconds)
+        self.counts[method] = self.counts.get(method, 0) + 1
+        BOT_API_SECONDS.observe(seconds, method)
+        if not ok:
+            self.errors[method] = self.errors.get(method, 0) + 1
+            BOT_API_ERRORS.inc(method)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """По каждому методу: количество, ошибки и p50/p95/p99 в мс"""
+        result = {}
+        for method, values in self.durations.items():
+            values = list(values)
+            result[method] = {
+                "count": self.counts.get(method, 0),
+                "errors": self.errors.get(method, 0),
+                **{f"p{p}": percentile(values, p) * 1000 for p in (50, 95, 99)},
+            }
+        return result
+
+    def summary(self, limit: int = 8) -> str:
+        """Самые частые методы (HTML)"""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return ""
+        text = "📡 <b>Bot API, мс (p50 / p95):</b>\n"
+        for method, s in sorted(snapshot.items(), key=lambda x: -x[1]["count"])[:limit]:
+            errors = f", ошибок {s['errors']}" if s["errors"] else ""
+            text += f"• {method}: {s['p50']:.0f} / {s['p95']:.0f} ({s['count']}{errors})\n"
+        return text
+
+
+api_timings = ApiTimings()
+
+
+class ProxyEndpoint:
+    """Один выход в сеть (прокси или напрямую) со своей ClientSession"""
+
+    def __init__(self, url: Optional[str]):
+        self.url = url
+        self.session: Optional[ClientSession] = None
+        self.latency: Optional[float] = None  # EWMA, секунды
+        self.healthy = True
+        self.failures = 0
+        self.requests = 0
+
+    @property
+    def name(self) -> str:
+        if not self.url:
+            return "direct"
+        parts = urlsplit(self.url)
+        return f"{parts.scheme}://{parts.hostname}:{parts.port}"
+
+    def observe(self, seconds: float, alpha: float = 0.2):
+        self.latency = seconds if self.latency is None else (1 - alpha) * self.latency + alpha * seconds
+        self.failures = 0
+        self.healthy = True
+
+    def fail(self, max_failures: int):
+        self.failures += 1
+        if self.failures >= max_failures and self.healthy:
+            self.healthy = False
+            logger.warning(f"Прокси {self.name} исключён из пула после {self.failures} ошибок")
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """AiohttpSession с настраиваемым коннектором и пулом прокси.
+
+    Для каждого прокси своя ClientSession (в aiohttp прокси задаётся
+    коннектором). Запрос уходит через здоровый прокси, выбранный
+    случайно с весом 1/задержка. Прокси с несколькими ошибками подряд
+    исключается, пока фоновая проверка не увидит его живым. Ошибку
+    соединения (запрос ещё не ушёл) повторяем через другой прокси.
+    """
+
+    def __init__(
+        self,
+        proxies: List[Optional[str]],
+        connector_options: Optional[Dict[str, Any]] = None,
+        connect_timeout: float = 10,
+        health_interval: float = 30,
+        max_failures: int = 3,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.endpoints = [ProxyEndpoint(url) for url in (proxies or [None])]
+        self.connector_options = connector_options or {}
+        self.connect_timeout = connect_timeout
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _new_client(self, endpoint: ProxyEndpoint) -> ClientSession:
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        if endpoint.url:
+            connector_type, connector_init = _prepare_connector(endpoint.url)
+        else:
+            connector_type, connector_init = TCPConnector, {}
+        connector = connector_type(ssl=ssl_context, **connector_init, **self.connector_options)
+        return ClientSession(connector=connector, headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"})
+
+    def _client(self, endpoint: ProxyEndpoint) -> ClientSession:
+        if endpoint.session is None or endpoint.session.closed:
+            endpoint.session = self._new_client(endpoint)
+        return endpoint.session
+
+    def choose(self, exclude: Optional[ProxyEndpoint] = None) -> ProxyEndpoint:
+        """Здоровый прокси, чем быстрее - тем вероятнее"""
+        candidates = [e for e in self.endpoints if e.healthy and e is not exclude]
+        if not candidates:
+            candidates = [e for e in self.endpoints if e is not exclude] or self.endpoints
+        if len(candidates) == 1:
+            return candidates[0]
+
+        known = [e.latency for e in candidates if e.latency]
+        default = sum(known) / len(known) if known else 1.0
+        weights = [1 / max(e.latency or default, 0.001) for e in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    async def create_session(self) -> ClientSession:
+        """Сессия для скачивания файлов (stream_content)"""
+        self._ensure_health_task()
+        return self._client(self.choose())
+
+    def _ensure_health_task(self):
+        if len(self.endpoints) > 1 and self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(), name="proxy-health")
+
+    async def _health_loop(self):
+        parts = urlsplit(self.api.base)
+        url = f"{parts.scheme}://{parts.netloc}/"
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for endpoint in self.endpoints:
+                started = time.perf_counter()
+                try:
+                    async with self._client(endpoint).get(
+                        url, timeout=ClientTimeout(total=self.connect_timeout), allow_redirects=False
+                    ) as resp:
+                        await resp.read()
+                except (ClientError, OSError, asyncio.TimeoutError) as e:
+                    endpoint.fail(self.max_failures)
+                    logger.debug(f"Проверка прокси {endpoint.name}: {e}")
+                    continue
+                was_healthy = endpoint.healthy
+                endpoint.observe(time.perf_counter() - started)
+                if not was_healthy:
+                    logger.info(f"Прокси {endpoint.name} снова в пуле")
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self._ensure_health_task()
+        name = method.__api_method__
+        url = self.api.api_url(token=bot.token, method=name)
+        client_timeout = ClientTimeout(
+            total=self.timeout if timeout is None else timeout, connect=self.connect_timeout
+        )
+
+        long_poll = name in LONG_POLL_METHODS
+        endpoint = self.choose()
+        tried = 1
+        started = time.perf_counter()
+
+        def record(ok: bool = True):
+            if not long_poll:
+                api_timings.record(name, time.perf_counter() - started, ok=ok)
+        while True:
+            endpoint.requests += 1
+            form = self.build_form_data(bot=bot, method=method)
+            attempt_started = time.perf_counter()
+            try:
+                async with self._client(endpoint).post(url, data=form, timeout=client_timeout) as resp:
+                    raw_result = await resp.text()
+                break
+            except CONNECT_ERRORS as e:
+                endpoint.fail(self.max_failures)
+                if tried < len(self.endpoints):
+                    logger.warning(f"{name}: прокси {endpoint.name} недоступен ({e}), пробуем другой")
+                    endpoint = self.choose(exclude=endpoint)
+                    tried += 1
+                    continue
+                record(ok=False)
+                raise TelegramNetworkError(method=method, message=f"{type(e).__name__}: {e}")
+            except asyncio.TimeoutError:
+                endpoint.fail(self.max_failures)
+                record(ok=False)
+                raise TelegramNetworkError(method=method, message="Request timeout error")
+            except ClientError as e:
+                endpoint.fail(self.max_failures)
+                record(ok=False)
+                raise TelegramNetworkError(method=method, message=f"{type(e).__name__}: {e}")
+
+        if not long_poll:
+            endpoint.observe(time.perf_counter() - attempt_started)
+        try:
+            response = self.check_response(bot=bot, method=method, status_code=resp.status, content=raw_result)
+        except Exception:
+            record(ok=False)
+            raise
+        record()
+        return response.result
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        closed = False
+        for endpoint in self.endpoints:
+            if endpoint.session is not None and not endpoint.session.closed:
+                await endpoint.session.close()
+                closed = True
+        if closed:
+            # Как в AiohttpSession: даём SSL соединениям закрыться
+            await asyncio.sleep(0.25)
+
+    def pool_stats(self) -> List[dict]:
+        return [
+            {
+                "proxy": e.name,
+                "healthy": e.healthy,
+                "latency_ms": round(e.latency * 1000, 1) if e.latency else None,
+                "requests": e.requests,
+            }
+            for e in self.endpoints
+        ]
+
+
+def create_session() -> AiohttpSession:
+    """HTTP-сессия для Bot API: пул прокси, ограничитель отправки и, если задан, свой сервер Bot API"""
+    kwargs = {}
+    if config.TELEGRAM_API_URL:
+        kwargs["api"] = TelegramAPIServer.from_base(config.TELEGRAM_API_URL)
+
+    session = PooledAiohttpSession(
+        proxies=config.PROXY_URLS,
+        connector_options={
+            "limit": config.TG_CONNECTOR_LIMIT,
+            "limit_per_host": config.TG_CONNECTOR_LIMIT_PER_HOST,
+            "keepalive_timeout": config.TG_KEEPALIVE_TIMEOUT,
+            "ttl_dns_cache": config.TG_DNS_TTL,
+        },
+        connect_timeout=config.TG_CONNECT_TIMEOUT,
+        health_interval=config.TG_PROXY_HEALTH_INTERVAL,
+        timeout=config.TG_REQUEST_TIMEOUT,
+        **kwargs,
+    )
+    if config.TG_RATE_LIMIT_ENABLED:
+        session.middleware(TelegramRateLimiter(
+            global_rate=config.TG_GLOBAL_RATE,
+            global_burst=config.TG_GLOBAL_BURST,
+            chat_rate=config.TG_CHAT_RATE,
+            chat_burst=config.TG_CHAT_BURST,
+            group_rate=config.TG_GROUP_RATE,
+            group_burst=config.TG_CHAT_BURST,
+            max_retries=config.TG_RETRY_AFTER_ATTEMPTS,
+        ))
+    return session
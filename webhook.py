@@ -0,0 +1,119 @@
+"""Webhook режим: один aiohttp сервер принимает обновления обоих ботов.
+
+Обновления основного бота приходят на {WEBHOOK_PATH}/main, AI бота -
+на {WEBHOOK_PATH}/ai. Запросы без правильного
+X-Telegram-Bot-Api-Secret-Token отклоняются, а Telegram получает ответ
+сразу, до окончания обработки апдейта.
+"""
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+import ai_bot
+import main_bot
+from config import config
+from database import init_db
+from utils.logging_setup import setup_logging
+from utils.metrics import start_metrics_server
+from utils.outbox import outbox
+from utils.shutdown import graceful_shutdown, install_stop_signals, run_process
+
+BOTS = {
+    "main": (main_bot.bot, main_bot.dp),
+    "ai": (ai_bot.bot, ai_bot.dp),
+}
+
+
+def webhook_path(name: str) -> str:
+    return f"{config.WEBHOOK_PATH.rstrip('/')}/{name}"
+
+
+async def on_startup(app: web.Application):
+    await init_db()
+    await outbox.start(main_bot.bot)
+    # Метрики - не на публичном webhook порту, а на локальном сервере метрик
+    await start_metrics_server(config.METRICS_HOST, config.MAIN_METRICS_PORT)
+    
+    if not config.WEBHOOK_SECRET:
+        logging.warning(
+            "⚠️ WEBHOOK_SECRET не задан - апдейты принимаются без проверки "
+            "X-Telegram-Bot-Api-Secret-Token, любой может слать их на webhook"
+        )
+    
+    if not config.WEBHOOK_BASE_URL:
+        logging.warning("WEBHOOK_BASE_URL не задан - вебхуки в Telegram не регистрируются")
+        return
+    
+    for name, (bot, dp) in BOTS.items():
+        url = config.WEBHOOK_BASE_URL.rstrip("/") + webhook_path(name)
+        await bot.set_webhook(
+            url=url,
+            secret_token=config.WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logging.info(f"🔗 Webhook {name}: {url}")
+
+
+async def healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    app.router.add_get("/healthz", healthz)
+    
+    app["handlers"] = []
+    for name, (bot, dp) in BOTS.items():
+        # handle_in_background: отвечаем Telegram сразу, апдейт обрабатывается в фоне
+        handler = SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            handle_in_background=True,
+            secret_token=config.WEBHOOK_SECRET or None
+        )
+        handler.register(app, path=webhook_path(name))
+        app["handlers"].append(handler)
+    
+    return app
+
+
+def background_tasks(app: web.Application) -> set:
+    """Апдейты, которые ещё обрабатываются в фоне"""
+    tasks = set()
+    for handler in app["handlers"]:
+        tasks |= set(getattr(handler, "_background_feed_update_tasks", ()))
+    return tasks
+
+
+async def main():
+    """Запуск webhook сервера для обоих ботов"""
+    app = create_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    await site.start()
+    
+    logging.info(f"🌐 Webhook сервер: {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}")
+    stop = asyncio.Event()
+    install_stop_signals(stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать апдейты, потом дорабатываем принятые
+        await site.stop()
+        await graceful_shutdown(
+            "webhook",
+            [bot for bot, _ in BOTS.values()],
+            background_tasks(app),
+            config.SHUTDOWN_TIMEOUT,
+            outbox=outbox
+        )
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(run_process(main()))